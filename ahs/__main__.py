@@ -1,9 +1,20 @@
 import argparse
+import cProfile
 import sys
+import time
 import traceback
+from pathlib import Path
 
 import ahs
+import ahs.analyze_concurrency
+import ahs.compare_har
 import ahs.editor_loadtime
+import ahs.editor_statistics
+import ahs.har_index
+import ahs.latency_sketch
+import ahs.merge_sketch
+import ahs.process_har
+import ahs.profiling
 import ahs.sanitize_har
 import ahs.to_timing_csv
 
@@ -11,18 +22,58 @@ import ahs.to_timing_csv
 def create_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="AnnofabのHAR(HTTP Archive)ファイルを扱うコマンドです。")
     parser.add_argument("--version", action="version", version=f"annofab_har {ahs.__version__}")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="HARファイルごと・処理の段階ごとの経過時間、entries/s、bytes/s、ピークRSSを、終了時に標準エラー出力に出力します。",
+    )
+    parser.add_argument(
+        "--profile_output", type=Path, help="`--profile`の計測結果をJSON形式で出力するファイルのパス。指定すると`--profile`も有効になります。"
+    )
+    parser.add_argument("--cprofile_output", type=Path, help="cProfileの計測結果（`pstats`形式）を出力するファイルのパス。")
     parser.set_defaults(command_help=parser.print_help)
 
     subparsers = parser.add_subparsers(dest="command_name")
 
     ahs.sanitize_har.add_parser(subparsers)
     ahs.to_timing_csv.add_parser(subparsers)
-
-    # 全部のエディタに対応しておらず未完成なので、一時的にコメントアウト
-    # ahs.editor_loadtime.add_parser(subparsers)
+    ahs.process_har.add_parser(subparsers)
+    ahs.har_index.add_parser(subparsers)
+    ahs.editor_statistics.add_parser(subparsers)
+    ahs.editor_loadtime.add_parser(subparsers)
+    ahs.analyze_concurrency.add_parser(subparsers)
+    ahs.latency_sketch.add_parser(subparsers)
+    ahs.merge_sketch.add_parser(subparsers)
+    ahs.compare_har.add_parser(subparsers)
     return parser
 
 
+def run_command(args: argparse.Namespace) -> None:
+    """
+    サブコマンドを実行します。`--profile`や`--cprofile_output`が指定されていれば、処理時間を計測して出力します。
+    """
+    profiler = ahs.profiling.get_profiler()
+    profiler.enabled = args.profile or args.profile_output is not None
+    profiler.command_name = args.command_name
+    cprofile = cProfile.Profile() if args.cprofile_output is not None else None
+
+    start_time = time.perf_counter()
+    try:
+        if cprofile is not None:
+            cprofile.runcall(args.func, args)
+        else:
+            args.func(args)
+    finally:
+        profiler.elapsed_seconds = time.perf_counter() - start_time
+        if cprofile is not None:
+            args.cprofile_output.parent.mkdir(exist_ok=True, parents=True)
+            cprofile.dump_stats(args.cprofile_output)
+        if profiler.enabled:
+            profiler.print_report(sys.stderr)
+            if args.profile_output is not None:
+                profiler.write_json(args.profile_output)
+
+
 def main(arguments: list[str] | None = None) -> None:
     """ """
     parser = create_parser()
@@ -34,7 +85,7 @@ def main(arguments: list[str] | None = None) -> None:
 
     if hasattr(args, "func"):
         try:
-            args.func(args)
+            run_command(args)
         except Exception:
             traceback.print_exc()
             # エラーで終了するためExit Codeを1にする
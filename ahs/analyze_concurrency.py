@@ -0,0 +1,390 @@
+"""
+HARファイルから、同時に処理中（in-flight）のリクエスト数の推移と、ホストごとの飽和状況を算出します。
+
+各entryを`startedDateTime`から`startedDateTime + time`までの区間とみなします。
+区間の開始と終了をイベントとして時刻順にソートし、先頭から累積和をとる（スイープライン）ので、計算量はO(n log n)です。
+リクエストの組み合わせごとに重なりを判定することはしません。
+
+ホストごとの集計も、イベントを（ホスト, 時刻）の順にソートして1回の累積和で行います。
+ホストごとのイベントの増減の合計は0になるので、ホストの境界で累積和を区切る必要はありません。
+"""
+
+import argparse
+import functools
+import json
+import sys
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from ahs.entry_filter import compile_entry_filter_cached, get_url_host
+from ahs.har_files import collect_har_files
+from ahs.profiling import get_profiler, run_with_profile
+from ahs.sanitize_har import sanitize_url
+from ahs.to_timing_csv import load_timing_columns
+
+if TYPE_CHECKING:
+    import numpy
+
+DEFAULT_CONNECTION_LIMIT = 6
+"""ブラウザが1個のホストに対して同時に張るHTTP/1.1のコネクション数の上限（Chromeの値）"""
+
+DEFAULT_TIMELINE_BUCKET_MS = 1000
+"""タイムラインの1区間の長さ[ミリ秒]のデフォルト値"""
+
+DEFAULT_CRITICAL_PATH_SIZE = 20
+"""クリティカルパスとして出力するリクエストの最大数のデフォルト値"""
+
+
+class RequestIntervals(NamedTuple):
+    """
+    リクエストの区間。時刻は最初のリクエストの開始時刻からの経過時間[ミリ秒]です。
+    """
+
+    started_at: str | None
+    """最初のリクエストの`startedDateTime`"""
+    start: "numpy.ndarray"
+    end: "numpy.ndarray"
+    blocked: "numpy.ndarray"
+    """`timings.blocked`[ミリ秒]。値が存在しない（-1またはNaN）場合は0です。"""
+    url: "numpy.ndarray"
+    host: "numpy.ndarray"
+
+
+def create_request_intervals(started_date_times: Sequence[str], times: Any, blocked: Any, urls: Sequence[str]) -> RequestIntervals:  # noqa: ANN401
+    """
+    entryの`startedDateTime`、`time`、`timings.blocked`、`request.url`から、リクエストの区間を生成します。
+    `time`が負またはNaNのentryは除外します。
+    """
+    import numpy
+    import pandas
+
+    started_timestamps = pandas.to_datetime(pandas.Series(started_date_times, dtype=object), format="ISO8601", utc=True)
+    start = (started_timestamps - pandas.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy(dtype=numpy.float64) * 1000
+    time = numpy.asarray(times, dtype=numpy.float64)
+    is_valid = time >= 0  # NaNもFalseになる
+    start = start[is_valid]
+    if len(start) == 0:
+        empty = numpy.empty(0)
+        return RequestIntervals(None, empty, empty, empty, numpy.empty(0, dtype=object), numpy.empty(0, dtype=object))
+
+    first_index = int(numpy.argmin(start))
+    started_at = started_date_times[int(numpy.flatnonzero(is_valid)[first_index])]
+    origin = start[first_index]
+    start = start - origin
+    blocked_array = numpy.asarray(blocked, dtype=numpy.float64)[is_valid]
+    url = numpy.asarray(urls, dtype=object)[is_valid]
+    # 同じURLが繰り返し現れるので、ホストはURLごとに1回だけ求める
+    host_by_url = {e: get_url_host(e) for e in set(url)}
+    return RequestIntervals(
+        started_at,
+        start=start,
+        end=start + time[is_valid],
+        blocked=numpy.where(blocked_array > 0, blocked_array, 0),
+        url=url,
+        host=numpy.array([host_by_url[e] for e in url], dtype=object),
+    )
+
+
+def sweep_in_flight(
+    start: "numpy.ndarray", end: "numpy.ndarray", group: "numpy.ndarray | None" = None
+) -> tuple["numpy.ndarray", "numpy.ndarray", "numpy.ndarray"]:
+    """
+    区間の開始・終了をイベントとしてソートし、各イベントの直後に処理中のリクエスト数を返します。
+    同じ時刻では終了を先に処理するので、接している区間（前のリクエストの終了時刻に次のリクエストが開始）は重ならないとみなします。
+
+    Args:
+        group: 区間ごとのグループの番号。指定した場合は、グループごとにリクエスト数を数えます。
+
+    Returns:
+        イベントのグループの番号、時刻、イベント直後のリクエスト数。（グループの番号, 時刻）の順に並んでいます。
+        i番目のイベントの時刻からi+1番目のイベントの時刻まで、リクエスト数は一定です。
+    """
+    import numpy
+
+    size = len(start)
+    times = numpy.concatenate([start, end])
+    deltas = numpy.concatenate([numpy.ones(size, dtype=numpy.int64), numpy.full(size, -1, dtype=numpy.int64)])
+    groups = numpy.zeros(size * 2, dtype=numpy.int64) if group is None else numpy.concatenate([group, group])
+    order = numpy.lexsort((deltas, times, groups))
+    return groups[order], times[order], numpy.cumsum(deltas[order])
+
+
+def create_timeline(times: "numpy.ndarray", counts: "numpy.ndarray", bucket_ms: float) -> dict[str, Any]:
+    """
+    `sweep_in_flight`の結果から、`bucket_ms`ごとの最大リクエスト数と平均リクエスト数を算出します。
+    計算量は、イベント数とタイムラインの区間数の和に比例します。
+    """
+    import numpy
+
+    bucket_count = max(1, int(numpy.ceil(times[-1] / bucket_ms)))
+    edges = numpy.arange(bucket_count + 1) * bucket_ms
+    # リクエスト数を時間で積分した値は、イベントの時刻の間で線形なので、区間の境界の値は線形補間で求まる
+    areas = numpy.concatenate([[0.0], numpy.cumsum(numpy.diff(times) * counts[:-1])])
+    mean_counts = numpy.diff(numpy.interp(edges, times, areas)) / bucket_ms
+
+    # 区間の開始時点のリクエスト数と、区間内のイベント直後のリクエスト数の最大値
+    start_indices = numpy.searchsorted(times, edges[:-1], side="right") - 1
+    max_counts = numpy.where(start_indices >= 0, counts[numpy.maximum(start_indices, 0)], 0)
+    event_buckets = numpy.minimum((times // bucket_ms).astype(numpy.int64), bucket_count - 1)
+    numpy.maximum.at(max_counts, event_buckets, counts)
+    return {
+        "bucket_ms": bucket_ms,
+        "max_in_flight": max_counts.tolist(),
+        "mean_in_flight": numpy.round(mean_counts, 2).tolist(),
+    }
+
+
+def find_critical_path(intervals: RequestIntervals, max_size: int = DEFAULT_CRITICAL_PATH_SIZE) -> dict[str, Any]:
+    """
+    最後に完了したリクエストから遡って、待ち時間が最も短くなるようにリクエストをつないだ経路（クリティカルパスの推定値）を返します。
+
+    HARファイルにはリクエスト間の依存関係が記録されていないので、
+    「あるリクエストは、その開始時刻より前に完了したリクエストのうち、最後に完了したものを待っていた」とみなします。
+
+    Args:
+        max_size: 出力するリクエストの最大数。経路上のリクエストのうち、`time`が長いものから出力します。
+    """
+    import numpy
+
+    order = numpy.argsort(intervals.end, kind="stable")
+    sorted_end = intervals.end[order]
+    path = []
+    position = len(order) - 1
+    while position >= 0:
+        index = order[position]
+        path.append(index)
+        # 開始時刻以前に完了したリクエストのうち、最後に完了したもの。
+        # `time`が0のリクエストは自身も開始時刻に完了しているので、必ず現在のリクエストより前から探す
+        position = min(int(numpy.searchsorted(sorted_end, intervals.start[index], side="right")) - 1, position - 1)
+    path.reverse()
+
+    path_array = numpy.array(path, dtype=numpy.int64)
+    durations = intervals.end[path_array] - intervals.start[path_array]
+    selected = numpy.sort(path_array[numpy.argsort(-durations, kind="stable")[:max_size]])
+    return {
+        "duration_ms": float(intervals.end[path[-1]] - intervals.start[path[0]]),
+        "request_count": len(path),
+        "requests": [
+            {
+                "url": intervals.url[i],
+                "start_ms": float(intervals.start[i]),
+                "time_ms": float(intervals.end[i] - intervals.start[i]),
+                "blocked_ms": float(intervals.blocked[i]),
+            }
+            for i in selected
+        ],
+    }
+
+
+def _summarize_hosts(intervals: RequestIntervals, connection_limit: int) -> list[dict[str, Any]]:
+    import numpy
+
+    hosts, host_codes = numpy.unique(intervals.host.astype(str), return_inverse=True)
+    groups, times, counts = sweep_in_flight(intervals.start, intervals.end, host_codes)
+    # 次のイベントが同じホストの場合だけ、リクエスト数が一定の期間とみなす
+    durations = numpy.where(groups[1:] == groups[:-1], numpy.diff(times), 0)
+    group_counts = counts[:-1]
+    host_count = len(hosts)
+    max_in_flight = numpy.zeros(host_count, dtype=numpy.int64)
+    numpy.maximum.at(max_in_flight, groups, counts)
+    busy_ms = numpy.bincount(groups[:-1], weights=numpy.where(group_counts > 0, durations, 0), minlength=host_count)
+    saturated_ms = numpy.bincount(groups[:-1], weights=numpy.where(group_counts >= connection_limit, durations, 0), minlength=host_count)
+    request_count = numpy.bincount(host_codes, minlength=host_count)
+    is_blocked = intervals.blocked > 0
+    blocked_count = numpy.bincount(host_codes, weights=is_blocked, minlength=host_count)
+    blocked_ms = numpy.bincount(host_codes, weights=intervals.blocked, minlength=host_count)
+    max_blocked_ms = numpy.zeros(host_count)
+    numpy.maximum.at(max_blocked_ms, host_codes, intervals.blocked)
+
+    # リクエスト数が多いホストから出力する
+    return [
+        {
+            "host": str(hosts[i]),
+            "request_count": int(request_count[i]),
+            "max_in_flight": int(max_in_flight[i]),
+            "busy_ms": float(busy_ms[i]),
+            "saturated_ms": float(saturated_ms[i]),
+            "blocked_request_count": int(blocked_count[i]),
+            "blocked_ms": float(blocked_ms[i]),
+            "max_blocked_ms": float(max_blocked_ms[i]),
+        }
+        for i in numpy.argsort(-request_count, kind="stable")
+    ]
+
+
+def analyze_request_intervals(
+    intervals: RequestIntervals,
+    *,
+    connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+    timeline_bucket_ms: float | None = DEFAULT_TIMELINE_BUCKET_MS,
+    critical_path_size: int = DEFAULT_CRITICAL_PATH_SIZE,
+) -> dict[str, Any]:
+    """
+    リクエストの区間から、同時に処理中のリクエスト数の推移とホストごとの飽和状況を算出します。
+
+    Args:
+        connection_limit: ホストごとのコネクション数の上限。処理中のリクエスト数がこの値以上の時間を`saturated_ms`として出力します。
+        timeline_bucket_ms: タイムラインの1区間の長さ[ミリ秒]。Noneならばタイムラインを出力しません。
+        critical_path_size: クリティカルパスとして出力するリクエストの最大数
+    """
+    import numpy
+
+    request_count = len(intervals.start)
+    result: dict[str, Any] = {"started_at": intervals.started_at, "request_count": request_count}
+    if request_count == 0:
+        return result
+
+    _, times, counts = sweep_in_flight(intervals.start, intervals.end)
+    durations = numpy.diff(times)
+    max_index = int(numpy.argmax(counts))
+    duration_ms = float(times[-1])
+    result.update(
+        {
+            "duration_ms": duration_ms,
+            "busy_ms": float(durations[counts[:-1] > 0].sum()),
+            "max_in_flight": int(counts[max_index]),
+            "max_in_flight_at_ms": float(times[max_index]),
+            "mean_in_flight": float((durations * counts[:-1]).sum() / duration_ms) if duration_ms > 0 else 0.0,
+            "blocked_request_count": int(numpy.count_nonzero(intervals.blocked > 0)),
+            "blocked_ms": float(intervals.blocked.sum()),
+            "hosts": _summarize_hosts(intervals, connection_limit),
+            "critical_path": find_critical_path(intervals, critical_path_size),
+        }
+    )
+    if timeline_bucket_ms is not None:
+        result["timeline"] = create_timeline(times, counts, timeline_bucket_ms)
+    return result
+
+
+def _analyze_concurrency_of_file(
+    har_file: Path,
+    *,
+    filter_expressions: tuple[str, ...],
+    connection_limit: int,
+    timeline_bucket_ms: float | None,
+    critical_path_size: int,
+    is_sanitize_url: bool,
+) -> dict[str, Any]:
+    profiler = get_profiler()
+    try:
+        with profiler.file(har_file):
+            columns = load_timing_columns(har_file, entry_filter=compile_entry_filter_cached(filter_expressions))
+            with profiler.stage("analyze"):
+                intervals = create_request_intervals(columns["startedDateTime"], columns["time"], columns["timings.blocked"], columns["request.url"])
+                result = analyze_request_intervals(
+                    intervals, connection_limit=connection_limit, timeline_bucket_ms=timeline_bucket_ms, critical_path_size=critical_path_size
+                )
+                if is_sanitize_url and "critical_path" in result:
+                    for request in result["critical_path"]["requests"]:
+                        request["url"] = sanitize_url(request["url"])
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    return {"har_file": str(har_file), **result}
+
+
+def analyze_concurrency_of_files(
+    har_files: list[Path],
+    *,
+    filter_expressions: Sequence[str] = (),
+    connection_limit: int = DEFAULT_CONNECTION_LIMIT,
+    timeline_bucket_ms: float | None = DEFAULT_TIMELINE_BUCKET_MS,
+    critical_path_size: int = DEFAULT_CRITICAL_PATH_SIZE,
+    is_sanitize_url: bool = False,
+    jobs: int = 1,
+) -> list[dict[str, Any]]:
+    """
+    複数のHARファイルについて、同時に処理中のリクエスト数を分析します。
+    `jobs`が2以上ならば、プロセスプールで並列に処理します。
+    読み込みに失敗したHARファイルは、`error`キーにエラーの内容を格納します。
+
+    Args:
+        filter_expressions: 指定した場合は、すべてのフィルタ式を満たすentryだけを分析します。
+        is_sanitize_url: Trueならば、出力するURLのQuery Stringに含まれるセンシティブな値をマスクします。
+
+    Returns:
+        HARファイルごとの結果。`har_files`と同じ順番です。
+    """
+    # 不正なフィルタ式は、HARファイルを読み込む前にエラーにする
+    compile_entry_filter_cached(tuple(filter_expressions))
+
+    func = functools.partial(
+        _analyze_concurrency_of_file,
+        filter_expressions=tuple(filter_expressions),
+        connection_limit=connection_limit,
+        timeline_bucket_ms=timeline_bucket_ms,
+        critical_path_size=critical_path_size,
+        is_sanitize_url=is_sanitize_url,
+    )
+    if jobs <= 1:
+        return [func(har_file) for har_file in har_files]
+
+    profiler = get_profiler()
+    profiled_func = functools.partial(run_with_profile, profiler.enabled, func)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results: list[dict[str, Any]] = []
+        for result, file_profiles in executor.map(profiled_func, har_files, chunksize=max(1, len(har_files) // (jobs * 4))):
+            profiler.merge(file_profiles)
+            results.append(result)
+        return results
+
+
+def main(args: argparse.Namespace) -> None:
+    har_files = [e.path for e in collect_har_files(args.har_file)]
+    result = analyze_concurrency_of_files(
+        har_files,
+        filter_expressions=args.filter if args.filter is not None else [],
+        connection_limit=args.connection_limit,
+        timeline_bucket_ms=args.timeline_bucket_ms if args.timeline_bucket_ms > 0 else None,
+        critical_path_size=args.critical_path_size,
+        is_sanitize_url=args.sanitize_url,
+        jobs=args.jobs,
+    )
+
+    output_string = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output is not None:
+        output_file: Path = args.output
+        output_file.parent.mkdir(exist_ok=True, parents=True)
+        output_file.write_text(output_string, encoding="utf-8")
+    else:
+        print(output_string)  # noqa: T201
+
+    error_count = sum(1 for e in result if "error" in e)
+    if error_count > 0:
+        print(f"{error_count}/{len(result)}件のHARファイルの処理に失敗しました。", file=sys.stderr)  # noqa: T201
+        sys.exit(1)
+
+
+def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
+    subcommand_name = "analyze_concurrency"
+    subcommand_help = "HARファイルから、同時に処理中のリクエスト数の推移と、ホストごとの飽和状況を出力します。"
+
+    parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
+    parser.set_defaults(func=main)
+
+    parser.add_argument(
+        "har_file",
+        type=Path,
+        nargs="+",
+        help="HARファイルのパス。ディレクトリ（配下の`*.har`、`*.har.gz`、`*.har.zst`、`*.har.xz`ファイルを再帰的に処理）やglobパターンも指定できます。",
+    )
+    parser.add_argument("--filter", nargs="+", help="分析するentryを絞り込むフィルタ式。`to_timing_csv`の`--filter`と同じ形式です。")
+    parser.add_argument(
+        "--connection_limit",
+        type=int,
+        default=DEFAULT_CONNECTION_LIMIT,
+        help="ホストごとのコネクション数の上限。ホストごとに、処理中のリクエスト数がこの値以上だった時間を`saturated_ms`に出力します。",
+    )
+    parser.add_argument(
+        "--timeline_bucket_ms",
+        type=float,
+        default=DEFAULT_TIMELINE_BUCKET_MS,
+        help="タイムラインの1区間の長さ[ミリ秒]。区間ごとの最大・平均リクエスト数を出力します。0以下ならばタイムラインを出力しません。",
+    )
+    parser.add_argument("--critical_path_size", type=int, default=DEFAULT_CRITICAL_PATH_SIZE, help="クリティカルパスとして出力するリクエストの最大数")
+    parser.add_argument("--sanitize_url", action="store_true", help="出力するURLのQuery Stringに含まれるセンシティブな値をマスクします。")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="並列に処理するプロセス数。")
+    parser.add_argument("-o", "--output", type=Path, help="出力先。未指定ならば標準出力に出力します。")
+
+    return parser
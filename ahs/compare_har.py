@@ -0,0 +1,531 @@
+"""
+変更前（before）と変更後（after）の2組のHARファイルを比較して、リソースごと・エディタのマイルストーンごとのレイテンシの差を出力します。
+
+同じリソースを突き合わせられるよう、URLの署名などのクエリパラメータの値を`sanitize`コマンドと同じ方法でマスクして正規化します。
+正規化したURLとHTTPメソッドなどの組み合わせ（グループ）をキーにしたdict（ハッシュ索引）で、両方に存在するグループを結合します。
+差の信頼区間は、両方の値をそれぞれ復元抽出して分位点の差を求めるブートストラップ法で算出します。
+
+HARファイルの読み込みとブートストラップは、プロセスプールで並列に処理できます。
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import sys
+from collections.abc import Callable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from ahs.editor_loadtime import DEFAULT_EDITOR_RULE_CONFIGS, EditorLoadingTimeDetector, EditorRule, compile_editor_rule, load_editor_rule_configs
+from ahs.entry_filter import compile_entry_filter_cached, get_url_host
+from ahs.har_files import collect_har_files
+from ahs.har_stream import iter_har_file_entries
+from ahs.profiling import get_profiler, run_with_profile
+from ahs.sanitize_policy import DEFAULT_SANITIZE_RULES, SanitizePolicy, SanitizeRule
+from ahs.timing_columns import FLOAT_COLUMNS, TimingColumnsBuilder, get_row_count
+
+if TYPE_CHECKING:
+    import numpy
+
+GROUP_FIELDS = ["method", "url", "host", "mimeType"]
+"""グループのキーに指定できるフィールド。`url`は正規化したURLです。"""
+
+DEFAULT_GROUP_BY = ["method", "url"]
+
+DEFAULT_QUANTILE = 0.5
+
+DEFAULT_BOOTSTRAP_ITERATIONS = 1000
+"""ブートストラップの復元抽出の回数のデフォルト値"""
+
+DEFAULT_CONFIDENCE = 0.95
+
+DEFAULT_MIN_COUNT = 5
+"""比較するグループの、片側あたりの値の個数の最小値のデフォルト値"""
+
+_MAX_BOOTSTRAP_ELEMENTS = 10_000_000
+"""ブートストラップで一度に生成する標本の要素数の上限。値の個数が多いグループは、復元抽出を分割して行います。"""
+
+NORMALIZE_URL_POLICY = SanitizePolicy(
+    [
+        *DEFAULT_SANITIZE_RULES,
+        SanitizeRule("aws_signature", "query", pattern="X-Amz-.*"),
+        SanitizeRule("cloudfront_signature", "query", names=("Expires", "Signature", "Key-Pair-Id", "Policy")),
+    ]
+)
+"""
+URLの正規化に利用するポリシー。
+AWS署名付きURLは`X-Amz-Date`なども取得するたびに変わるので、`X-Amz-`で始まるクエリパラメータをすべてマスクします。
+"""
+
+
+class SampleOptions(NamedTuple):
+    """
+    HARファイルから抽出する値の設定。プロセスプールのワーカーに渡すので、pickleできる値だけを持ちます。
+    """
+
+    metric: str = "time"
+    """比較する列。`FLOAT_COLUMNS`のいずれか"""
+    group_by: tuple[str, ...] = tuple(DEFAULT_GROUP_BY)
+    """グループのキーにするフィールド。`GROUP_FIELDS`のいずれか"""
+    filter_expressions: tuple[str, ...] = ()
+    """指定した場合は、すべてのフィルタ式を満たすentryだけを比較します。マイルストーンには影響しません。"""
+    ignore_query: bool = False
+    """Trueならば、URLのQuery Stringをすべて除いてからグループのキーにします。"""
+    editor_type: str | None = None
+    """指定した場合は、エディタのマイルストーン（最初のフレームを読み込むまでの時間など）も比較します。"""
+    editor_rule_json: str | None = None
+    """`editor_type`のルールの設定（JSON）。Noneならば組み込みのルール"""
+    nth_frames: tuple[int, ...] = ()
+    """読み込みが完了するまでの時間を比較するフレームの番号（1始まり）"""
+
+
+class BootstrapOptions(NamedTuple):
+    quantile: float = DEFAULT_QUANTILE
+    """比較する分位点。0.5ならば中央値"""
+    iterations: int = DEFAULT_BOOTSTRAP_ITERATIONS
+    confidence: float = DEFAULT_CONFIDENCE
+    seed: int = 0
+    """乱数のシード。同じシードならば、並列に処理するプロセス数によらず同じ結果になります。"""
+
+
+def normalize_url(url: str, *, ignore_query: bool = False) -> str:
+    """
+    変更前と変更後で同じリソースのURLが一致するよう、URLを正規化します。
+    署名などのクエリパラメータの値をマスクして、フラグメントを除きます。
+
+    Args:
+        ignore_query: Trueならば、Query Stringをすべて除きます。
+    """
+    end = url.find("?") if ignore_query else url.find("#")
+    if end != -1:
+        url = url[:end]
+    if ignore_query:
+        return url
+    masked_url, _ = NORMALIZE_URL_POLICY.mask_url(url)
+    return masked_url
+
+
+class FileSamples(NamedTuple):
+    """
+    1個のHARファイルから抽出した値。プロセスプールのワーカーから返すので、グループのキーは重複を除いて連番に置き換えています。
+    """
+
+    har_file: str
+    keys: list[tuple[str, ...]]
+    """このHARファイルに含まれるグループのキー"""
+    codes: "numpy.ndarray"
+    """entryごとの、`keys`のインデックス"""
+    values: "numpy.ndarray"
+    """entryごとの値。値が存在しない場合はNaN"""
+    milestones: dict[str, float]
+    """エディタのマイルストーン（`first_frame_seconds`など）の値[秒]"""
+    error: str | None = None
+
+
+@functools.cache
+def _compile_editor_rule(editor_type: str, config_json: str | None) -> EditorRule:
+    # コンパイル済みのルールはpickleできないので、プロセスプールのワーカーごとにコンパイルしてキャッシュする
+    config = json.loads(config_json) if config_json is not None else DEFAULT_EDITOR_RULE_CONFIGS.get(editor_type)
+    if config is None:
+        raise ValueError(f"'{editor_type}'は不正なエディタの種類です。 :: {list(DEFAULT_EDITOR_RULE_CONFIGS)}のいずれかを指定してください。")
+    return compile_editor_rule(editor_type, config)
+
+
+def _create_group_keys(columns: dict[str, Any], group_by: Sequence[str], ignore_query: bool) -> list[tuple[str, ...]]:
+    urls = columns["request.url"]
+    fields = {"method": columns["request.method"], "mimeType": columns["response.content.mimeType"]}
+    if "url" in group_by:
+        # 同じURLは1回だけ正規化する
+        normalized_urls = {url: normalize_url(url, ignore_query=ignore_query) for url in set(urls)}
+        fields["url"] = [normalized_urls[url] for url in urls]
+    if "host" in group_by:
+        hosts = {url: get_url_host(url) for url in set(urls)}
+        fields["host"] = [hosts[url] for url in urls]
+    return list(zip(*[fields[e] for e in group_by], strict=True))
+
+
+def _load_file_samples(har_file: Path, options: SampleOptions) -> FileSamples:
+    import numpy
+
+    profiler = get_profiler()
+    empty = numpy.empty(0)
+    try:
+        with profiler.file(har_file):
+            with profiler.stage("extract"):
+                builder = TimingColumnsBuilder(entry_filter=compile_entry_filter_cached(options.filter_expressions))
+                # マイルストーンは、フィルタ式で絞り込む前のentryから算出する
+                detector = (
+                    EditorLoadingTimeDetector(
+                        _compile_editor_rule(options.editor_type, options.editor_rule_json), nth_frames=list(options.nth_frames)
+                    )
+                    if options.editor_type is not None
+                    else None
+                )
+                for entry in iter_har_file_entries(har_file):
+                    builder.add(entry)
+                    if detector is not None:
+                        detector.add(entry)
+            columns = builder.columns
+            profiler.add_entries(get_row_count(columns))
+
+            with profiler.stage("group"):
+                key_index: dict[tuple[str, ...], int] = {}
+                codes = numpy.fromiter(
+                    (key_index.setdefault(key, len(key_index)) for key in _create_group_keys(columns, options.group_by, options.ignore_query)),
+                    dtype=numpy.int32,
+                    count=get_row_count(columns),
+                )
+                values = numpy.frombuffer(columns[options.metric], dtype=numpy.float64)
+                # `timings`の-1は、値が存在しないことを表す
+                values = numpy.where(values >= 0, values, numpy.nan)
+
+            milestones = {}
+            if detector is not None:
+                milestones = {key: value for key, value in detector.get_result().items() if key.endswith("_seconds") and value is not None}
+    except Exception as e:
+        return FileSamples(str(har_file), [], empty.astype(numpy.int32), empty, {}, f"{type(e).__name__}: {e}")
+    return FileSamples(str(har_file), list(key_index), codes, values, milestones)
+
+
+class SampleSet:
+    """
+    片側（変更前または変更後）のHARファイルから抽出した値を、グループごとにまとめます。
+
+    Args:
+        key_index: グループのキーから連番へのdict。変更前と変更後で同じdictを共有して、同じキーに同じ連番を割り当てます。
+    """
+
+    def __init__(self, key_index: dict[tuple[str, ...], int]) -> None:
+        self.key_index = key_index
+        self.har_file_count = 0
+        self.entry_count = 0
+        self.errors: list[dict[str, str]] = []
+        self.milestones: dict[str, list[float]] = {}
+        self._codes: list[numpy.ndarray] = []
+        self._values: list[numpy.ndarray] = []
+
+    def add(self, samples: FileSamples) -> None:
+        import numpy
+
+        self.har_file_count += 1
+        if samples.error is not None:
+            self.errors.append({"har_file": samples.har_file, "error": samples.error})
+            return
+        self.entry_count += len(samples.values)
+        key_index = self.key_index
+        mapping = numpy.array([key_index.setdefault(key, len(key_index)) for key in samples.keys], dtype=numpy.int64)
+        self._codes.append(mapping[samples.codes])
+        self._values.append(samples.values)
+        for name, value in samples.milestones.items():
+            self.milestones.setdefault(name, []).append(value)
+
+    def group_values(self) -> dict[int, "numpy.ndarray"]:
+        """
+        グループの連番から、値（NaNを除く）の配列へのdictを返します。
+        """
+        import numpy
+
+        if len(self._codes) == 0:
+            return {}
+        codes = numpy.concatenate(self._codes)
+        values = numpy.concatenate(self._values)
+        is_valid = ~numpy.isnan(values)
+        codes = codes[is_valid]
+        values = values[is_valid]
+        # 連番でソートして、同じグループの値が連続するように並べ替える
+        order = numpy.argsort(codes, kind="stable")
+        unique_codes, starts = numpy.unique(codes[order], return_index=True)
+        return dict(zip(unique_codes.tolist(), numpy.split(values[order], starts[1:]), strict=True))
+
+
+def bootstrap_quantiles(values: "numpy.ndarray", quantile: float, iterations: int, rng: "numpy.random.Generator") -> "numpy.ndarray":
+    """
+    `values`から復元抽出した標本の分位点を、`iterations`個返します。
+    """
+    import numpy
+
+    result = numpy.empty(iterations)
+    chunk_size = max(1, _MAX_BOOTSTRAP_ELEMENTS // len(values))
+    for start in range(0, iterations, chunk_size):
+        size = min(chunk_size, iterations - start)
+        samples = values[rng.integers(0, len(values), size=(size, len(values)))]
+        result[start : start + size] = numpy.quantile(samples, quantile, axis=1)
+    return result
+
+
+class DeltaTask(NamedTuple):
+    """ブートストラップで、分位点の差の信頼区間を算出する対象"""
+
+    task_id: int
+    """乱数のシードに利用する連番。並列に処理しても、同じ結果になるようにします。"""
+    before: "numpy.ndarray"
+    after: "numpy.ndarray"
+
+
+def summarize_values(task: DeltaTask, quantile: float) -> dict[str, Any]:
+    """
+    変更前と変更後の値の分位点と、その差（変更後 - 変更前）を算出します。
+    信頼区間は算出しないので、`delta_low`、`delta_high`、`is_significant`はNoneです。
+    """
+    import numpy
+
+    before = float(numpy.quantile(task.before, quantile))
+    after = float(numpy.quantile(task.after, quantile))
+    return {
+        "before_count": len(task.before),
+        "after_count": len(task.after),
+        "before": before,
+        "after": after,
+        "delta": after - before,
+        "delta_low": None,
+        "delta_high": None,
+        "relative_delta": (after - before) / before if before != 0 else None,
+        "is_significant": None,
+    }
+
+
+def compare_values(task: DeltaTask, options: BootstrapOptions = BootstrapOptions()) -> dict[str, Any]:  # noqa: B008
+    """
+    変更前と変更後の値の分位点と、その差（変更後 - 変更前）の信頼区間を算出します。
+    """
+    import numpy
+
+    quantile = options.quantile
+    rng = numpy.random.default_rng([options.seed, task.task_id])
+    deltas = bootstrap_quantiles(task.after, quantile, options.iterations, rng) - bootstrap_quantiles(task.before, quantile, options.iterations, rng)
+    alpha = (1 - options.confidence) / 2
+    delta_low, delta_high = numpy.quantile(deltas, [alpha, 1 - alpha])
+    result = summarize_values(task, quantile)
+    result["delta_low"] = float(delta_low)
+    result["delta_high"] = float(delta_high)
+    # 信頼区間が0を含まなければ、差があるとみなす
+    result["is_significant"] = bool(delta_low > 0 or delta_high < 0)
+    return result
+
+
+def _compare_values_of_tasks(tasks: list[DeltaTask], options: BootstrapOptions) -> list[dict[str, Any]]:
+    return [compare_values(task, options) for task in tasks]
+
+
+def _compare_values_in_chunks(
+    executor: Executor | None, func: Callable[[list[DeltaTask]], list[dict[str, Any]]], tasks: list[DeltaTask], jobs: int
+) -> list[dict[str, Any]]:
+    """
+    `tasks`を分割して`func`を実行し、結果を`tasks`と同じ順番で返します。`executor`がNoneならば、分割せずに実行します。
+    """
+    if executor is None:
+        return func(tasks)
+    chunk_size = max(1, len(tasks) // (jobs * 4))
+    chunks = [tasks[i : i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    result = []
+    for chunk_result in executor.map(func, chunks):
+        result.extend(chunk_result)
+    return result
+
+
+def compare_har_files(
+    before_files: list[Path],
+    after_files: list[Path],
+    *,
+    sample_options: SampleOptions = SampleOptions(),  # noqa: B008
+    bootstrap_options: BootstrapOptions = BootstrapOptions(),  # noqa: B008
+    min_count: int = DEFAULT_MIN_COUNT,
+    jobs: int = 1,
+) -> dict[str, Any]:
+    """
+    変更前と変更後のHARファイルを比較します。
+    `jobs`が2以上ならば、HARファイルの読み込みとブートストラップをプロセスプールで並列に処理します。
+
+    Args:
+        min_count: 変更前と変更後の両方で、値がこの個数以上あるグループだけを比較します。
+            マイルストーンの値はHARファイルごとに1個なので、HARファイルがこの個数より少ない場合は、信頼区間を算出せずに分位点の差だけを出力します。
+
+    Returns:
+        `before`と`after`（HARファイルの件数など）、`milestones`と`resources`（比較結果のリスト）、`unmatched`（比較しなかったグループの数）をキーに持つdict
+    """
+    group_by = sample_options.group_by
+    for field in group_by:
+        if field not in GROUP_FIELDS:
+            raise ValueError(f"'{field}'はグループのキーに指定できません。 :: {GROUP_FIELDS}のいずれかを指定してください。")
+    if sample_options.metric not in FLOAT_COLUMNS:
+        raise ValueError(f"'{sample_options.metric}'は比較できない列です。 :: {FLOAT_COLUMNS}のいずれかを指定してください。")
+    # 不正なフィルタ式やルールは、HARファイルを読み込む前にエラーにする
+    compile_entry_filter_cached(sample_options.filter_expressions)
+    if sample_options.editor_type is not None:
+        _compile_editor_rule(sample_options.editor_type, sample_options.editor_rule_json)
+
+    load_func = functools.partial(_load_file_samples, options=sample_options)
+    compare_func = functools.partial(_compare_values_of_tasks, options=bootstrap_options)
+
+    profiler = get_profiler()
+    key_index: dict[tuple[str, ...], int] = {}
+    before = SampleSet(key_index)
+    after = SampleSet(key_index)
+    har_files = [(before, e) for e in before_files] + [(after, e) for e in after_files]
+    with ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else contextlib.nullcontext() as executor:
+        if executor is None:
+            for sample_set, har_file in har_files:
+                sample_set.add(load_func(har_file))
+        else:
+            profiled_func = functools.partial(run_with_profile, profiler.enabled, load_func)
+            chunk_size = max(1, len(har_files) // (jobs * 4))
+            for (sample_set, _), (samples, file_profiles) in zip(
+                har_files, executor.map(profiled_func, [e for _, e in har_files], chunksize=chunk_size), strict=True
+            ):
+                profiler.merge(file_profiles)
+                sample_set.add(samples)
+
+        with profiler.stage("join"):
+            before_values = before.group_values()
+            after_values = after.group_values()
+            keys = list(key_index)
+            # 変更前と変更後の両方に存在するグループだけを比較する
+            matched_codes = sorted(before_values.keys() & after_values.keys(), key=lambda e: keys[e])
+            resource_codes = [e for e in matched_codes if len(before_values[e]) >= min_count and len(after_values[e]) >= min_count]
+            resource_tasks = [DeltaTask(index, before_values[code], after_values[code]) for index, code in enumerate(resource_codes)]
+            milestone_names = [e for e in before.milestones if e in after.milestones]
+            all_milestone_tasks = [
+                DeltaTask(len(resource_tasks) + index, _to_array(before.milestones[name]), _to_array(after.milestones[name]))
+                for index, name in enumerate(milestone_names)
+            ]
+            milestone_tasks = [e for e in all_milestone_tasks if len(e.before) >= min_count and len(e.after) >= min_count]
+
+        with profiler.stage("bootstrap"):
+            results = _compare_values_in_chunks(executor, compare_func, resource_tasks + milestone_tasks, jobs)
+        milestone_results = dict(zip([e.task_id for e in milestone_tasks], results[len(resource_tasks) :], strict=True))
+
+    resources = [
+        {**dict(zip(group_by, keys[code], strict=True)), **result}
+        for code, result in zip(resource_codes, results[: len(resource_tasks)], strict=True)
+    ]
+    # 遅くなったグループを先頭に並べる
+    resources.sort(key=lambda e: e["delta"], reverse=True)
+    milestones = [
+        {"milestone": name, **(milestone_results.get(task.task_id) or summarize_values(task, bootstrap_options.quantile))}
+        for name, task in zip(milestone_names, all_milestone_tasks, strict=True)
+    ]
+
+    def summarize(sample_set: SampleSet) -> dict[str, Any]:
+        return {"har_file_count": sample_set.har_file_count, "entry_count": sample_set.entry_count, "errors": sample_set.errors}
+
+    return {
+        "metric": sample_options.metric,
+        "quantile": bootstrap_options.quantile,
+        "confidence": bootstrap_options.confidence,
+        "before": summarize(before),
+        "after": summarize(after),
+        "unmatched": {
+            "before_only_count": len(before_values.keys() - after_values.keys()),
+            "after_only_count": len(after_values.keys() - before_values.keys()),
+            "insufficient_count": len(matched_codes) - len(resource_codes),
+        },
+        "milestones": milestones,
+        "resources": resources,
+    }
+
+
+def _to_array(values: list[float]) -> "numpy.ndarray":
+    import numpy
+
+    return numpy.array(values, dtype=numpy.float64)
+
+
+def main(args: argparse.Namespace) -> None:
+    if not 0 <= args.quantile <= 1:
+        raise ValueError(f"`--quantile`には0以上1以下の値を指定してください。 :: {args.quantile}")
+    if not 0 < args.confidence < 1:
+        raise ValueError(f"`--confidence`には0より大きく1より小さい値を指定してください。 :: {args.confidence}")
+
+    editor_rule_json = None
+    if args.editor_type is not None:
+        rule_configs = load_editor_rule_configs(args.rule_file)
+        if args.editor_type not in rule_configs:
+            raise ValueError(f"'{args.editor_type}'は不正なエディタの種類です。 :: {list(rule_configs)}のいずれかを指定してください。")
+        editor_rule_json = json.dumps(rule_configs[args.editor_type])
+
+    sample_options = SampleOptions(
+        metric=args.metric,
+        group_by=tuple(args.group_by),
+        filter_expressions=tuple(args.filter) if args.filter is not None else (),
+        ignore_query=args.ignore_query,
+        editor_type=args.editor_type,
+        editor_rule_json=editor_rule_json,
+        nth_frames=tuple(args.nth_frame),
+    )
+    bootstrap_options = BootstrapOptions(quantile=args.quantile, iterations=args.bootstrap_iterations, confidence=args.confidence, seed=args.seed)
+    result = compare_har_files(
+        [e.path for e in collect_har_files(args.before)],
+        [e.path for e in collect_har_files(args.after)],
+        sample_options=sample_options,
+        bootstrap_options=bootstrap_options,
+        min_count=args.min_count,
+        jobs=args.jobs,
+    )
+
+    output_string = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output is not None:
+        output_file: Path = args.output
+        output_file.parent.mkdir(exist_ok=True, parents=True)
+        output_file.write_text(output_string, encoding="utf-8")
+    else:
+        print(output_string)  # noqa: T201
+
+    significant_count = sum(1 for e in result["resources"] if e["is_significant"])
+    print(  # noqa: T201
+        f"{len(result['resources'])}件のグループを比較しました。{significant_count}件のグループで、{args.confidence:.0%}信頼区間が0を含みません。",
+        file=sys.stderr,
+    )
+    error_count = len(result["before"]["errors"]) + len(result["after"]["errors"])
+    if error_count > 0:
+        print(f"{error_count}件のHARファイルの処理に失敗しました。", file=sys.stderr)  # noqa: T201
+        sys.exit(1)
+
+
+def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
+    subcommand_name = "compare"
+    subcommand_help = (
+        "変更前と変更後の2組のHARファイルを比較して、リソースごと・エディタのマイルストーンごとのレイテンシの差と信頼区間をJSONで出力します。"
+    )
+
+    parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
+    parser.set_defaults(func=main)
+
+    har_file_help = (
+        "HARファイルのパス。ディレクトリ（配下の`*.har`、`*.har.gz`、`*.har.zst`、`*.har.xz`ファイルを再帰的に処理）やglobパターンも指定できます。"
+    )
+    parser.add_argument("--before", type=Path, nargs="+", required=True, help=f"変更前の{har_file_help}")
+    parser.add_argument("--after", type=Path, nargs="+", required=True, help=f"変更後の{har_file_help}")
+    parser.add_argument("--metric", choices=FLOAT_COLUMNS, default="time", help="比較する列")
+    parser.add_argument(
+        "--group_by",
+        nargs="+",
+        choices=GROUP_FIELDS,
+        default=DEFAULT_GROUP_BY,
+        help="比較するグループのキー。`url`は、署名などのクエリパラメータの値をマスクしたURLです。",
+    )
+    parser.add_argument("--filter", nargs="+", help="entryを絞り込むフィルタ式。すべての式を満たすentryだけを比較します。例: `host=annofab.com`")
+    parser.add_argument("--ignore_query", action="store_true", help="URLのQuery Stringをすべて除いてから、グループのキーにします。")
+    parser.add_argument(
+        "--editor_type",
+        help="アノテーションエディタ画面の種類。指定すると、フレームを読み込むまでの時間などのマイルストーンも比較します。"
+        f"組み込みのルールは{list(DEFAULT_EDITOR_RULE_CONFIGS)}です。",
+    )
+    parser.add_argument(
+        "--rule_file", type=Path, help="エディタのルールを定義したJSONファイル。`editor_loadtime`コマンドの`--rule_file`と同じ形式です。"
+    )
+    parser.add_argument(
+        "-n", "--nth_frame", type=int, nargs="+", default=[], help="N枚目のフレームの読み込みが完了するまでの時間も比較します（1始まり）。"
+    )
+    parser.add_argument("--quantile", type=float, default=DEFAULT_QUANTILE, help="比較する分位点（0以上1以下）。0.5ならば中央値を比較します。")
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE, help="差の信頼区間の信頼係数")
+    parser.add_argument("--bootstrap_iterations", type=int, default=DEFAULT_BOOTSTRAP_ITERATIONS, help="ブートストラップで復元抽出する回数")
+    parser.add_argument(
+        "--min_count", type=int, default=DEFAULT_MIN_COUNT, help="変更前と変更後の両方で、値がこの個数以上あるグループだけを比較します。"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="ブートストラップの乱数のシード。同じシードならば、`--jobs`によらず同じ結果になります。")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="並列に処理するプロセス数")
+    parser.add_argument("-o", "--output", type=Path, help="出力先。未指定ならば標準出力に出力します。")
+
+    return parser
@@ -0,0 +1,109 @@
+"""
+圧縮されたHARファイル（`.har.gz`, `.har.zst`, `.har.xz`）を扱います。
+
+圧縮形式はファイル名の拡張子で判定します。
+ファイルはストリームとして展開・圧縮するので、展開後のファイル全体をディスクに書き出したり、圧縮されたファイル全体をメモリに読み込んだりしません。
+zstdを扱うには`zstandard`をインストールしてください。
+"""
+
+import gzip
+import io
+import lzma
+from pathlib import Path
+from typing import BinaryIO, Literal, TextIO, cast
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".zst": "zstd", ".xz": "xz"}
+"""圧縮されたファイルの拡張子と、圧縮形式の名前"""
+
+GZIP_COMPRESS_LEVEL = 6
+"""gzipで圧縮するときの圧縮レベル。`gzip`コマンドのデフォルトと同じ"""
+
+
+def get_compression(name: str) -> str | None:
+    """
+    ファイル名の拡張子から、圧縮形式の名前を返します。圧縮されていない場合はNoneを返します。
+    """
+    for suffix, compression in COMPRESSION_SUFFIXES.items():
+        if name.endswith(suffix):
+            return compression
+    return None
+
+
+def strip_compression_suffix(name: str) -> str:
+    """
+    ファイル名から、圧縮形式の拡張子を取り除きます。
+    """
+    for suffix in COMPRESSION_SUFFIXES:
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+
+def _import_zstandard():  # noqa: ANN202
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstdで圧縮されたファイルを扱うには、`zstandard`をインストールしてください。 :: `pip install zstandard`") from e
+    return zstandard
+
+
+def decompress_bytes(data: bytes, compression: str | None) -> bytes:
+    """
+    圧縮されたバイト列を展開します。`compression`がNoneならば、そのまま返します。
+    """
+    if compression is None:
+        return data
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        # 展開後のサイズがフレームヘッダに記録されていない場合や、複数のフレームを連結した場合にも対応するため、ストリームとして展開する
+        with _import_zstandard().ZstdDecompressor().stream_reader(data, read_across_frames=True) as reader:
+            return reader.read()
+    if compression == "xz":
+        return lzma.decompress(data)
+    raise ValueError(f"Unexpected compression: {compression}")
+
+
+def compress_bytes(data: bytes, compression: str | None) -> bytes:
+    """
+    バイト列を圧縮します。`compression`がNoneならば、そのまま返します。
+    """
+    if compression is None:
+        return data
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_COMPRESS_LEVEL)
+    if compression == "zstd":
+        return _import_zstandard().ZstdCompressor().compress(data)
+    if compression == "xz":
+        return lzma.compress(data)
+    raise ValueError(f"Unexpected compression: {compression}")
+
+
+def open_compressed(file: Path, mode: Literal["rb", "wb"]) -> BinaryIO:
+    """
+    ファイルをバイナリモードで開きます。拡張子が`.gz`、`.zst`、`.xz`の場合は、読み込み時に展開し、書き込み時に圧縮するストリームを返します。
+    """
+    compression = get_compression(file.name)
+    if compression is None:
+        return cast(BinaryIO, file.open(mode))
+    if compression == "gzip":
+        return cast(BinaryIO, gzip.open(file, mode, compresslevel=GZIP_COMPRESS_LEVEL))
+    if compression == "xz":
+        return cast(BinaryIO, lzma.open(file, mode))
+    if compression == "zstd":
+        zstandard = _import_zstandard()
+        fp = file.open(mode)
+        if mode == "rb":
+            return cast(BinaryIO, zstandard.ZstdDecompressor().stream_reader(fp, read_across_frames=True, closefd=True))
+        return cast(BinaryIO, zstandard.ZstdCompressor().stream_writer(fp, closefd=True))
+    raise ValueError(f"Unexpected compression: {compression}")
+
+
+def open_text(file: Path) -> TextIO:
+    """
+    ファイルをUTF-8のテキストとして読み込むために開きます。圧縮されたファイルは、読み込みながら展開します。
+    改行文字は変換しません。
+    """
+    if get_compression(file.name) is None:
+        return file.open(encoding="utf-8", newline="")
+    return io.TextIOWrapper(open_compressed(file, "rb"), encoding="utf-8", newline="")
@@ -1,58 +1,264 @@
+"""
+アノテーションエディタ画面のHARファイルから、フレームの読み込み時間を算出します。
+
+エディタの種類ごとに、以下のリクエストを判定するルールを定義します。ルールは`ahs.entry_filter`のフィルタ式のリストです。
+
+    * `start` : エディタ画面を開いたときのリクエスト。未指定ならば、HARファイルの最初のリクエストを開始とみなします。
+    * `end` : 全フレームの読み込みが完了した後に送信されるリクエスト。未指定ならば、最後のフレームの読み込み完了を終了とみなします。
+    * `frame` : フレームのリクエスト
+
+ルールは最初に1回だけコンパイルし、entryを先頭から1回だけ走査して、すべてのルールを判定します。
+"""
+
 import argparse
+import copy
 import datetime
+import functools
 import json
+import sys
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
+
+from ahs.entry_filter import EntryFilter, compile_entry_filter
+from ahs.har_files import collect_har_files
+from ahs.har_io import load_json_file
+from ahs.har_stream import iter_har_file_entries
+from ahs.profiling import get_profiler, run_with_profile
+from ahs.utils import parse_iso_datetime
+
+EditorRuleConfig = dict[str, list[str] | None]
+"""エディタの種類ごとのルールの設定。`start`、`end`、`frame`をキー、フィルタ式のリストを値とするdict"""
+
+DEFAULT_EDITOR_RULE_CONFIGS: dict[str, EditorRuleConfig] = {
+    "3dpc": {
+        "start": ["method=GET", "url^=https://d2rljy8mjgrfyd.cloudfront.net/3d-editor-latest/index.html"],
+        "end": ["method=POST", "url$=validate-operation"],
+        "frame": ["method=GET", r"url~https://.*amazonaws\.com/"],
+    },
+    "image": {
+        "start": None,
+        "end": None,
+        "frame": ["method=GET", "mime^=image/", r"url~https://.*amazonaws\.com/"],
+    },
+    "video": {
+        "start": None,
+        "end": None,
+        "frame": ["method=GET", "mime^=video/", r"url~https://.*amazonaws\.com/"],
+    },
+}
+"""組み込みのルールの設定"""
+
+
+class EditorRule(NamedTuple):
+    """
+    コンパイル済みのルール
+    """
+
+    editor_type: str
+    start: EntryFilter | None
+    end: EntryFilter | None
+    frame: EntryFilter
+
+
+def compile_editor_rule(editor_type: str, config: EditorRuleConfig) -> EditorRule:
+    """
+    ルールの設定をコンパイルします。
+    """
+    start = config.get("start")
+    end = config.get("end")
+    frame = config.get("frame")
+    if not frame:
+        raise ValueError(f"エディタの種類'{editor_type}'のルールに`frame`が指定されていません。")
+    return EditorRule(
+        editor_type,
+        start=compile_entry_filter(start) if start else None,
+        end=compile_entry_filter(end) if end else None,
+        frame=compile_entry_filter(frame),
+    )
 
 
-def match_start_request(request: dict[str, Any]) -> bool:
-    url = request["url"]
-    method = request["method"]
-    return method == "GET" and url.startswith("https://d2rljy8mjgrfyd.cloudfront.net/3d-editor-latest/index.html")
+def load_editor_rule_configs(rule_file: Path | None = None) -> dict[str, EditorRuleConfig]:
+    """
+    組み込みのルールの設定に、`rule_file`（JSON）で定義したルールを上書きして返します。
+
+    `rule_file`の形式は`{"エディタの種類": {"start": [...], "end": [...], "frame": [...]}}`です。
+    """
+    configs = copy.deepcopy(DEFAULT_EDITOR_RULE_CONFIGS)
+    if rule_file is not None:
+        for editor_type, config in load_json_file(rule_file).items():
+            configs[editor_type] = {**configs.get(editor_type, {}), **config}
+    return configs
+
+
+class EditorLoadingTimeDetector:
+    """
+    entryを1件ずつ受け取って、フレームの読み込み時間を算出します。
+
+    `start`のルールがある場合、最初の`start`のリクエストより前のentryは、`end`のリクエストも含めて無視します。
+    `start`のリクエストが複数回現れた場合（画面を再読み込みした場合など）は、最後の`start`から計測し直します。
+    `end`のリクエストが現れた後のentryは無視します。
+
+    Args:
+        rule: コンパイル済みのルール
+        nth_frames: 読み込みが完了するまでの時間を算出するフレームの番号（1始まり）
+    """
 
+    def __init__(self, rule: EditorRule, *, nth_frames: list[int] | None = None) -> None:
+        self.rule = rule
+        self.nth_frames = nth_frames if nth_frames is not None else []
+        self.start_request_time: str | None = None
+        self.end_request_time: str | None = None
+        self._frames: list[tuple[datetime.datetime, datetime.datetime]] = []
+        """フレームのリクエストの開始日時と完了日時"""
 
-def match_end_request(request: dict[str, Any]) -> bool:
-    url = request["url"]
-    method = request["method"]
-    return method == "POST" and url.endswith("validate-operation")
+    def add(self, entry: dict[str, Any]) -> None:
+        if self.end_request_time is not None:
+            return
+
+        rule = self.rule
+        if rule.start is not None:
+            if rule.start.match_entry(entry):
+                self.start_request_time = entry["startedDateTime"]
+                self._frames = []
+                return
+            if self.start_request_time is None:
+                return
+        elif self.start_request_time is None:
+            self.start_request_time = entry["startedDateTime"]
+
+        if rule.end is not None and rule.end.match_entry(entry):
+            self.end_request_time = entry["startedDateTime"]
+        elif rule.frame.match_entry(entry):
+            started = parse_iso_datetime(entry["startedDateTime"])
+            self._frames.append((started, started + datetime.timedelta(milliseconds=entry["time"])))
+
+    def get_result(self) -> dict[str, Any]:
+        """
+        以下のキーを持つdictを返します。時間の単位は秒です。存在しない場合はNoneです。
+
+        * `start_request.startedDateTime`, `end_request.startedDateTime`
+        * `time_seconds` : `start`のリクエストから`end`のリクエストまでの時間。`end`のルールがない場合は`all_frames_seconds`と同じ
+        * `frame_count` : フレームのリクエストの個数
+        * `first_frame_seconds`, `{N}_frame_seconds`, `all_frames_seconds` :
+          `start`のリクエストから、最初/N枚目/すべてのフレームの読み込みが完了するまでの時間
+        """
+        start_request_time = self.start_request_time
+        end_request_time = self.end_request_time
+        result: dict[str, Any] = {"start_request.startedDateTime": start_request_time, "end_request.startedDateTime": end_request_time}
+
+        start = parse_iso_datetime(start_request_time) if start_request_time is not None else None
+        frames = sorted(self._frames)
+
+        def get_elapsed_seconds(completed: datetime.datetime | None) -> float | None:
+            if start is None or completed is None:
+                return None
+            return (completed - start).total_seconds()
+
+        all_frames_seconds = get_elapsed_seconds(max(e[1] for e in frames)) if len(frames) > 0 else None
+        if self.rule.end is not None:
+            end = parse_iso_datetime(end_request_time) if end_request_time is not None else None
+            result["time_seconds"] = get_elapsed_seconds(end)
+        else:
+            result["time_seconds"] = all_frames_seconds
+
+        result["frame_count"] = len(frames)
+        result["first_frame_seconds"] = get_elapsed_seconds(frames[0][1]) if len(frames) > 0 else None
+        for nth_frame in self.nth_frames:
+            result[f"{nth_frame}_frame_seconds"] = get_elapsed_seconds(frames[nth_frame - 1][1]) if len(frames) >= nth_frame else None
+        result["all_frames_seconds"] = all_frames_seconds
+        return result
+
+
+class Editor3dpcLoadingTimeCalculator(EditorLoadingTimeDetector):
+    """
+    entryを1件ずつ受け取って、3次元エディタで全フレームを読み込むまでの時間を算出します。
+    """
+
+    def __init__(self) -> None:
+        super().__init__(compile_editor_rule("3dpc", DEFAULT_EDITOR_RULE_CONFIGS["3dpc"]))
+
+
+def calc_editor_loading_time(data: dict[str, Any], rule: EditorRule, *, nth_frames: list[int] | None = None) -> dict[str, Any]:
+    """
+    harファイルの内容から、フレームの読み込み時間を算出します。
+    """
+    detector = EditorLoadingTimeDetector(rule, nth_frames=nth_frames)
+    for entry in data["log"]["entries"]:
+        detector.add(entry)
+    return detector.get_result()
 
 
 def calc_3dpc_editor_loading_time(data: dict[str, Any]) -> dict[str, Any]:
     """
     harファイルの内容から、全フレームを読み込むまでの時間を算出します。
     """
-    start_request_time = None
-    end_request_time = None
+    calculator = Editor3dpcLoadingTimeCalculator()
     for entry in data["log"]["entries"]:
-        request = entry["request"]
-        if match_start_request(request):
-            start_request_time = entry["startedDateTime"]
-            continue
-
-        if match_end_request(request):
-            end_request_time = entry["startedDateTime"]
-            break
-
-    result = {"start_request.startedDateTime": start_request_time, "end_request.startedDateTime": end_request_time}
-    if start_request_time is not None and end_request_time is not None:
-        time_seconds = (datetime.datetime.fromisoformat(end_request_time) - datetime.datetime.fromisoformat(start_request_time)).total_seconds()
-        result["time_seconds"] = time_seconds
-    else:
-        result["time_seconds"] = None
+        calculator.add(entry)
+    return calculator.get_result()
+
 
+@functools.cache
+def _get_compiled_rule(editor_type: str, config_json: str) -> EditorRule:
+    # コンパイル済みのルールはpickleできないので、プロセスプールのワーカーごとにコンパイルしてキャッシュする
+    return compile_editor_rule(editor_type, json.loads(config_json))
+
+
+def _calc_editor_loading_time_of_file(har_file: Path, editor_type: str, config_json: str, nth_frames: list[int]) -> dict[str, Any]:
+    rule = _get_compiled_rule(editor_type, config_json)
+    profiler = get_profiler()
+    try:
+        with profiler.file(har_file), profiler.stage("detect"):
+            detector = EditorLoadingTimeDetector(rule, nth_frames=nth_frames)
+            entry_count = 0
+            for entry in iter_har_file_entries(har_file):
+                detector.add(entry)
+                entry_count += 1
+            profiler.add_entries(entry_count)
+            result = detector.get_result()
+    except Exception as e:
+        result = {"error": f"{type(e).__name__}: {e}"}
+    result["har_file"] = str(har_file)
     return result
 
 
+def calc_editor_loading_time_of_files(
+    har_files: list[Path], editor_type: str, rule_configs: Mapping[str, EditorRuleConfig], *, nth_frames: list[int], jobs: int = 1
+) -> list[dict[str, Any]]:
+    """
+    複数のHARファイルについて、フレームの読み込み時間を算出します。
+    `jobs`が2以上ならば、プロセスプールで並列に処理します。
+    読み込みに失敗したHARファイルは、`error`キーにエラーの内容を格納します。
+
+    Returns:
+        HARファイルごとの結果。`har_files`と同じ順番です。
+    """
+    if editor_type not in rule_configs:
+        raise ValueError(f"'{editor_type}'は不正なエディタの種類です。 :: {list(rule_configs)}のいずれかを指定してください。")
+    config_json = json.dumps(rule_configs[editor_type])
+    # 不正なルールは、HARファイルを読み込む前にエラーにする
+    _get_compiled_rule(editor_type, config_json)
+
+    func = functools.partial(_calc_editor_loading_time_of_file, editor_type=editor_type, config_json=config_json, nth_frames=nth_frames)
+    if jobs <= 1:
+        return [func(har_file) for har_file in har_files]
+
+    profiler = get_profiler()
+    profiled_func = functools.partial(run_with_profile, profiler.enabled, func)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results: list[dict[str, Any]] = []
+        for result, file_profiles in executor.map(profiled_func, har_files, chunksize=max(1, len(har_files) // (jobs * 4))):
+            profiler.merge(file_profiles)
+            results.append(result)
+        return results
+
+
 def main(args: argparse.Namespace) -> None:
-    result = []
-    for har_file in args.har_file:
-        input_data = json.loads(har_file.read_text(encoding="utf-8"))
-        if args.type == "3dpc":
-            sub_result = calc_3dpc_editor_loading_time(input_data)
-        else:
-            raise ValueError(f"Unexpected type: {args.type}")
-        sub_result["har_file"] = str(har_file)
-        result.append(sub_result)
+    har_files = [e.path for e in collect_har_files(args.har_file)]
+    rule_configs = load_editor_rule_configs(args.rule_file)
+    result = calc_editor_loading_time_of_files(har_files, args.type, rule_configs, nth_frames=args.nth_frame, jobs=args.jobs)
 
     output_string = json.dumps(result, ensure_ascii=False, indent=2)
     if args.output is not None:
@@ -62,26 +268,40 @@ def main(args: argparse.Namespace) -> None:
     else:
         print(output_string)  # noqa: T201
 
+    error_count = sum(1 for e in result if "error" in e)
+    if error_count > 0:
+        print(f"{error_count}/{len(result)}件のHARファイルの処理に失敗しました。", file=sys.stderr)  # noqa: T201
+        sys.exit(1)
+
 
 def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
     subcommand_name = "editor_loadtime"
-    subcommand_help = "Annofabのアノテーションエディタ画面のHARファイルから、全フレームを読み込むまでの時間を出力します。"
+    subcommand_help = "Annofabのアノテーションエディタ画面のHARファイルから、フレームを読み込むまでの時間を出力します。"
 
     parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
     parser.set_defaults(func=main)
 
-    parser.add_argument("har_file", type=Path, nargs="+", help="HARファイルのパス。")
-    parser.add_argument("--type", required=True, choices=["3dpc", "image", "video"], help="アノテーションエディタ画面の種類")
-    parser.add_argument("-o", "--output", type=Path, help="出力先。未指定ならば標準出力に出力します。")
-
-    return parser
-
-
-def create_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(
-        description="3次元エディタにアクセスしたときのHARファイルから、全フレームを読み込むまでの時間を算出します。"
-        "`index.html`のリクエストから`validate-operation` APIのリクエストまでの時間の差分を、全フレームを読み込むまでの時間とします。"
+    parser.add_argument(
+        "har_file",
+        type=Path,
+        nargs="+",
+        help="HARファイルのパス。ディレクトリ（配下の`*.har`、`*.har.gz`、`*.har.zst`、`*.har.xz`ファイルを再帰的に処理）やglobパターンも指定できます。",
     )
-    parser.add_argument("har_file", type=Path, nargs="+", help="HARファイルのパス。")
+    parser.add_argument(
+        "--type",
+        required=True,
+        help=f"アノテーションエディタ画面の種類。組み込みのルールは{list(DEFAULT_EDITOR_RULE_CONFIGS)}です。`--rule_file`で独自の種類を追加できます。",
+    )
+    parser.add_argument(
+        "--rule_file",
+        type=Path,
+        help='ルールを定義したJSONファイル。`{"エディタの種類": {"start": [フィルタ式], "end": [フィルタ式], "frame": [フィルタ式]}}`の形式です。'
+        "組み込みのルールを上書きします。",
+    )
+    parser.add_argument(
+        "-n", "--nth_frame", type=int, nargs="+", default=[], help="N枚目のフレームの読み込みが完了するまでの時間も出力します（1始まり）。"
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="並列に処理するプロセス数。")
     parser.add_argument("-o", "--output", type=Path, help="出力先。未指定ならば標準出力に出力します。")
+
     return parser
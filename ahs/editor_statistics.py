@@ -0,0 +1,187 @@
+"""
+`to_timing_csv`コマンドで出力したCSVから、エディタ画面のフレームの読み込み時間などの統計情報を算出します。
+
+HARファイルごとの集計は、`groupby`の集約関数だけで行います。HARファイルごとのPythonのループや、行ごとの日時のパースは行いません。
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from ahs.profiling import get_profiler
+
+if TYPE_CHECKING:
+    import pandas
+
+DEFAULT_FRAME_CONTENT_TYPE = "image/png"
+
+STATISTICS_COLUMNS = [
+    "frame_count",
+    "throughput",
+    "timings.receive_mean",
+    "timings.receive_median",
+    "timings.receive_min",
+    "timings.receive_max",
+    "timings.receive_std",
+    "response.headers.contentLength_mean",
+    "response.headers.contentLength_min",
+    "response.headers.contentLength_max",
+    "response.headers.contentLength_std",
+    "fail_count",
+    "response.headers.contentLength_sum",
+    "timings.receive_sum",
+]
+"""`create_dataframe_frame_request_statistics`が出力する列（`har_file`以外）"""
+
+_DEFAULT_HAR_FILE = "default"
+"""`har_file`列が存在しない場合（単一のHARファイルから出力したCSVの場合）に利用するHARファイル名"""
+
+
+def _get_har_file_column(df: "pandas.DataFrame") -> "pandas.Series":
+    import pandas
+
+    if "har_file" in df.columns:
+        return df["har_file"]
+    return pandas.Series(_DEFAULT_HAR_FILE, index=df.index, name="har_file")
+
+
+def create_dataframe_frame_request_statistics(df: "pandas.DataFrame", frame_content_type: str = DEFAULT_FRAME_CONTENT_TYPE) -> "pandas.DataFrame":
+    """
+    HARファイルごとに、フレームのリクエストの統計情報を算出します。
+    フレームのリクエストが存在しないHARファイルは出力しません。
+
+    標準偏差は母標準偏差（ddof=0）です。
+    `fail_count`は、HTTPステータスが200以外のリクエストの個数です。
+
+    Args:
+        df: `to_timing_csv`コマンドで出力したCSVを読み込んだDataFrame
+        frame_content_type: フレームのContent-Type
+    """
+    import numpy
+    import pandas
+
+    is_frame = (df["response.content.mimeType"] == frame_content_type).to_numpy()
+    status = pandas.to_numeric(df["response.status"][is_frame], errors="coerce")
+    frames = pandas.DataFrame(
+        {
+            "har_file": _get_har_file_column(df)[is_frame],
+            "startedDateTime": df["startedDateTime"][is_frame],
+            "timings.receive": pandas.to_numeric(df["timings.receive"][is_frame], errors="coerce"),
+            "response.headers.contentLength": pandas.to_numeric(df["response.headers.contentLength"][is_frame], errors="coerce").astype("float64"),
+            "is_failed": status != 200,
+        }
+    )
+
+    summary = frames.groupby("har_file", sort=True).agg(
+        **{
+            "frame_count": ("startedDateTime", "count"),
+            "timings.receive_mean": ("timings.receive", "mean"),
+            "timings.receive_median": ("timings.receive", "median"),
+            "timings.receive_min": ("timings.receive", "min"),
+            "timings.receive_max": ("timings.receive", "max"),
+            "timings.receive_std": ("timings.receive", "std"),
+            "timings.receive_sum": ("timings.receive", "sum"),
+            "timings.receive_count": ("timings.receive", "count"),
+            "response.headers.contentLength_mean": ("response.headers.contentLength", "mean"),
+            "response.headers.contentLength_min": ("response.headers.contentLength", "min"),
+            "response.headers.contentLength_max": ("response.headers.contentLength", "max"),
+            "response.headers.contentLength_std": ("response.headers.contentLength", "std"),
+            "response.headers.contentLength_sum": ("response.headers.contentLength", "sum"),
+            "response.headers.contentLength_count": ("response.headers.contentLength", "count"),
+            "fail_count": ("is_failed", "sum"),
+        }
+    )
+
+    # `std`は標本標準偏差（ddof=1）なので、母標準偏差（ddof=0）に変換する。値が1個の場合は0、値が存在しない場合はNaNにする
+    for column in ["timings.receive", "response.headers.contentLength"]:
+        count = summary.pop(f"{column}_count")
+        std = summary[f"{column}_std"] * numpy.sqrt(((count - 1) / count).where(count > 0))
+        summary[f"{column}_std"] = std.mask(count == 1, 0.0)
+
+    summary["throughput"] = summary["response.headers.contentLength_sum"] / summary["timings.receive_sum"]
+    return summary[STATISTICS_COLUMNS].reset_index()
+
+
+def create_dataframe_nth_frames_loading_time(
+    df: "pandas.DataFrame", nth_frames: list[int], frame_content_type: str = DEFAULT_FRAME_CONTENT_TYPE
+) -> "pandas.DataFrame":
+    """
+    HARファイルごとに、最初のリクエストからN枚目のフレームの読み込みが完了するまでの時間[秒]を算出します。
+    フレームのリクエストがN個未満の場合は、NaNになります。
+
+    Args:
+        df: `to_timing_csv`コマンドで出力したCSVを読み込んだDataFrame
+        nth_frames: N枚目のフレーム（1始まり）
+        frame_content_type: フレームのContent-Type
+    """
+    import pandas
+
+    requests = pandas.DataFrame(
+        {
+            "har_file": _get_har_file_column(df),
+            "startedDateTime": df["startedDateTime"],
+            "started": pandas.to_datetime(df["startedDateTime"], format="ISO8601", utc=True),
+            "time": pandas.to_numeric(df["time"], errors="coerce"),
+            "is_frame": df["response.content.mimeType"] == frame_content_type,
+        }
+    )
+    requests = requests.dropna(subset=["har_file"]).sort_values(["har_file", "started"], kind="stable")
+
+    first_requests = requests.drop_duplicates("har_file").set_index("har_file")
+    result = pandas.DataFrame({"first_startedDateTime": first_requests["startedDateTime"]})
+
+    frames = requests[requests["is_frame"]].copy()
+    frames["nth_frame"] = frames.groupby("har_file", sort=False).cumcount() + 1
+    frames = frames[frames["nth_frame"].isin(nth_frames)]
+    first_started = frames["har_file"].map(first_requests["started"])
+    frames["elapsed_seconds"] = (frames["started"] - first_started).dt.total_seconds() + frames["time"] / 1000.0
+    elapsed_seconds = frames.pivot_table(index="har_file", columns="nth_frame", values="elapsed_seconds", aggfunc="first", dropna=False)
+
+    for nth_frame in nth_frames:
+        column = elapsed_seconds[nth_frame] if nth_frame in elapsed_seconds.columns else None
+        result[f"{nth_frame}_frame_elapsed_seconds"] = column
+    return result.rename_axis("har_file").reset_index()
+
+
+def create_dataframe_editor_statistics(
+    df: "pandas.DataFrame", nth_frames: list[int], frame_content_type: str = DEFAULT_FRAME_CONTENT_TYPE
+) -> "pandas.DataFrame":
+    """
+    `create_dataframe_nth_frames_loading_time`と`create_dataframe_frame_request_statistics`の結果を、HARファイルごとに結合します。
+    """
+    df_loading_time = create_dataframe_nth_frames_loading_time(df, nth_frames=nth_frames, frame_content_type=frame_content_type)
+    df_statistics = create_dataframe_frame_request_statistics(df, frame_content_type=frame_content_type)
+    return df_loading_time.merge(df_statistics, on="har_file", how="left")
+
+
+def main(args: argparse.Namespace) -> None:
+    import pandas
+
+    profiler = get_profiler()
+    with profiler.stage("read_csv"):
+        df_input = pandas.read_csv(args.csv_path)
+    with profiler.stage("statistics"):
+        df_output = create_dataframe_editor_statistics(df_input, nth_frames=args.nth_frame, frame_content_type=args.frame_content_type)
+
+    with profiler.stage("write"):
+        if args.output is not None:
+            args.output.parent.mkdir(exist_ok=True, parents=True)
+            df_output.to_csv(args.output, index=False, encoding="utf-8")
+        else:
+            df_output.to_csv(sys.stdout, index=False, encoding="utf-8")
+
+
+def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
+    subcommand_name = "editor_statistics"
+    subcommand_help = "`to_timing_csv`コマンドで出力したCSVから、HARファイルごとにフレームの読み込み時間などの統計情報を出力します。"
+
+    parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
+    parser.set_defaults(func=main)
+
+    parser.add_argument("csv_path", type=Path, help="エディタ画面のHARファイルに対して、`to_timing_csv`コマンドで出力したCSVファイルのパス")
+    parser.add_argument("-o", "--output", type=Path, help="出力先。未指定ならば標準出力に出力します。")
+    parser.add_argument("-n", "--nth_frame", type=int, nargs="+", default=[1], help="N枚目のフレームのリクエストを指定します（1始まり）")
+    parser.add_argument("--frame_content_type", default=DEFAULT_FRAME_CONTENT_TYPE, help="フレームのContent-Type")
+
+    return parser
@@ -0,0 +1,304 @@
+"""
+`log.entries`の要素を絞り込むための、フィルタ式を扱います。
+
+フィルタ式は`{フィールド}{演算子}{値}`の形式です。複数のフィルタ式を指定した場合は、すべてを満たすentryを選択します。
+
+    * `host=example.com` : URLのホストが`example.com`
+    * `path^=/api/` : URLのパスが`/api/`で始まる
+    * `mime^=image/` : MIMEタイプが`image/`で始まる
+    * `status=200..299` : HTTPステータスが200以上299以下
+    * `time>=1000` : `time`が1000ミリ秒以上
+
+フィルタ式は最初に1回だけコンパイルします。
+抽出済みの列に対しては、列ごとにまとめてマスク（bool配列）を計算するので、entryごとに正規表現をコンパイルしたり、dictを辿ったりする処理が発生しません。
+"""
+
+import functools
+import math
+import operator
+import re
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from ahs.timing_columns import TIMING_KEYS, TimingColumns, get_row_count, select_timing_columns
+
+if TYPE_CHECKING:
+    import numpy
+
+    from ahs.har_index import HarIndexRecord
+
+_URL_HOST_PATTERN = re.compile(r"[^:/?#]+://(?:[^/?#@]*@)?(\[[^\]/?#]*\]|[^:/?#]*)")
+_URL_PATH_PATTERN = re.compile(r"[^:/?#]+://[^/?#]*([^?#]*)")
+
+
+def get_url_host(url: str) -> str:
+    """
+    URLのホストを小文字で返します。`urllib.parse.urlsplit(url).hostname`と同じ値ですが、ホストが存在しない場合は空文字列を返します。
+    """
+    match = _URL_HOST_PATTERN.match(url)
+    if match is None:
+        return ""
+    return match.group(1).strip("[]").lower()
+
+
+def get_url_path(url: str) -> str:
+    """
+    URLのパスを返します。
+    """
+    match = _URL_PATH_PATTERN.match(url)
+    if match is None:
+        return ""
+    return match.group(1)
+
+
+class FilterField(NamedTuple):
+    """
+    フィルタ式で指定できるフィールド
+    """
+
+    column: str
+    """値を取り出す列の名前。`TIMING_COLUMNS`のいずれか"""
+    is_numeric: bool
+    convert: Callable[[str], str] | None = None
+    """列の値からフィールドの値に変換する関数。URLからホストを取り出す場合など"""
+    index_attribute: str | None = None
+    """索引のレコード（`HarIndexRecord`）で、このフィールドの値を持つ属性の名前"""
+
+
+FILTER_FIELDS: dict[str, FilterField] = {
+    "url": FilterField("request.url", is_numeric=False),
+    "host": FilterField("request.url", is_numeric=False, convert=get_url_host, index_attribute="host"),
+    "path": FilterField("request.url", is_numeric=False, convert=get_url_path),
+    "method": FilterField("request.method", is_numeric=False, index_attribute="method"),
+    "mime": FilterField("response.content.mimeType", is_numeric=False, index_attribute="mime_type"),
+    "status": FilterField("response.status", is_numeric=True, index_attribute="status"),
+    "size": FilterField("response.content.size", is_numeric=True),
+    "time": FilterField("time", is_numeric=True),
+    **{f"timings.{key}": FilterField(f"timings.{key}", is_numeric=True) for key in TIMING_KEYS},
+}
+"""フィルタ式で指定できるフィールド"""
+
+STRING_OPERATORS = ["=", "!=", "^=", "$=", "*=", "~", "!~"]
+"""文字列のフィールドに指定できる演算子。`^=`は前方一致、`$=`は後方一致、`*=`は部分一致、`~`は正規表現にマッチ、`!~`は正規表現にマッチしない"""
+
+NUMERIC_OPERATORS = ["=", "!=", "<", "<=", ">", ">="]
+"""数値のフィールドに指定できる演算子。`=`の値には`200..299`のような範囲（両端を含む）も指定できます。"""
+
+FILTER_PRESETS: dict[str, list[str]] = {
+    "s3": [r"url~https://.*amazonaws\.com/"],
+}
+"""名前を付けたフィルタ式の組み合わせ。`s3`は`--only_s3_path`と同じです。"""
+
+_EXPRESSION_PATTERN = re.compile(r"(?P<field>[A-Za-z_.]+)\s*(?P<operator>!=|\^=|\$=|\*=|!~|<=|>=|=|<|>|~)\s*(?P<value>.*)", re.DOTALL)
+
+_NUMERIC_OPERATOR_FUNCTIONS: dict[str, Callable[[Any, Any], Any]] = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def _create_string_predicate(operator_name: str, value: str) -> Callable[[str], Any]:
+    """
+    文字列が条件を満たすかどうかを判定する関数を返します。関数の戻り値は真偽値として扱います。
+    """
+    if operator_name in {"~", "!~"}:
+        pattern = re.compile(value)
+        if operator_name == "~":
+            return pattern.search
+        return lambda s: pattern.search(s) is None
+
+    predicates: dict[str, Callable[[str], Any]] = {
+        "=": value.__eq__,
+        "!=": value.__ne__,
+        "^=": lambda s: s.startswith(value),
+        "$=": lambda s: s.endswith(value),
+        "*=": value.__contains__,
+    }
+    return predicates[operator_name]
+
+
+class FilterCondition:
+    """
+    コンパイル済みのフィルタ式1個分の条件です。`parse_filter_expression`で生成します。
+    """
+
+    def __init__(self, expression: str, field_name: str, operator_name: str, value: str) -> None:
+        self.expression = expression
+        self.field_name = field_name
+        self.field = FILTER_FIELDS[field_name]
+        self.operator_name = operator_name
+        self._keys = tuple(self.field.column.split("."))
+
+        if not self.field.is_numeric:
+            if field_name == "host":
+                value = value.lower()
+            self._string_predicate = _create_string_predicate(operator_name, value)
+            return
+
+        self._range: tuple[float, float] | None = None
+        self._number = math.nan
+        if operator_name == "=" and ".." in value:
+            lower, _, upper = value.partition("..")
+            self._range = (float(lower) if lower != "" else -math.inf, float(upper) if upper != "" else math.inf)
+        else:
+            self._number = float(value)
+        self._numeric_operator = _NUMERIC_OPERATOR_FUNCTIONS[operator_name]
+
+    def match_value(self, value: Any) -> bool:  # noqa: ANN401
+        """
+        フィールドの値が条件を満たすかどうかを返します。
+        """
+        if not self.field.is_numeric:
+            return bool(self._string_predicate(value if value is not None else ""))
+        if value is None:
+            value = math.nan
+        if self._range is not None:
+            return self._range[0] <= value <= self._range[1]
+        return self._numeric_operator(value, self._number)
+
+    def get_entry_value(self, entry: dict[str, Any]) -> Any:  # noqa: ANN401
+        value: Any = entry
+        for key in self._keys:
+            value = value.get(key)
+            if value is None:
+                return None
+        if self.field.convert is not None:
+            value = self.field.convert(value)
+        return value
+
+    def match_entry(self, entry: dict[str, Any]) -> bool:
+        return self.match_value(self.get_entry_value(entry))
+
+    def compute_mask(self, columns: TimingColumns) -> "numpy.ndarray":
+        """
+        抽出済みの列に対して、行ごとに条件を満たすかどうかを表すbool配列を返します。
+        """
+        import numpy
+
+        values = columns[self.field.column]
+        if self.field.is_numeric:
+            array = numpy.frombuffer(values, dtype=numpy.float64 if values.typecode == "d" else numpy.int64)
+            if self._range is not None:
+                return (array >= self._range[0]) & (array <= self._range[1])
+            return self._numeric_operator(array, self._number)
+
+        convert = self.field.convert
+        if convert is not None:
+            values = list(map(convert, values))
+        unique_values = set(values)
+        if len(unique_values) > len(values) // 2:
+            # URLのように値がほとんど重複しない場合は、すべての値を判定する
+            return numpy.fromiter(map(self._string_predicate, values), dtype=numpy.bool_, count=len(values))
+        # MIMEタイプやホストのように同じ値が繰り返し現れる場合は、値ごとに1回だけ判定する
+        results = {value: bool(self._string_predicate(value)) for value in unique_values}
+        return numpy.fromiter(map(results.__getitem__, values), dtype=numpy.bool_, count=len(values))
+
+
+def parse_filter_expression(expression: str) -> FilterCondition:
+    """
+    フィルタ式をコンパイルします。
+
+    Raises:
+        ValueError: フィルタ式が不正な場合
+    """
+    match = _EXPRESSION_PATTERN.fullmatch(expression.strip())
+    if match is None:
+        raise ValueError(f"'{expression}'は不正なフィルタ式です。 :: `{{フィールド}}{{演算子}}{{値}}`の形式で指定してください。")
+
+    field_name = match.group("field")
+    operator_name = match.group("operator")
+    value = match.group("value")
+    field = FILTER_FIELDS.get(field_name)
+    if field is None:
+        raise ValueError(f"フィルタ式'{expression}'のフィールド'{field_name}'は不正です。 :: {list(FILTER_FIELDS)}のいずれかを指定してください。")
+
+    allowed_operators = NUMERIC_OPERATORS if field.is_numeric else STRING_OPERATORS
+    if operator_name not in allowed_operators:
+        raise ValueError(f"フィルタ式'{expression}'の演算子'{operator_name}'は不正です。 :: {allowed_operators}のいずれかを指定してください。")
+
+    try:
+        return FilterCondition(expression, field_name, operator_name, value)
+    except (ValueError, re.error) as e:
+        raise ValueError(f"フィルタ式'{expression}'の値'{value}'は不正です。 :: {e}") from e
+
+
+class EntryFilter:
+    """
+    複数のフィルタ式をすべて満たすentryを選択します。`compile_entry_filter`で生成します。
+    """
+
+    def __init__(self, conditions: list[FilterCondition]) -> None:
+        self.conditions = conditions
+
+    def match_entry(self, entry: dict[str, Any]) -> bool:
+        """
+        entryが条件を満たすかどうかを返します。列を抽出する前に、entryを1件ずつ判定するときに利用します。
+        """
+        for condition in self.conditions:
+            if not condition.match_entry(entry):
+                return False
+        return True
+
+    def match_index_record(self, record: "HarIndexRecord") -> bool:
+        """
+        索引のレコードに含まれるフィールドだけで判定します。
+        Falseならばentryは条件を満たさないので、entryをデコードせずに除外できます。
+        """
+        for condition in self.conditions:
+            attribute = condition.field.index_attribute
+            if attribute is not None and not condition.match_value(getattr(record, attribute)):
+                return False
+        return True
+
+    def compute_mask(self, columns: TimingColumns) -> "numpy.ndarray":
+        """
+        抽出済みの列に対して、行ごとにすべての条件を満たすかどうかを表すbool配列を返します。
+        """
+        import numpy
+
+        mask = numpy.ones(get_row_count(columns), dtype=numpy.bool_)
+        for condition in self.conditions:
+            mask &= condition.compute_mask(columns)
+        return mask
+
+    def filter_columns(self, columns: TimingColumns) -> TimingColumns:
+        """
+        抽出済みの列から、条件を満たす行だけを含む列を返します。
+        """
+        if len(self.conditions) == 0:
+            return columns
+        mask = self.compute_mask(columns)
+        if mask.all():
+            return columns
+        return select_timing_columns(columns, mask.nonzero()[0].tolist())
+
+
+def compile_entry_filter(expressions: Iterable[str] = (), *, presets: Iterable[str] = ()) -> EntryFilter:
+    """
+    フィルタ式とプリセットをコンパイルして、`EntryFilter`を生成します。
+
+    Args:
+        expressions: フィルタ式
+        presets: `FILTER_PRESETS`のキー
+    """
+    all_expressions = []
+    for preset in presets:
+        if preset not in FILTER_PRESETS:
+            raise ValueError(f"'{preset}'は不正なプリセットの名前です。 :: {list(FILTER_PRESETS)}のいずれかを指定してください。")
+        all_expressions.extend(FILTER_PRESETS[preset])
+    all_expressions.extend(expressions)
+    return EntryFilter([parse_filter_expression(expression) for expression in all_expressions])
+
+
+@functools.cache
+def compile_entry_filter_cached(expressions: tuple[str, ...]) -> EntryFilter | None:
+    """
+    フィルタ式をコンパイルしてキャッシュします。フィルタ式を指定しない場合はNoneを返します。
+
+    コンパイル済みの`EntryFilter`はpickleできないので、プロセスプールのワーカーにはフィルタ式を渡して、ワーカーごとにこの関数でコンパイルします。
+    """
+    return compile_entry_filter(expressions) if len(expressions) > 0 else None
@@ -0,0 +1,65 @@
+"""
+コマンドライン引数で指定されたファイル、ディレクトリ、globパターンから、HARファイルの一覧を取得します。
+"""
+
+import glob
+import re
+from collections.abc import Iterable
+from pathlib import Path
+from typing import NamedTuple
+
+from ahs.compression import COMPRESSION_SUFFIXES
+
+HAR_FILE_SUFFIXES = (".har", *[f".har{e}" for e in COMPRESSION_SUFFIXES])
+"""ディレクトリが指定されたときに、HARファイルとみなすファイル名の拡張子。圧縮されたHARファイルも含みます。"""
+
+_GLOB_MAGIC_PATTERN = re.compile(r"[*?[]")
+
+
+class HarFileInput(NamedTuple):
+    path: Path
+    """HARファイルのパス"""
+
+    relative_path: Path
+    """
+    出力先ディレクトリに書き込むときの相対パス。
+    ディレクトリが指定された場合は、そのディレクトリからの相対パスになります。それ以外はファイル名になります。
+    """
+
+
+def collect_har_files(paths: Iterable[Path]) -> list[HarFileInput]:
+    """
+    ファイル、ディレクトリ、globパターンから、HARファイルの一覧を取得します。
+    ディレクトリの場合は、配下の`*.har`ファイル（`*.har.gz`などの圧縮されたファイルを含む）を再帰的に探します。同じファイルは1回だけ返します。
+
+    Raises:
+        FileNotFoundError: 存在しないファイル、または何にもマッチしないglobパターンが指定された場合
+    """
+    result: list[HarFileInput] = []
+    found_paths: set[Path] = set()
+
+    def append(path: Path, relative_path: Path) -> None:
+        resolved_path = path.resolve()
+        if resolved_path in found_paths:
+            return
+        found_paths.add(resolved_path)
+        result.append(HarFileInput(path, relative_path))
+
+    for path in paths:
+        if path.is_dir():
+            for har_file in sorted(path.rglob("*.har*")):
+                if har_file.name.endswith(HAR_FILE_SUFFIXES) and har_file.is_file():
+                    append(har_file, har_file.relative_to(path))
+        elif path.exists():
+            append(path, Path(path.name))
+        elif _GLOB_MAGIC_PATTERN.search(str(path)) is not None:
+            matched_files = [Path(e) for e in sorted(glob.glob(str(path), recursive=True))]  # noqa: PTH207
+            matched_files = [e for e in matched_files if e.is_file()]
+            if len(matched_files) == 0:
+                raise FileNotFoundError(f"globパターン'{path}'にマッチするファイルが存在しません。")
+            for har_file in matched_files:
+                append(har_file, Path(har_file.name))
+        else:
+            raise FileNotFoundError(f"'{path}'は存在しません。")
+
+    return result
@@ -0,0 +1,326 @@
+"""
+HARファイルの`log.entries`の各要素について、バイト位置と検索用の情報を記録した索引ファイル（サイドカーファイル）を扱います。
+
+索引を作成しておくと、時間帯やURLで絞り込んだentryだけを、HARファイルをmmapした領域からデコードできます。
+索引ファイルはHARファイルと同じディレクトリに`{HARファイル名}.ahsidx`という名前で作成します。
+HARファイルと同じディレクトリに書き込めない場合（読み取り専用のディレクトリなど）は、キャッシュディレクトリに作成します。
+
+索引ファイルの形式:
+    * 1行目: マジックナンバー`AHSIDX1`
+    * 2行目: ヘッダ（JSON）。HARファイルのサイズと更新日時、HTTPメソッド/ホスト/MIMEタイプの文字列テーブルなど
+    * 3行目以降: `RECORD_STRUCT`でパックした、entryごとの固定長のレコード
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import mmap
+import re
+import struct
+import sys
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any, NamedTuple
+from urllib.parse import urlsplit
+
+from ahs.compression import get_compression
+from ahs.har_io import get_json_backend
+from ahs.profiling import get_profiler
+from ahs.utils import get_cache_base_dir, parse_iso_datetime
+
+INDEX_FILE_SUFFIX = ".ahsidx"
+
+INDEX_MAGIC = b"AHSIDX1\n"
+
+RECORD_STRUCT = struct.Struct("<QQdIHHh")
+"""
+entryごとのレコードの形式
+
+offset(8byte), length(8byte), startedDateTimeのUNIX時間[秒](8byte), ホストのID(4byte),
+HTTPメソッドのID(2byte), MIMEタイプのID(2byte), HTTPステータス(2byte)
+"""
+
+_TOKEN_PATTERN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]:,]')
+"""JSONの文字列と構造を表す記号にマッチする正規表現。文字列の中の記号を無視するために、文字列全体にマッチさせる。"""
+
+
+class HarIndexRecord(NamedTuple):
+    offset: int
+    """HARファイルの先頭から、entryの開始位置（`{`）までのバイト数"""
+    length: int
+    """entryのバイト数"""
+    started_timestamp: float
+    """`startedDateTime`のUNIX時間[秒]。パースできない場合はNaN"""
+    host: str
+    method: str
+    mime_type: str
+    status: int
+
+
+class _StringTable:
+    """
+    文字列とIDを相互に変換します。
+    """
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        self.values = list(values)
+        self._ids = {value: index for index, value in enumerate(self.values)}
+
+    def get_id(self, value: str) -> int:
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.values.append(value)
+            self._ids[value] = value_id
+        return value_id
+
+
+def iter_entry_spans(buffer: Any) -> Iterator[tuple[int, int]]:  # noqa: ANN401
+    """
+    HARファイルの内容から、`log.entries`の各要素の開始位置と終了位置（バイト単位）を返します。
+
+    Args:
+        buffer: HARファイルの内容。`bytes`や`mmap.mmap`など
+    """
+    # 開いているコンテナの種類（"{" or "["）と、そのコンテナに対応するキーのスタック
+    stack: list[tuple[bytes, bytes | None]] = []
+    last_string: bytes | None = None
+    pending_key: bytes | None = None
+    entry_start = -1
+    entries_depth = -1
+
+    for match in _TOKEN_PATTERN.finditer(buffer):
+        token = match.group()
+        if token.startswith(b'"'):
+            last_string = token
+            continue
+
+        if token == b":":
+            pending_key = last_string
+        elif token in {b"{", b"["}:
+            if token == b"{" and len(stack) == entries_depth and entry_start == -1:
+                entry_start = match.start()
+            stack.append((token, pending_key))
+            if token == b"[" and entries_depth == -1 and pending_key == b'"entries"' and [e[1] for e in stack[:-1]] == [None, b'"log"']:
+                entries_depth = len(stack)
+        elif token in {b"}", b"]"}:
+            stack.pop()
+            if token == b"}" and len(stack) == entries_depth and entry_start != -1:
+                yield entry_start, match.end()
+                entry_start = -1
+            elif token == b"]" and len(stack) == entries_depth - 1:
+                return
+
+        if token != b":":
+            pending_key = None
+        last_string = None
+
+
+def _create_record(entry: dict[str, Any], offset: int, length: int) -> HarIndexRecord:
+    try:
+        started_timestamp = parse_iso_datetime(entry["startedDateTime"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        started_timestamp = math.nan
+    request = entry.get("request", {})
+    response = entry.get("response", {})
+    return HarIndexRecord(
+        offset=offset,
+        length=length,
+        started_timestamp=started_timestamp,
+        host=urlsplit(request.get("url", "")).hostname or "",
+        method=request.get("method", ""),
+        mime_type=response.get("content", {}).get("mimeType", ""),
+        status=response.get("status", 0),
+    )
+
+
+def get_index_file(har_file: Path) -> Path:
+    return har_file.with_name(har_file.name + INDEX_FILE_SUFFIX)
+
+
+def get_fallback_index_file(har_file: Path) -> Path:
+    """
+    HARファイルと同じディレクトリに索引ファイルを書き込めない場合の、キャッシュディレクトリ内の索引ファイルのパスを返します。
+    異なるディレクトリにある同じ名前のHARファイルが衝突しないよう、HARファイルのパスのハッシュ値を含めます。
+    """
+    path_hash = hashlib.sha1(str(har_file.resolve()).encode("utf-8")).hexdigest()[:16]
+    return get_cache_base_dir() / "har_index" / f"{har_file.name}-{path_hash}{INDEX_FILE_SUFFIX}"
+
+
+class HarIndex:
+    """
+    HARファイルの索引です。
+
+    Args:
+        source_size: 索引を作成したときのHARファイルのサイズ
+        source_mtime_ns: 索引を作成したときのHARファイルの更新日時
+        records: entryごとのレコード
+    """
+
+    def __init__(self, source_size: int, source_mtime_ns: int, records: list[HarIndexRecord]) -> None:
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self.records = records
+
+    @classmethod
+    def build(cls, har_file: Path) -> "HarIndex":
+        """
+        HARファイルを先頭から読み込んで、索引を作成します。
+        圧縮されたHARファイルはバイト位置を指定して読み込めないため、索引を作成できません。
+        """
+        if get_compression(har_file.name) is not None:
+            raise ValueError(f"'{har_file}'は圧縮されているため、索引を作成できません。展開してから索引を作成してください。")
+        stat = har_file.stat()
+        loads = get_json_backend().loads
+        records = []
+        with har_file.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for start, end in iter_entry_spans(mm):
+                records.append(_create_record(loads(mm[start:end]), start, end - start))
+        return cls(stat.st_size, stat.st_mtime_ns, records)
+
+    def is_up_to_date(self, har_file: Path) -> bool:
+        """
+        索引を作成した後に、HARファイルが変更されていないかどうかを返します。
+        """
+        stat = har_file.stat()
+        return stat.st_size == self.source_size and stat.st_mtime_ns == self.source_mtime_ns
+
+    def save(self, index_file: Path) -> None:
+        hosts = _StringTable()
+        methods = _StringTable()
+        mime_types = _StringTable()
+        packed_records = bytearray()
+        for record in self.records:
+            packed_records += RECORD_STRUCT.pack(
+                record.offset,
+                record.length,
+                record.started_timestamp,
+                hosts.get_id(record.host),
+                methods.get_id(record.method),
+                mime_types.get_id(record.mime_type),
+                record.status,
+            )
+
+        header = {
+            "source_size": self.source_size,
+            "source_mtime_ns": self.source_mtime_ns,
+            "record_count": len(self.records),
+            "hosts": hosts.values,
+            "methods": methods.values,
+            "mime_types": mime_types.values,
+        }
+        with index_file.open("wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(json.dumps(header, ensure_ascii=False).encode("utf-8"))
+            f.write(b"\n")
+            f.write(packed_records)
+
+    @classmethod
+    def load(cls, index_file: Path) -> "HarIndex":
+        with index_file.open("rb") as f:
+            if f.readline() != INDEX_MAGIC:
+                raise ValueError(f"'{index_file}'は索引ファイルではありません。")
+            header = json.loads(f.readline())
+            packed_records = f.read()
+
+        hosts = header["hosts"]
+        methods = header["methods"]
+        mime_types = header["mime_types"]
+        try:
+            records = [
+                HarIndexRecord(offset, length, started_timestamp, hosts[host_id], methods[method_id], mime_types[mime_type_id], status)
+                for offset, length, started_timestamp, host_id, method_id, mime_type_id, status in RECORD_STRUCT.iter_unpack(packed_records)
+            ]
+        except IndexError as e:
+            raise ValueError(f"'{index_file}'のレコードが、存在しない文字列のIDを参照しています。") from e
+        if len(records) != header["record_count"]:
+            raise ValueError(f"'{index_file}'のレコード数が不正です。")
+        return cls(header["source_size"], header["source_mtime_ns"], records)
+
+
+def load_or_build_index(har_file: Path) -> HarIndex:
+    """
+    HARファイルの索引を読み込みます。
+    索引ファイルが存在しないか、HARファイルが索引の作成後に変更されている場合は、索引を作成して保存します。
+
+    HARファイルと同じディレクトリに保存できない場合はキャッシュディレクトリに保存し、どちらにも保存できない場合は保存せずに索引を返します。
+    """
+    index_files = [get_index_file(har_file), get_fallback_index_file(har_file)]
+    for index_file in index_files:
+        if index_file.exists():
+            try:
+                index = HarIndex.load(index_file)
+                if index.is_up_to_date(har_file):
+                    return index
+            except (ValueError, KeyError, struct.error):
+                pass
+
+    index = HarIndex.build(har_file)
+    for index_file in index_files:
+        try:
+            index_file.parent.mkdir(exist_ok=True, parents=True)
+            index.save(index_file)
+        except OSError as e:
+            print(f"'{index_file}'に索引ファイルを書き込めませんでした。 :: {type(e).__name__}: {e}", file=sys.stderr)  # noqa: T201
+            continue
+        break
+    return index
+
+
+def select_records(
+    records: Iterable[HarIndexRecord], *, since: float | None = None, until: float | None = None, host: str | None = None
+) -> list[HarIndexRecord]:
+    """
+    索引のレコードを絞り込みます。
+
+    Args:
+        since: `startedDateTime`がこのUNIX時間[秒]以降のentryを選択します。
+        until: `startedDateTime`がこのUNIX時間[秒]より前のentryを選択します。
+        host: URLのホストがこの値に一致するentryを選択します。
+    """
+    result = []
+    for record in records:
+        if since is not None and not record.started_timestamp >= since:
+            continue
+        if until is not None and not record.started_timestamp < until:
+            continue
+        if host is not None and record.host != host:
+            continue
+        result.append(record)
+    return result
+
+
+def iter_indexed_entries(har_file: Path, records: Iterable[HarIndexRecord]) -> Iterator[dict[str, Any]]:
+    """
+    HARファイルをmmapして、指定したレコードのentryだけをデコードして返します。
+    """
+    loads = get_json_backend().loads
+    with har_file.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for record in records:
+            yield loads(mm[record.offset : record.offset + record.length])
+
+
+def main(args: argparse.Namespace) -> None:
+    profiler = get_profiler()
+    for har_file in args.har_file:
+        with profiler.file(har_file):
+            with profiler.stage("build"):
+                index = HarIndex.build(har_file)
+            profiler.add_entries(len(index.records))
+            index_file = get_index_file(har_file)
+            with profiler.stage("save"):
+                index.save(index_file)
+        print(f"'{index_file}'に{len(index.records)}件のentryの索引を書き込みました。", file=sys.stderr)  # noqa: T201
+
+
+def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
+    subcommand_name = "index"
+    subcommand_help = "HARファイルの各entryのバイト位置などを記録した索引ファイル（`{HARファイル名}.ahsidx`）を作成します。"
+
+    parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
+    parser.set_defaults(func=main)
+
+    parser.add_argument("har_file", type=Path, nargs="+", help="HARファイルのパス。圧縮されたHARファイル（`*.har.gz`など）には対応していません。")
+
+    return parser
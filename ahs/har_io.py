@@ -0,0 +1,137 @@
+"""
+HARファイルの読み書きを行うモジュールです。
+
+高速なJSONライブラリ（orjson, pysimdjson）がインストールされていれば、それを利用します。
+インストールされていなければ、標準ライブラリの`json`モジュールを利用します。
+環境変数`ANNOFAB_HAR_JSON_BACKEND`に`orjson`、`simdjson`、`stdlib`のいずれかを指定すると、利用するライブラリを固定できます。
+
+ファイルはバイト列のまま読み込んでパースし、出力もバイト列で書き込むので、文字列への変換によるコピーが発生しません。
+"""
+
+import functools
+import json
+import os
+import sys
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from ahs.compression import get_compression, open_compressed
+
+JSON_BACKEND_ENV_NAME = "ANNOFAB_HAR_JSON_BACKEND"
+"""利用するJSONライブラリを指定する環境変数の名前"""
+
+JSON_BACKEND_NAMES = ["orjson", "simdjson", "stdlib"]
+"""JSONライブラリの名前。自動で選択する場合は、この順番で利用可能なものを選びます。"""
+
+
+class JsonBackend(NamedTuple):
+    name: str
+    loads: Callable[[bytes], Any]
+    """バイト列をパースします。"""
+    dumps: Callable[[Any], bytes]
+    """
+    UTF-8でエンコードしたバイト列にシリアライズします。
+    非ASCII文字はエスケープせず、区切り文字の後に空白を入れません。
+    """
+
+
+def _dumps_with_stdlib(obj: Any) -> bytes:  # noqa: ANN401
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _create_orjson_backend() -> JsonBackend:
+    import orjson
+
+    def dumps(obj: Any) -> bytes:  # noqa: ANN401
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # 64bitを超える整数など、orjsonがシリアライズできない値が含まれている場合
+            return _dumps_with_stdlib(obj)
+
+    return JsonBackend("orjson", orjson.loads, dumps)
+
+
+def _create_simdjson_backend() -> JsonBackend:
+    import simdjson
+
+    # pysimdjsonはシリアライズに対応していないので、シリアライズには標準ライブラリを利用する
+    return JsonBackend("simdjson", simdjson.loads, _dumps_with_stdlib)
+
+
+def _create_stdlib_backend() -> JsonBackend:
+    return JsonBackend("stdlib", json.loads, _dumps_with_stdlib)
+
+
+_BACKEND_FACTORIES: dict[str, Callable[[], JsonBackend]] = {
+    "orjson": _create_orjson_backend,
+    "simdjson": _create_simdjson_backend,
+    "stdlib": _create_stdlib_backend,
+}
+
+
+def create_json_backend(name: str) -> JsonBackend:
+    """
+    指定した名前のJSONライブラリを返します。
+
+    Raises:
+        ImportError: ライブラリがインストールされていない場合
+    """
+    if name not in _BACKEND_FACTORIES:
+        raise ValueError(f"'{name}'は不正なJSONライブラリの名前です。 :: {JSON_BACKEND_NAMES}のいずれかを指定してください。")
+    return _BACKEND_FACTORIES[name]()
+
+
+@functools.cache
+def get_json_backend() -> JsonBackend:
+    """
+    HARファイルの読み書きに利用するJSONライブラリを返します。
+    """
+    name = os.environ.get(JSON_BACKEND_ENV_NAME)
+    if name:
+        return create_json_backend(name)
+
+    for backend_name in JSON_BACKEND_NAMES:
+        try:
+            return create_json_backend(backend_name)
+        except ImportError:
+            continue
+    return _create_stdlib_backend()
+
+
+def load_json_file(file: Path) -> Any:  # noqa: ANN401
+    """
+    JSONファイルをバイト列のまま読み込んで、パースします。
+    拡張子が`.gz`、`.zst`、`.xz`の場合は、展開しながら読み込みます。
+    """
+    if get_compression(file.name) is None:
+        return get_json_backend().loads(file.read_bytes())
+    with open_compressed(file, "rb") as f:
+        return get_json_backend().loads(f.read())
+
+
+def loads_json(data: bytes) -> Any:  # noqa: ANN401
+    return get_json_backend().loads(data)
+
+
+def dumps_json(obj: Any) -> bytes:  # noqa: ANN401
+    return get_json_backend().dumps(obj)
+
+
+def write_json_bytes(data: bytes, output_file: Path | None) -> None:
+    """
+    シリアライズしたJSONを出力します。
+
+    Args:
+        output_file: 出力先。Noneならば標準出力に出力します。拡張子が`.gz`、`.zst`、`.xz`の場合は圧縮して書き込みます。
+    """
+    if output_file is not None:
+        output_file.parent.mkdir(exist_ok=True, parents=True)
+        with open_compressed(output_file, "wb") as f:
+            f.write(data)
+    else:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.write(b"\n")
+        sys.stdout.buffer.flush()
@@ -0,0 +1,240 @@
+"""
+HARファイルをストリーミングで読み書きするためのモジュールです。
+
+`log.entries`の要素を1件ずつ読み込むので、メモリ使用量はファイルサイズではなく、最大のentryのサイズに依存します。
+"""
+
+import json
+import re
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import Any, BinaryIO, Literal, NamedTuple, TextIO
+
+from ahs.compression import get_compression, open_text
+from ahs.har_io import dumps_json, load_json_file
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+"""1回の読み込みで読む文字数"""
+
+_WHITESPACE_PATTERN = re.compile(r"[ \t\n\r]*")
+
+HarEventKind = Literal["begin_object", "end_object", "begin_entries", "end_entries", "entry", "value"]
+
+
+class HarEvent(NamedTuple):
+    """
+    HARファイルを先頭から読み込んだときに発生するイベント
+
+    * `begin_object` / `end_object` : トップレベルまたは`log`のオブジェクトの開始/終了。`key`はトップレベルならNone、`log`なら"log"
+    * `begin_entries` / `end_entries` : `log.entries`の開始/終了
+    * `entry` : `log.entries`の要素。`value`にentryが格納される
+    * `value` : 上記以外のキーと値。`log.version`や`log.pages`など
+    """
+
+    kind: HarEventKind
+    key: str | None = None
+    value: Any = None
+
+
+class _JsonStreamReader:
+    """
+    ファイルから少しずつ読み込みながら、JSONの値をデコードします。
+    """
+
+    def __init__(self, fp: TextIO, chunk_size: int) -> None:
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self) -> None:
+        """
+        バッファに続きを読み込みます。
+        巨大なentryでも読み込み回数が対数オーダーに収まるよう、未処理の文字数以上を読み込みます。
+        """
+        rest = self._buffer[self._pos :]
+        chunk = self._fp.read(max(self._chunk_size, len(rest)))
+        if chunk == "":
+            self._eof = True
+        self._buffer = rest + chunk
+        self._pos = 0
+
+    def peek(self) -> str:
+        """
+        空白以外の次の文字を返します。ファイルの終端に達した場合は空文字列を返します。
+        """
+        while True:
+            match = _WHITESPACE_PATTERN.match(self._buffer, self._pos)
+            assert match is not None
+            self._pos = match.end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if self._eof:
+                return ""
+            self._read_more()
+
+    def expect(self, char: str) -> None:
+        actual = self.peek()
+        if actual != char:
+            raise ValueError(f"'{char}'が必要ですが、'{actual}'が見つかりました。")
+        self._pos += 1
+
+    def next_char(self) -> str:
+        char = self.peek()
+        self._pos += 1
+        return char
+
+    def decode_value(self) -> Any:  # noqa: ANN401
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+                self._read_more()
+                continue
+
+            if end == len(self._buffer) and not self._eof:
+                # 数値などがチャンクの境界で途切れている可能性があるので、続きを読み込んでからデコードし直す
+                self._read_more()
+                continue
+
+            self._pos = end
+            return value
+
+
+def _iter_entries_events(reader: _JsonStreamReader) -> Iterator[HarEvent]:
+    reader.expect("[")
+    yield HarEvent("begin_entries", "entries")
+    if reader.peek() == "]":
+        reader.next_char()
+    else:
+        while True:
+            yield HarEvent("entry", None, reader.decode_value())
+            char = reader.next_char()
+            if char == "]":
+                break
+            if char != ",":
+                raise ValueError(f"'log.entries'の要素の後に、不正な文字'{char}'が見つかりました。")
+    yield HarEvent("end_entries")
+
+
+def _iter_object_events(reader: _JsonStreamReader, key: str | None) -> Iterator[HarEvent]:
+    reader.expect("{")
+    yield HarEvent("begin_object", key)
+    if reader.peek() == "}":
+        reader.next_char()
+        yield HarEvent("end_object")
+        return
+
+    while True:
+        name = reader.decode_value()
+        if not isinstance(name, str):
+            raise ValueError(f"オブジェクトのキーが文字列ではありません。 :: {name!r}")
+        reader.expect(":")
+
+        if key is None and name == "log" and reader.peek() == "{":
+            yield from _iter_object_events(reader, name)
+        elif key == "log" and name == "entries" and reader.peek() == "[":
+            yield from _iter_entries_events(reader)
+        else:
+            yield HarEvent("value", name, reader.decode_value())
+
+        char = reader.next_char()
+        if char == "}":
+            break
+        if char != ",":
+            raise ValueError(f"オブジェクトの値の後に、不正な文字'{char}'が見つかりました。")
+
+    yield HarEvent("end_object")
+
+
+def iter_har_events(fp: TextIO, *, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[HarEvent]:
+    """
+    HARファイルを先頭から少しずつ読み込んで、イベントを順番に返します。
+
+    Args:
+        fp: HARファイルのテキストストリーム
+        chunk_size: 1回の読み込みで読む文字数
+    """
+    reader = _JsonStreamReader(fp, chunk_size)
+    yield from _iter_object_events(reader, None)
+    if reader.peek() != "":
+        raise ValueError("JSONの終端の後に、余分なデータが存在します。")
+
+
+def iter_har_entries(fp: TextIO, *, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[dict[str, Any]]:
+    """
+    HARファイルの`log.entries`の要素を、1件ずつ返します。
+    """
+    for event in iter_har_events(fp, chunk_size=chunk_size):
+        if event.kind == "entry":
+            yield event.value
+
+
+def iter_har_file_entries(har_file: Path) -> Iterator[dict[str, Any]]:
+    """
+    HARファイルの`log.entries`の要素を、1件ずつ返します。
+
+    圧縮されたHARファイルは、展開したファイル全体をメモリに載せないよう、展開しながら1件ずつパースします。
+    圧縮されていないHARファイルは、ファイル全体を一度にパースした方が速いので、`load_json_file`で読み込みます。
+    """
+    if get_compression(har_file.name) is not None:
+        with open_text(har_file) as f:
+            yield from iter_har_entries(f)
+    else:
+        yield from load_json_file(har_file)["log"]["entries"]
+
+
+class HarStreamWriter:
+    """
+    `iter_har_events`が返すイベントから、HARファイルを書き出します。
+
+    出力内容は`ahs.har_io.dumps_json(data)`と同じになります。
+    """
+
+    def __init__(self, fp: BinaryIO) -> None:
+        self._fp = fp
+        self._is_first_stack: list[bool] = []
+
+    def _write_separator_and_key(self, key: str | None) -> None:
+        if len(self._is_first_stack) > 0:
+            if self._is_first_stack[-1]:
+                self._is_first_stack[-1] = False
+            else:
+                self._fp.write(b",")
+        if key is not None:
+            self._fp.write(dumps_json(key))
+            self._fp.write(b":")
+
+    def write(self, event: HarEvent) -> None:
+        kind = event.kind
+        if kind == "entry":
+            self._write_separator_and_key(None)
+            self._fp.write(dumps_json(event.value))
+        elif kind == "value":
+            self._write_separator_and_key(event.key)
+            self._fp.write(dumps_json(event.value))
+        elif kind == "begin_object":
+            self._write_separator_and_key(event.key)
+            self._fp.write(b"{")
+            self._is_first_stack.append(True)
+        elif kind == "begin_entries":
+            self._write_separator_and_key(event.key)
+            self._fp.write(b"[")
+            self._is_first_stack.append(True)
+        elif kind == "end_object":
+            self._is_first_stack.pop()
+            self._fp.write(b"}")
+        elif kind == "end_entries":
+            self._is_first_stack.pop()
+            self._fp.write(b"]")
+        else:
+            raise ValueError(f"Unexpected event kind: {kind}")
+
+    def write_all(self, events: Iterable[HarEvent]) -> None:
+        for event in events:
+            self.write(event)
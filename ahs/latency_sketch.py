@@ -0,0 +1,394 @@
+"""
+HARファイルのentryから、レイテンシなどの分位点を近似するためのスケッチ（DDSketch）を作成します。
+
+スケッチは、値の個数・合計・二乗和・最小値・最大値と、値を対数スケールのビンに分けた個数だけを保持します。
+分位点の相対誤差は`relative_accuracy`以下で、ビンの個数は値の範囲の対数に比例するので、entry数に依存しない小さなサイズになります。
+スケッチ同士はビンごとの個数を足すだけでマージできるので、HARファイル、ワーカー、日付をまたいで集計できます。
+
+参考: Charles Masson, Jee E. Rim, Homin K. Lee. "DDSketch: A Fast and Fully-Mergeable Quantile Sketch with Relative-Error Guarantees." VLDB 2019.
+"""
+
+import argparse
+import functools
+import json
+import math
+import sys
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from ahs.compression import strip_compression_suffix
+from ahs.entry_filter import compile_entry_filter_cached, get_url_host
+from ahs.har_files import HarFileInput, collect_har_files
+from ahs.profiling import get_profiler, run_with_profile
+from ahs.timing_columns import TimingColumns
+from ahs.to_timing_csv import load_timing_columns
+
+if TYPE_CHECKING:
+    import numpy
+
+SKETCH_FORMAT_VERSION = 1
+"""スケッチファイルの形式のバージョン"""
+
+SKETCH_FILE_SUFFIX = ".sketch.json"
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+"""分位点の相対誤差の上限のデフォルト値"""
+
+DEFAULT_MAX_BIN_COUNT = 2048
+"""1個のスケッチが保持するビンの最大数のデフォルト値。超えた場合は、値が小さいビンからまとめます。"""
+
+SKETCH_METRICS = ["time", "timings.wait", "timings.receive", "response.headers.contentLength"]
+"""スケッチを作成する列"""
+
+GROUP_KEYS = ["host", "mimeType"]
+"""スケッチを分けるキー"""
+
+
+class DDSketch:
+    """
+    値の分位点を、相対誤差`relative_accuracy`以下で近似するスケッチです。
+    0以下の値は、0としてまとめて数えます。
+
+    Args:
+        relative_accuracy: 分位点の相対誤差の上限
+        max_bin_count: ビンの最大数。超えた場合は値が小さいビンからまとめるので、小さい分位点の精度が下がります。
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, max_bin_count: int = DEFAULT_MAX_BIN_COUNT) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"`relative_accuracy`は0より大きく1より小さい値を指定してください。 :: relative_accuracy={relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.max_bin_count = max_bin_count
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: dict[int, int] = {}
+        """ビンの番号から、値の個数へのdict。番号iのビンには、gamma^(i-1)より大きくgamma^i以下の値が入ります。"""
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.sum_of_squares = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add_array(self, values: "numpy.ndarray") -> None:
+        """
+        値をまとめて追加します。NaNは無視します。
+        """
+        import numpy
+
+        values = numpy.asarray(values, dtype=numpy.float64)
+        values = values[~numpy.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.sum += float(values.sum())
+        self.sum_of_squares += float(numpy.square(values).sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive_values = values[values > 0]
+        self.zero_count += len(values) - len(positive_values)
+        indexes, counts = numpy.unique(numpy.ceil(numpy.log(positive_values) / self._log_gamma).astype(numpy.int64), return_counts=True)
+        bins = self.bins
+        for index, count in zip(indexes.tolist(), counts.tolist(), strict=True):
+            bins[index] = bins.get(index, 0) + count
+        self._collapse()
+
+    def merge(self, other: "DDSketch") -> None:
+        """
+        `other`の値をすべて追加します。`relative_accuracy`が同じスケッチだけをマージできます。
+        """
+        if other.gamma != self.gamma:
+            raise ValueError(f"`relative_accuracy`が異なるスケッチはマージできません。 :: {self.relative_accuracy} != {other.relative_accuracy}")
+        bins = self.bins
+        for index, count in other.bins.items():
+            bins[index] = bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.sum_of_squares += other.sum_of_squares
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._collapse()
+
+    def _collapse(self) -> None:
+        if len(self.bins) <= self.max_bin_count:
+            return
+        indexes = sorted(self.bins)
+        collapsed_indexes = indexes[: len(indexes) - self.max_bin_count + 1]
+        self.bins[collapsed_indexes[-1]] = sum(self.bins.pop(e) for e in collapsed_indexes)
+
+    def quantile(self, q: float) -> float | None:
+        """
+        `q`分位点（0以上1以下）の近似値を返します。値が1個もなければNoneを返します。
+        """
+        if self.count == 0:
+            return None
+        # 最小値と最大値は正確な値を保持している
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+        cumulative_count = self.zero_count
+        for index in sorted(self.bins):
+            cumulative_count += self.bins[index]
+            if cumulative_count > rank:
+                # ビンの両端に対する相対誤差が等しくなる値
+                value = 2 * self.gamma**index / (self.gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def mean(self) -> float | None:
+        return self.sum / self.count if self.count > 0 else None
+
+    def std(self) -> float | None:
+        """
+        母標準偏差（ddof=0）を返します。
+        """
+        if self.count == 0:
+            return None
+        mean = self.sum / self.count
+        return math.sqrt(max(self.sum_of_squares / self.count - mean * mean, 0.0))
+
+    def to_dict(self) -> dict[str, Any]:
+        indexes = sorted(self.bins)
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "count": self.count,
+            "sum": self.sum,
+            "sum_of_squares": self.sum_of_squares,
+            "min": self.min if self.count > 0 else None,
+            "max": self.max if self.count > 0 else None,
+            "zero_count": self.zero_count,
+            "bin_indexes": indexes,
+            "bin_counts": [self.bins[e] for e in indexes],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any], max_bin_count: int = DEFAULT_MAX_BIN_COUNT) -> "DDSketch":
+        sketch = cls(data["relative_accuracy"], max_bin_count)
+        sketch.bins = dict(zip(data["bin_indexes"], data["bin_counts"], strict=True))
+        sketch.zero_count = data["zero_count"]
+        sketch.count = data["count"]
+        sketch.sum = data["sum"]
+        sketch.sum_of_squares = data["sum_of_squares"]
+        if sketch.count > 0:
+            sketch.min = data["min"]
+            sketch.max = data["max"]
+        return sketch
+
+
+class LatencySketches:
+    """
+    (ホスト, MIMEタイプ)の組み合わせと列ごとの`DDSketch`です。
+
+    Args:
+        relative_accuracy: 分位点の相対誤差の上限
+    """
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> None:
+        self.relative_accuracy = relative_accuracy
+        self.har_file_count = 0
+        """スケッチに含まれるHARファイルの個数"""
+        self.sketches: dict[tuple[str, str], dict[str, DDSketch]] = {}
+        """(ホスト, MIMEタイプ)から、列名をキーとする`DDSketch`のdictへのdict"""
+
+    def _get_group(self, key: tuple[str, str]) -> dict[str, DDSketch]:
+        group = self.sketches.get(key)
+        if group is None:
+            group = {metric: DDSketch(self.relative_accuracy) for metric in SKETCH_METRICS}
+            self.sketches[key] = group
+        return group
+
+    def add_columns(self, columns: TimingColumns) -> None:
+        """
+        `extract_timing_columns`で抽出した列の値を追加します。
+        timingの値が負（値が存在しない場合の-1）のものは追加しません。
+        """
+        import numpy
+
+        urls = columns["request.url"]
+        if len(urls) == 0:
+            return
+        # 同じURLが繰り返し現れるので、ホストはURLごとに1回だけ求める
+        host_by_url = {url: get_url_host(url) for url in set(urls)}
+        keys = numpy.array([f"{host_by_url[url]}\0{mime_type}" for url, mime_type in zip(urls, columns["response.content.mimeType"], strict=True)])
+        unique_keys, group_codes = numpy.unique(keys, return_inverse=True)
+        values_by_metric = {}
+        for metric in SKETCH_METRICS:
+            values = numpy.array(columns[metric], dtype=numpy.float64)  # contentLengthのNoneはNaNになる
+            values[values < 0] = numpy.nan
+            values_by_metric[metric] = values
+
+        order = numpy.argsort(group_codes, kind="stable")
+        boundaries = numpy.flatnonzero(numpy.diff(group_codes[order])) + 1
+        for group_indexes, key in zip(numpy.split(order, boundaries), unique_keys.tolist(), strict=True):
+            host, mime_type = key.split("\0", 1)
+            group = self._get_group((host, mime_type))
+            for metric, values in values_by_metric.items():
+                group[metric].add_array(values[group_indexes])
+
+    def merge(self, other: "LatencySketches", group_keys: Iterable[str] = GROUP_KEYS) -> None:
+        """
+        `other`のスケッチをマージします。
+
+        Args:
+            group_keys: マージした後もスケッチを分けるキー。含まれないキーは空文字列にまとめます。
+        """
+        group_keys = set(group_keys)
+        for (host, mime_type), other_group in other.sketches.items():
+            group = self._get_group((host if "host" in group_keys else "", mime_type if "mimeType" in group_keys else ""))
+            for metric, sketch in other_group.items():
+                group[metric].merge(sketch)
+        self.har_file_count += other.har_file_count
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "version": SKETCH_FORMAT_VERSION,
+            "relative_accuracy": self.relative_accuracy,
+            "har_file_count": self.har_file_count,
+            "groups": [
+                {"host": host, "mimeType": mime_type, "metrics": {metric: sketch.to_dict() for metric, sketch in group.items()}}
+                for (host, mime_type), group in sorted(self.sketches.items())
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "LatencySketches":
+        if data.get("version") != SKETCH_FORMAT_VERSION:
+            raise ValueError(f"スケッチファイルの形式のバージョンが異なります。 :: version={data.get('version')}")
+        result = cls(data["relative_accuracy"])
+        result.har_file_count = data["har_file_count"]
+        for group in data["groups"]:
+            result.sketches[(group["host"], group["mimeType"])] = {metric: DDSketch.from_dict(sketch) for metric, sketch in group["metrics"].items()}
+        return result
+
+    def save(self, sketch_file: Path) -> None:
+        sketch_file.parent.mkdir(exist_ok=True, parents=True)
+        sketch_file.write_text(json.dumps(self.to_dict(), ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, sketch_file: Path) -> "LatencySketches":
+        return cls.from_dict(json.loads(sketch_file.read_text(encoding="utf-8")))
+
+
+def get_sketch_file(output_dir: Path, har_file: HarFileInput) -> Path:
+    """
+    HARファイルのスケッチファイルのパスを返します。`output_dir`の下に、HARファイルの相対パスと同じ構成で配置します。
+    """
+    relative_path = har_file.relative_path
+    stem = Path(strip_compression_suffix(relative_path.name)).stem
+    return output_dir / relative_path.with_name(stem + SKETCH_FILE_SUFFIX)
+
+
+def _create_sketch_file(har_file: Path, sketch_file: Path, *, filter_expressions: tuple[str, ...], relative_accuracy: float) -> str | None:
+    """
+    HARファイルのスケッチを作成して、`sketch_file`に書き込みます。
+    プロセスプールのワーカーでも実行できるよう、例外を送出せずにエラーメッセージを返します。
+    """
+    profiler = get_profiler()
+    try:
+        with profiler.file(har_file):
+            columns = load_timing_columns(har_file, entry_filter=compile_entry_filter_cached(filter_expressions))
+            with profiler.stage("sketch"):
+                sketches = LatencySketches(relative_accuracy)
+                sketches.add_columns(columns)
+                sketches.har_file_count = 1
+            with profiler.stage("write"):
+                sketches.save(sketch_file)
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+    return None
+
+
+def create_sketch_files(
+    har_files: list[HarFileInput],
+    output_dir: Path,
+    *,
+    filter_expressions: Iterable[str] = (),
+    relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+    jobs: int = 1,
+) -> list[str | None]:
+    """
+    HARファイルごとにスケッチファイルを作成して、`output_dir`に書き込みます。
+    `jobs`が2以上ならば、プロセスプールで並列に処理します。
+
+    Returns:
+        HARファイルごとのエラーメッセージ。成功した場合はNoneです。`har_files`と同じ順番です。
+    """
+    # 不正なフィルタ式は、HARファイルを読み込む前にエラーにする
+    compile_entry_filter_cached(tuple(filter_expressions))
+    func = functools.partial(_create_sketch_file, filter_expressions=tuple(filter_expressions), relative_accuracy=relative_accuracy)
+    sketch_files = [get_sketch_file(output_dir, e) for e in har_files]
+    if jobs <= 1:
+        return [func(e.path, sketch_file) for e, sketch_file in zip(har_files, sketch_files, strict=True)]
+
+    profiler = get_profiler()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(run_with_profile, profiler.enabled, func, e.path, sketch_file)
+            for e, sketch_file in zip(har_files, sketch_files, strict=True)
+        ]
+        results = []
+        for future in futures:
+            error, file_profiles = future.result()
+            profiler.merge(file_profiles)
+            results.append(error)
+        return results
+
+
+def main(args: argparse.Namespace) -> None:
+    har_files = collect_har_files(args.har_file)
+    errors = create_sketch_files(
+        har_files,
+        args.output_dir,
+        filter_expressions=args.filter if args.filter is not None else [],
+        relative_accuracy=args.relative_accuracy,
+        jobs=args.jobs,
+    )
+    error_count = 0
+    for har_file, error in zip(har_files, errors, strict=True):
+        if error is not None:
+            error_count += 1
+            print(f"'{har_file.path}'のスケッチの作成に失敗しました。 :: {error}", file=sys.stderr)  # noqa: T201
+    if error_count > 0:
+        print(f"{error_count}/{len(har_files)}件のHARファイルの処理に失敗しました。", file=sys.stderr)  # noqa: T201
+        sys.exit(1)
+
+
+def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
+    subcommand_name = "sketch"
+    subcommand_help = (
+        "HARファイルごとに、ホストとMIMEタイプ別の`time`などの分位点を近似するスケッチファイルを作成します。`merge_sketch`コマンドでマージできます。"
+    )
+
+    parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
+    parser.set_defaults(func=main)
+
+    parser.add_argument(
+        "har_file",
+        type=Path,
+        nargs="+",
+        help="HARファイルのパス。ディレクトリ（配下の`*.har`、`*.har.gz`、`*.har.zst`、`*.har.xz`ファイルを再帰的に処理）やglobパターンも指定できます。",
+    )
+    parser.add_argument(
+        "--output_dir",
+        type=Path,
+        required=True,
+        help=f"スケッチファイル（`*{SKETCH_FILE_SUFFIX}`）の出力先ディレクトリ。ディレクトリを指定した場合は、その配下のディレクトリ構成を維持します。",
+    )
+    parser.add_argument("--filter", nargs="+", help="スケッチに含めるentryを絞り込むフィルタ式。`to_timing_csv`の`--filter`と同じ形式です。")
+    parser.add_argument(
+        "--relative_accuracy",
+        type=float,
+        default=DEFAULT_RELATIVE_ACCURACY,
+        help="分位点の相対誤差の上限。小さくするほどスケッチファイルが大きくなります。同じ値で作成したスケッチファイルだけをマージできます。",
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="並列に処理するプロセス数。")
+
+    return parser
@@ -0,0 +1,136 @@
+"""
+`sketch`コマンドで作成したスケッチファイルをマージして、ホストとMIMEタイプ別の統計情報（分位点、平均、標準偏差など）を出力します。
+
+スケッチファイルを1個ずつ読み込んでマージするので、スケッチファイルがいくつあってもメモリ使用量は一定です。
+"""
+
+import argparse
+import csv
+import sys
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+from typing import Any
+
+from ahs.latency_sketch import GROUP_KEYS, SKETCH_FILE_SUFFIX, LatencySketches
+from ahs.profiling import get_profiler
+
+DEFAULT_QUANTILES = [0.5, 0.95, 0.99]
+
+
+def collect_sketch_files(paths: Iterable[Path]) -> list[Path]:
+    """
+    ファイルとディレクトリから、スケッチファイルの一覧を取得します。ディレクトリの場合は、配下のスケッチファイルを再帰的に探します。
+    """
+    result = []
+    for path in paths:
+        if path.is_dir():
+            result.extend(sorted(path.rglob(f"*{SKETCH_FILE_SUFFIX}")))
+        elif path.exists():
+            result.append(path)
+        else:
+            raise FileNotFoundError(f"'{path}'は存在しません。")
+    return result
+
+
+def merge_sketch_files(sketch_files: Iterable[Path], *, group_keys: Iterable[str] = GROUP_KEYS) -> LatencySketches:
+    """
+    スケッチファイルをマージします。
+
+    Args:
+        group_keys: マージした後もスケッチを分けるキー。含まれないキーは空文字列にまとめます。
+    """
+    profiler = get_profiler()
+    result: LatencySketches | None = None
+    for sketch_file in sketch_files:
+        with profiler.stage("merge"):
+            sketches = LatencySketches.load(sketch_file)
+            if result is None:
+                result = LatencySketches(sketches.relative_accuracy)
+            result.merge(sketches, group_keys)
+    if result is None:
+        raise ValueError("スケッチファイルが存在しません。")
+    return result
+
+
+def create_statistics(sketches: LatencySketches, quantiles: Sequence[float] = DEFAULT_QUANTILES) -> list[dict[str, Any]]:
+    """
+    (ホスト, MIMEタイプ)の組み合わせと列ごとに、統計情報を算出します。標準偏差は母標準偏差（ddof=0）です。
+    """
+    result = []
+    for (host, mime_type), group in sorted(sketches.sketches.items()):
+        for metric, sketch in group.items():
+            if sketch.count == 0:
+                continue
+            row: dict[str, Any] = {
+                "host": host,
+                "mimeType": mime_type,
+                "metric": metric,
+                "count": sketch.count,
+                "sum": sketch.sum,
+                "mean": sketch.mean(),
+                "std": sketch.std(),
+                "min": sketch.min,
+                "max": sketch.max,
+            }
+            for q in quantiles:
+                row[f"p{q * 100:g}"] = sketch.quantile(q)
+            result.append(row)
+    return result
+
+
+def write_statistics(rows: list[dict[str, Any]], output_file: Path | None, quantiles: Sequence[float]) -> None:
+    fieldnames = ["host", "mimeType", "metric", "count", "sum", "mean", "std", "min", "max", *[f"p{q * 100:g}" for q in quantiles]]
+    if output_file is not None:
+        output_file.parent.mkdir(exist_ok=True, parents=True)
+        with output_file.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main(args: argparse.Namespace) -> None:
+    for q in args.quantile:
+        if not 0 <= q <= 1:
+            raise ValueError(f"`--quantile`には0以上1以下の値を指定してください。 :: {q}")
+    sketch_files = collect_sketch_files(args.sketch_file)
+    sketches = merge_sketch_files(sketch_files, group_keys=args.group_by)
+    if args.output_sketch is not None:
+        sketches.save(args.output_sketch)
+    with get_profiler().stage("write"):
+        write_statistics(create_statistics(sketches, args.quantile), args.output, args.quantile)
+    print(f"{len(sketch_files)}個のスケッチファイル（HARファイル{sketches.har_file_count}個分）をマージしました。", file=sys.stderr)  # noqa: T201
+
+
+def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
+    subcommand_name = "merge_sketch"
+    subcommand_help = "`sketch`コマンドで作成したスケッチファイルをマージして、ホストとMIMEタイプ別の分位点などの統計情報をCSVで出力します。"
+
+    parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
+    parser.set_defaults(func=main)
+
+    parser.add_argument(
+        "sketch_file",
+        type=Path,
+        nargs="+",
+        help=f"スケッチファイルのパス。ディレクトリを指定した場合は、配下の`*{SKETCH_FILE_SUFFIX}`ファイルを再帰的に処理します。",
+    )
+    parser.add_argument("-o", "--output", type=Path, help="統計情報のCSVの出力先。未指定ならば標準出力に出力します。")
+    parser.add_argument(
+        "--output_sketch",
+        type=Path,
+        help="マージしたスケッチファイルの出力先。日ごとにマージしたスケッチファイルを、さらにマージする場合などに利用します。",
+    )
+    parser.add_argument(
+        "--group_by",
+        nargs="*",
+        choices=GROUP_KEYS,
+        default=GROUP_KEYS,
+        help="統計情報を分けるキー。指定しなかったキーはまとめて集計します。何も指定しなければ、全体を1個にまとめます。",
+    )
+    parser.add_argument("--quantile", type=float, nargs="+", default=DEFAULT_QUANTILES, help="出力する分位点（0以上1以下）")
+
+    return parser
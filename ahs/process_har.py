@@ -0,0 +1,364 @@
+"""
+HARファイルを1回だけ読み込んで、複数の処理（ステージ）にentryを流すパイプラインです。
+
+`sanitize`、`to_timing_csv`、`editor_loadtime`を別々に実行すると、同じHARファイルを何度も読み込むことになります。
+このモジュールでは、HARファイルを先頭から1回だけストリーミングで読み込み、各ステージに順番にイベントを渡します。
+"""
+
+import abc
+import argparse
+import importlib
+import json
+import sys
+import time
+from collections.abc import Iterator, Sequence
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from ahs.compression import open_compressed, open_text, strip_compression_suffix
+from ahs.editor_loadtime import DEFAULT_EDITOR_RULE_CONFIGS, EditorLoadingTimeDetector, EditorRule, compile_editor_rule, load_editor_rule_configs
+from ahs.har_files import HarFileInput, collect_har_files
+from ahs.har_stream import HarEvent, HarStreamWriter, iter_har_events
+from ahs.profiling import Profiler, get_profiler
+from ahs.sanitize_har import HarSanitizer
+from ahs.timing_columns import TimingColumnsBuilder
+
+
+class HarStage(abc.ABC):
+    """
+    パイプラインのステージの基底クラスです。
+
+    独自のステージを追加する場合は、このクラスを継承して`process_entry`を実装してください。
+    コンストラクタには、キーワード引数`output_dir`（出力先ディレクトリ）が渡されます。
+
+    entryを書き換えるステージは、後続のステージに書き換えた後のentryが渡されるので、最後に配置してください。
+    """
+
+    def __init__(self, *, output_dir: Path) -> None:
+        self.output_dir = output_dir
+
+    def begin_file(self, har_file: HarFileInput) -> None:  # noqa: B027
+        """
+        HARファイルの読み込みを開始する前に呼ばれます。
+        """
+
+    def process_event(self, event: HarEvent) -> None:
+        """
+        HARファイルを読み込んだときのイベントごとに呼ばれます。
+        デフォルトでは、`log.entries`の要素だけを`process_entry`に渡します。
+        """
+        if event.kind == "entry":
+            self.process_entry(event.value)
+
+    @abc.abstractmethod
+    def process_entry(self, entry: dict[str, Any]) -> None:
+        """
+        `log.entries`の要素ごとに呼ばれます。
+        """
+
+    def end_file(self) -> None:  # noqa: B027
+        """
+        HARファイルを最後まで読み込んだ後に呼ばれます。
+        """
+
+    def abort_file(self) -> None:  # noqa: B027
+        """
+        `begin_file`の後、HARファイルの処理中に例外が発生したときに、`end_file`の代わりに呼ばれます。
+        開いたファイルを閉じたり、途中まで書き込んだファイルを削除したりしてください。
+        """
+
+    def finish(self) -> None:  # noqa: B027
+        """
+        すべてのHARファイルを処理した後に呼ばれます。
+        """
+
+
+class SanitizeStage(HarStage):
+    """
+    機密情報をマスクしたHARファイルを、`{output_dir}/sanitize/`に出力します。
+    entryを書き換えるので、最後に配置してください。
+    """
+
+    def __init__(self, *, output_dir: Path) -> None:
+        super().__init__(output_dir=output_dir)
+        self._output_file: Path | None = None
+        self._output_fp: BinaryIO | None = None
+        self._writer: HarStreamWriter | None = None
+        self._sanitizer = HarSanitizer()
+
+    def begin_file(self, har_file: HarFileInput) -> None:
+        output_file = self.output_dir / "sanitize" / har_file.relative_path
+        output_file.parent.mkdir(exist_ok=True, parents=True)
+        self._output_file = output_file
+        self._output_fp = open_compressed(output_file, "wb")
+        self._writer = HarStreamWriter(self._output_fp)
+        self._sanitizer = HarSanitizer()
+
+    def process_event(self, event: HarEvent) -> None:
+        assert self._writer is not None
+        if event.kind == "entry":
+            self.process_entry(event.value)
+        self._writer.write(event)
+
+    def process_entry(self, entry: dict[str, Any]) -> None:
+        self._sanitizer.sanitize_entry(entry)
+
+    def end_file(self) -> None:
+        assert self._output_fp is not None
+        self._output_fp.close()
+        self._output_fp = None
+        self._writer = None
+
+    def abort_file(self) -> None:
+        # 途中までしか書き込んでいないHARファイルを残さない
+        if self._output_fp is not None:
+            self._output_fp.close()
+            self._output_fp = None
+        self._writer = None
+        if self._output_file is not None:
+            self._output_file.unlink(missing_ok=True)
+            self._output_file = None
+
+
+class TimingStage(HarStage):
+    """
+    `to_timing_csv`コマンドと同じ内容のCSVを、`{output_dir}/timing/`に出力します。
+    """
+
+    def __init__(self, *, output_dir: Path, is_s3_path: bool = False) -> None:
+        super().__init__(output_dir=output_dir)
+        self.is_s3_path = is_s3_path
+        self._output_file: Path | None = None
+        self._builder: TimingColumnsBuilder | None = None
+
+    def begin_file(self, har_file: HarFileInput) -> None:
+        relative_path = Path(strip_compression_suffix(str(har_file.relative_path)))
+        self._output_file = self.output_dir / "timing" / relative_path.with_suffix(".csv")
+        self._builder = TimingColumnsBuilder(is_s3_path=self.is_s3_path)
+
+    def process_entry(self, entry: dict[str, Any]) -> None:
+        assert self._builder is not None
+        self._builder.add(entry)
+
+    def end_file(self) -> None:
+        from ahs.to_timing_csv import create_dataframe_from_timing_columns, write_dataframe
+
+        assert self._builder is not None
+        assert self._output_file is not None
+        write_dataframe(create_dataframe_from_timing_columns(self._builder.columns), self._output_file, "csv")
+        self._builder = None
+
+
+class EditorLoadTimeStage(HarStage):
+    """
+    アノテーションエディタでフレームを読み込むまでの時間を、HARファイルごとに算出して`{output_dir}/editor_loadtime.json`に出力します。
+    `editor_loadtime`コマンドと同じ内容です。
+
+    Args:
+        rule: コンパイル済みのエディタのルール。未指定ならば、組み込みの3次元エディタ（`3dpc`）のルール
+        nth_frames: 読み込みが完了するまでの時間を算出するフレームの番号（1始まり）
+    """
+
+    def __init__(self, *, output_dir: Path, rule: EditorRule | None = None, nth_frames: list[int] | None = None) -> None:
+        super().__init__(output_dir=output_dir)
+        self.rule = rule if rule is not None else compile_editor_rule("3dpc", DEFAULT_EDITOR_RULE_CONFIGS["3dpc"])
+        self.nth_frames = nth_frames
+        self._har_file: Path | None = None
+        self._calculator: EditorLoadingTimeDetector | None = None
+        self._results: list[dict[str, Any]] = []
+
+    def begin_file(self, har_file: HarFileInput) -> None:
+        self._har_file = har_file.path
+        self._calculator = EditorLoadingTimeDetector(self.rule, nth_frames=self.nth_frames)
+
+    def process_entry(self, entry: dict[str, Any]) -> None:
+        assert self._calculator is not None
+        self._calculator.add(entry)
+
+    def end_file(self) -> None:
+        assert self._calculator is not None
+        result = self._calculator.get_result()
+        result["har_file"] = str(self._har_file)
+        self._results.append(result)
+        self._calculator = None
+
+    def finish(self) -> None:
+        output_file = self.output_dir / "editor_loadtime.json"
+        output_file.parent.mkdir(exist_ok=True, parents=True)
+        output_file.write_text(json.dumps(self._results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+BUILTIN_STAGES: dict[str, type[HarStage]] = {
+    "timing": TimingStage,
+    "editor_loadtime": EditorLoadTimeStage,
+    "sanitize": SanitizeStage,
+}
+"""組み込みのステージ。entryを書き換える`sanitize`が最後になるように並べている。"""
+
+
+def load_stage_class(name: str) -> type[HarStage]:
+    """
+    `module.path:ClassName`形式の文字列から、ステージのクラスを読み込みます。
+    """
+    module_name, sep, class_name = name.partition(":")
+    if sep == "" or module_name == "" or class_name == "":
+        raise ValueError(f"'{name}'は`module.path:ClassName`形式ではありません。")
+    stage_class = getattr(importlib.import_module(module_name), class_name)
+    if not (isinstance(stage_class, type) and issubclass(stage_class, HarStage)):
+        raise TypeError(f"'{name}'は`HarStage`のサブクラスではありません。")
+    return stage_class
+
+
+def _process_events_with_profile(events: Iterator[HarEvent], stages: Sequence[HarStage], profiler: Profiler) -> None:
+    """
+    イベントを各ステージに渡しながら、読み込みとステージごとの経過時間を計測します。
+    """
+    perf_counter = time.perf_counter
+    stage_names = [type(e).__name__ for e in stages]
+    stage_seconds = dict.fromkeys(["parse", *stage_names], 0.0)
+    entry_count = 0
+    while True:
+        start = perf_counter()
+        event = next(events, None)
+        stage_seconds["parse"] += perf_counter() - start
+        if event is None:
+            break
+        if event.kind == "entry":
+            entry_count += 1
+        for stage, stage_name in zip(stages, stage_names, strict=True):
+            start = perf_counter()
+            stage.process_event(event)
+            stage_seconds[stage_name] += perf_counter() - start
+
+    for name, seconds in stage_seconds.items():
+        profiler.add_stage_seconds(name, seconds)
+    profiler.add_entries(entry_count)
+
+
+def process_har_file(har_file: HarFileInput, stages: Sequence[HarStage]) -> None:
+    """
+    HARファイルを1回だけ読み込んで、イベントを各ステージに順番に渡します。
+    """
+    profiler = get_profiler()
+    begun_stages: list[HarStage] = []
+    with profiler.file(har_file.path):
+        try:
+            with profiler.stage("begin_file"):
+                for stage in stages:
+                    stage.begin_file(har_file)
+                    begun_stages.append(stage)
+
+            with open_text(har_file.path) as f:
+                if profiler.enabled:
+                    _process_events_with_profile(iter_har_events(f), stages, profiler)
+                else:
+                    for event in iter_har_events(f):
+                        for stage in stages:
+                            stage.process_event(event)
+
+            with profiler.stage("end_file"):
+                for stage in stages:
+                    stage.end_file()
+                    begun_stages.remove(stage)
+        except BaseException:
+            for stage in reversed(begun_stages):
+                stage.abort_file()
+            raise
+
+
+def process_har_files(har_files: Sequence[HarFileInput], stages: Sequence[HarStage]) -> None:
+    for har_file in har_files:
+        process_har_file(har_file, stages)
+    with get_profiler().stage("finish"):
+        for stage in stages:
+            stage.finish()
+
+
+def _load_editor_rule(args: argparse.Namespace) -> EditorRule:
+    rule_configs = load_editor_rule_configs(args.rule_file)
+    if args.editor_type not in rule_configs:
+        raise ValueError(f"'{args.editor_type}'は不正なエディタの種類です。 :: {list(rule_configs)}のいずれかを指定してください。")
+    return compile_editor_rule(args.editor_type, rule_configs[args.editor_type])
+
+
+def create_stages(args: argparse.Namespace) -> list[HarStage]:
+    output_dir: Path = args.output_dir
+    builtin_stages: list[HarStage] = []
+    for name, stage_class in BUILTIN_STAGES.items():
+        if name not in args.stage:
+            continue
+        if stage_class is TimingStage:
+            builtin_stages.append(TimingStage(output_dir=output_dir, is_s3_path=args.only_s3_path))
+        elif stage_class is EditorLoadTimeStage:
+            builtin_stages.append(EditorLoadTimeStage(output_dir=output_dir, rule=_load_editor_rule(args), nth_frames=args.nth_frame))
+        else:
+            builtin_stages.append(stage_class(output_dir=output_dir))
+
+    plugin_stages = [load_stage_class(name)(output_dir=output_dir) for name in args.plugin or []]
+
+    # entryを書き換える`sanitize`ステージより前に、独自のステージを配置する
+    sanitize_stages = [e for e in builtin_stages if isinstance(e, SanitizeStage)]
+    other_stages = [e for e in builtin_stages if not isinstance(e, SanitizeStage)]
+    return [*other_stages, *plugin_stages, *sanitize_stages]
+
+
+def main(args: argparse.Namespace) -> None:
+    har_files = collect_har_files(args.har_file)
+    stages = create_stages(args)
+    process_har_files(har_files, stages)
+    print(f"{len(har_files)}件のHARファイルを処理しました。 :: stages={[type(e).__name__ for e in stages]}", file=sys.stderr)  # noqa: T201
+
+
+def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
+    subcommand_name = "process"
+    subcommand_help = "HARファイルを1回だけ読み込んで、マスク、timingのCSV出力、エディタの読み込み時間の算出などをまとめて実行します。"
+
+    parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
+    parser.set_defaults(func=main)
+
+    parser.add_argument(
+        "har_file",
+        type=Path,
+        nargs="+",
+        help="HARファイルのパス。ディレクトリ（配下の`*.har`、`*.har.gz`、`*.har.zst`、`*.har.xz`ファイルを再帰的に処理）やglobパターンも指定できます。",
+    )
+    parser.add_argument(
+        "--output_dir", type=Path, required=True, help="出力先ディレクトリ。ステージごとにファイルまたはサブディレクトリを出力します。"
+    )
+    parser.add_argument(
+        "--stage",
+        nargs="+",
+        choices=list(BUILTIN_STAGES.keys()),
+        default=list(BUILTIN_STAGES.keys()),
+        help="実行する組み込みのステージ。"
+        "`sanitize`: `{output_dir}/sanitize/`にマスクしたHARファイルを出力します。"
+        "`timing`: `{output_dir}/timing/`に`to_timing_csv`と同じCSVを出力します。"
+        "`editor_loadtime`: `{output_dir}/editor_loadtime.json`に`--editor_type`のエディタの読み込み時間を出力します。",
+    )
+    parser.add_argument(
+        "--plugin",
+        nargs="+",
+        help="独自のステージを`module.path:ClassName`形式で指定します。クラスは`ahs.process_har.HarStage`を継承してください。",
+    )
+    parser.add_argument("--only_s3_path", action="store_true", help="`timing`ステージで、AWS S3へアクセスしているリクエストのみを抽出します。")
+    parser.add_argument(
+        "--editor_type",
+        default="3dpc",
+        help="`editor_loadtime`ステージで、読み込み時間を算出するアノテーションエディタ画面の種類。"
+        f"組み込みのルールは{list(DEFAULT_EDITOR_RULE_CONFIGS)}です。",
+    )
+    parser.add_argument(
+        "--rule_file",
+        type=Path,
+        help="`editor_loadtime`ステージのルールを定義したJSONファイル。`editor_loadtime`コマンドと同じ形式です。",
+    )
+    parser.add_argument(
+        "-n",
+        "--nth_frame",
+        type=int,
+        nargs="+",
+        default=[],
+        help="`editor_loadtime`ステージで、N枚目のフレームの読み込み時間も出力します。",
+    )
+
+    return parser
@@ -0,0 +1,238 @@
+"""
+コマンドの処理時間を、HARファイルごと・処理の段階（ステージ）ごとに計測します。
+
+`annofab_har --profile {サブコマンド}`で有効になります。無効な場合は`Profiler.stage`などが何もしないので、処理時間にはほとんど影響しません。
+entryごとに呼ばれる処理は、`Profiler.enabled`を見て計測用のループに切り替えてください。
+
+HARファイルごとに、以下を記録します。
+
+* ステージごとの経過時間[秒]
+* entry数と、入力ファイルのサイズ[byte]。ここから、entries/sとbytes/sを算出します。
+* そのHARファイルの処理を終えた時点の、プロセスのピークRSS[byte]
+
+プロセスプールのワーカーで処理したHARファイルは、`run_with_profile`でワーカー側の計測結果を呼び出し元に返してください。
+"""
+
+import contextlib
+import json
+import sys
+import time
+from collections.abc import Callable, Iterator
+from pathlib import Path
+from typing import Any, TextIO, TypeVar
+
+try:
+    import resource
+except ImportError:  # Windowsには`resource`モジュールが存在しない
+    resource = None  # type: ignore[assignment]
+
+T = TypeVar("T")
+
+_NULL_CONTEXT = contextlib.nullcontext()
+
+
+def get_peak_rss() -> int | None:
+    """
+    プロセスのピークRSS[byte]を返します。取得できない環境ではNoneを返します。
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxの`ru_maxrss`はKiB単位、macOSはbyte単位
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class FileProfile:
+    """
+    1個のHARファイル（またはHARファイルに依存しない処理）の計測結果です。
+
+    Args:
+        name: HARファイルのパスやURI。HARファイルに依存しない処理（CSVの書き込みなど）はNone
+        file_size: 入力ファイルのサイズ[byte]
+    """
+
+    def __init__(self, name: str | None, file_size: int | None = None) -> None:
+        self.name = name
+        self.file_size = file_size
+        self.entry_count = 0
+        self.elapsed_seconds = 0.0
+        self.stage_seconds: dict[str, float] = {}
+        """ステージごとの経過時間[秒]。最初に計測した順番です。"""
+        self.peak_rss: int | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        def per_second(value: int | None, seconds: float) -> float | None:
+            # entry数などが0の場合（CSVの書き込みなど、HARファイルに依存しない処理）は算出しない
+            return value / seconds if value and seconds > 0 else None
+
+        return {
+            "name": self.name,
+            "file_size": self.file_size,
+            "entry_count": self.entry_count,
+            "elapsed_seconds": self.elapsed_seconds,
+            "entries_per_second": per_second(self.entry_count, self.elapsed_seconds),
+            "bytes_per_second": per_second(self.file_size, self.elapsed_seconds),
+            "peak_rss": self.peak_rss,
+            "stages": [
+                {
+                    "name": name,
+                    "elapsed_seconds": seconds,
+                    "entries_per_second": per_second(self.entry_count, seconds),
+                    "bytes_per_second": per_second(self.file_size, seconds),
+                }
+                for name, seconds in self.stage_seconds.items()
+            ],
+        }
+
+
+class Profiler:
+    """
+    処理時間を計測します。プロセスごとに`get_profiler`で取得できるインスタンスを利用してください。
+    """
+
+    def __init__(self, *, enabled: bool = False) -> None:
+        self.enabled = enabled
+        self.command_name: str | None = None
+        self.elapsed_seconds = 0.0
+        self.files: list[FileProfile] = []
+        """HARファイルごとの計測結果。計測を開始した順番です。"""
+        self._global_profile = FileProfile(None)
+        self._current_profile = self._global_profile
+
+    @contextlib.contextmanager
+    def _measure_file(self, name: str, file_size: int | None) -> Iterator[FileProfile]:
+        profile = FileProfile(name, file_size)
+        self.files.append(profile)
+        previous_profile = self._current_profile
+        self._current_profile = profile
+        start = time.perf_counter()
+        try:
+            yield profile
+        finally:
+            profile.elapsed_seconds += time.perf_counter() - start
+            profile.peak_rss = get_peak_rss()
+            self._current_profile = previous_profile
+
+    def file(self, har_file: Path | str, *, file_size: int | None = None) -> contextlib.AbstractContextManager[Any]:
+        """
+        `with`文の中の処理を、1個のHARファイルの処理として計測します。
+
+        Args:
+            har_file: HARファイルのパスやURI
+            file_size: 入力ファイルのサイズ[byte]。未指定で`har_file`がパスならば、ファイルのサイズを取得します。
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        if file_size is None and isinstance(har_file, Path):
+            file_size = har_file.stat().st_size
+        return self._measure_file(str(har_file), file_size)
+
+    @contextlib.contextmanager
+    def _measure_stage(self, name: str) -> Iterator[None]:
+        profile = self._current_profile
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            profile.stage_seconds[name] = profile.stage_seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def stage(self, name: str) -> contextlib.AbstractContextManager[Any]:
+        """
+        `with`文の中の処理を、ステージ`name`の処理時間として計測します。同じステージを複数回計測した場合は合計します。
+        """
+        if not self.enabled:
+            return _NULL_CONTEXT
+        return self._measure_stage(name)
+
+    def add_stage_seconds(self, name: str, seconds: float) -> None:
+        """
+        ステージの処理時間を加算します。entryごとのループなど、`stage`のオーバーヘッドを避けたい箇所で利用します。
+        """
+        stage_seconds = self._current_profile.stage_seconds
+        stage_seconds[name] = stage_seconds.get(name, 0.0) + seconds
+
+    def add_entries(self, count: int) -> None:
+        """
+        処理中のHARファイルのentry数を加算します。
+        """
+        if self.enabled:
+            self._current_profile.entry_count += count
+
+    def merge(self, files: list[FileProfile]) -> None:
+        """
+        プロセスプールのワーカーで計測した結果を追加します。
+        """
+        self.files.extend(files)
+
+    def get_all_profiles(self) -> list[FileProfile]:
+        """
+        HARファイルごとの計測結果と、HARファイルに依存しない処理の計測結果を返します。
+        """
+        if len(self._global_profile.stage_seconds) == 0:
+            return list(self.files)
+        self._global_profile.elapsed_seconds = sum(self._global_profile.stage_seconds.values())
+        return [*self.files, self._global_profile]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "command": self.command_name,
+            "elapsed_seconds": self.elapsed_seconds,
+            "peak_rss": get_peak_rss(),
+            "files": [e.to_dict() for e in self.get_all_profiles()],
+        }
+
+    def write_json(self, output_file: Path) -> None:
+        output_file.parent.mkdir(exist_ok=True, parents=True)
+        output_file.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def print_report(self, fp: TextIO) -> None:
+        """
+        計測結果を、人が読みやすい形式で出力します。
+        """
+
+        def format_rate(value: float | None, unit: str, scale: float = 1) -> str:
+            return f"{value / scale:,.1f} {unit}" if value is not None else "-"
+
+        peak_rss = format_rate(get_peak_rss(), "MB", 1024**2)
+        print(f"[profile] command={self.command_name}, elapsed={self.elapsed_seconds:.3f} s, peak_rss={peak_rss}", file=fp)
+        for profile in self.get_all_profiles():
+            result = profile.to_dict()
+            name = profile.name if profile.name is not None else "(other)"
+            print(
+                f"  {name} :: elapsed={profile.elapsed_seconds:.3f} s, entries={profile.entry_count}"
+                f" ({format_rate(result['entries_per_second'], 'entries/s')}, {format_rate(result['bytes_per_second'], 'MB/s', 1024**2)}),"
+                f" peak_rss={format_rate(profile.peak_rss, 'MB', 1024**2)}",
+                file=fp,
+            )
+            for stage in result["stages"]:
+                ratio = stage["elapsed_seconds"] / profile.elapsed_seconds * 100 if profile.elapsed_seconds > 0 else 0
+                print(
+                    f"    {stage['name']:<24} {stage['elapsed_seconds']:9.3f} s {ratio:5.1f} %"
+                    f"  {format_rate(stage['entries_per_second'], 'entries/s'):>18}  {format_rate(stage['bytes_per_second'], 'MB/s', 1024**2):>12}",
+                    file=fp,
+                )
+
+
+_profiler = Profiler()
+
+
+def get_profiler() -> Profiler:
+    """
+    このプロセスの`Profiler`を返します。
+    """
+    return _profiler
+
+
+def run_with_profile(enabled: bool, func: Callable[..., T], *args: Any, **kwargs: Any) -> tuple[T, list[FileProfile]]:  # noqa: ANN401
+    """
+    プロセスプールのワーカーで`func`を実行して、戻り値とワーカーで計測したHARファイルごとの結果を返します。
+    呼び出し元では、`Profiler.merge`で計測結果を追加してください。
+
+    Args:
+        enabled: 呼び出し元のプロセスで計測が有効かどうか
+    """
+    profiler = get_profiler()
+    profiler.enabled = enabled
+    profiler.files = []
+    result = func(*args, **kwargs)
+    return result, profiler.files
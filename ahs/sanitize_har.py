@@ -1,134 +1,667 @@
 import argparse
+import functools
+import io
 import json
+import sys
+import time
 from argparse import Namespace
-from collections.abc import Collection
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any
-from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+from typing import Any, BinaryIO, NamedTuple, TextIO
+
+from ahs.compression import get_compression, open_compressed, open_text
+from ahs.har_files import HarFileInput, collect_har_files
+from ahs.har_io import dumps_json, load_json_file, loads_json, write_json_bytes
+from ahs.har_stream import HarStreamWriter, iter_har_events, iter_har_file_entries
+from ahs.profiling import Profiler, get_profiler, run_with_profile
+from ahs.sanitize_policy import (
+    DEFAULT_SANITIZE_POLICY,
+    SENSITIVE_QUERY_STRING_KEYS,  # noqa: F401 後方互換性のためにimportしている
+    SENSITIVE_REQUEST_HEADER_KEYS,  # noqa: F401 後方互換性のためにimportしている
+    SENSITIVE_RESPONSE_HEADER_KEYS,  # noqa: F401 後方互換性のためにimportしている
+    STR_REDACTED,
+    NameMatcher,
+    SanitizePolicy,
+    apply_json_path_rules,
+    load_sanitize_policy,
+    mask_query_string_in_url,  # noqa: F401 後方互換性のためにimportしている
+)
+from ahs.storage import ConcurrentWriter, StorageLocation, add_storage_arguments, iter_har_objects, list_har_keys, open_storage
+
+SANITIZE_URL_CACHE_SIZE = 4096
+"""`sanitize_url`の結果をキャッシュするURLの最大件数"""
+
+
+@functools.lru_cache(maxsize=SANITIZE_URL_CACHE_SIZE)
+def sanitize_url(url: str) -> str:
+    """
+    URLのQuery Stringに含まれるセンシティブな値をマスクする
 
-STR_REDACTED = "REDACTED"
-"""編集済を表す文字列"""
+    `_initiator`のコールスタックなどには同じURLが繰り返し現れるので、結果をキャッシュしています。
+    """
+    masked_url, _ = DEFAULT_SANITIZE_POLICY.mask_url(url)
+    return masked_url
 
-SENSITIVE_QUERY_STRING_KEYS = {"X-Amz-Credential", "X-Amz-Signature", "X-Amz-Security-Token"}
 
-SENSITIVE_REQUEST_HEADER_KEYS = {"authorization", "cookie"}
-"""
-マスク対象のリクエストヘッダのキー
+class _UrlMasker(OrderedDict[str, str]):
+    """
+    URLからマスクしたURLへのdictです。存在しないURLを参照すると、マスクして記録します。
+    同じURLは1回だけマスクし、2回目以降は記録した文字列（同じオブジェクト）を返すので、URLの文字列をinternする役割も兼ねます。
 
-Notes:
-    小文字で比較するため、小文字で定義すること。
-"""
+    記録したURLが`max_size`個に達したら、最も長い間参照されていないURLから破棄します（LRU）。
+    署名付きURLが大量にあっても、`_initiator`に繰り返し現れるスクリプトのURLなどは破棄されません。
+    """
 
+    def __init__(self, policy: SanitizePolicy, max_size: int = SANITIZE_URL_CACHE_SIZE) -> None:
+        super().__init__()
+        self.policy = policy
+        self.max_size = max_size
+        self.matched_rules: dict[str, list[str]] = {}
+        """マスクする前のURLから、マッチしたルールの名前のリストへのdict。ルールにマッチしたURLだけを記録します。"""
+
+    def __getitem__(self, url: str) -> str:
+        masked_url = super().__getitem__(url)
+        self.move_to_end(url)
+        return masked_url
+
+    def __missing__(self, url: str) -> str:
+        if len(self) >= self.max_size:
+            oldest_url, _ = self.popitem(last=False)
+            self.matched_rules.pop(oldest_url, None)
+        masked_url, rule_names = self.policy.mask_url(url)
+        if len(rule_names) > 0:
+            self.matched_rules[url] = rule_names
+        self[url] = masked_url
+        return masked_url
+
+
+class _CountingUrlMasker(_UrlMasker):
+    """
+    `_UrlMasker`と同じく、URLからマスクしたURLへのdictです。
+    URLを参照するたびに、マッチしたルールの件数を`match_counts`に加算します。
+    """
 
-SENSITIVE_RESPONSE_HEADER_KEYS = {"set-cookie"}
-"""
-マスク対象のリクエストヘッダのキー
+    def __init__(self, policy: SanitizePolicy, match_counts: Counter[str]) -> None:
+        super().__init__(policy)
+        self.match_counts = match_counts
 
-Notes:
-    小文字で比較するため、小文字で定義すること。
-"""
+    def __getitem__(self, url: str) -> str:
+        masked_url = super().__getitem__(url)
+        rule_names = self.matched_rules.get(url)
+        if rule_names is not None:
+            self.match_counts.update(rule_names)
+        return masked_url
 
 
-def mask_query_string_in_url(url: str, masked_keys: Collection[str]) -> str:
+class HarSanitizer:
     """
-    URLのQuery Stringに含まれるセンシティブな値をマスクする
+    HARファイルのentryから機密情報をマスクします。entryの内容はその場で書き換えます。
+
+    マスクしたURLを記録して再利用するので、1個のHARファイルを処理する間は同じインスタンスを使ってください。
 
+    Args:
+        policy: マスクする対象。Noneならば`DEFAULT_SANITIZE_POLICY`
+        count_url_matches: Trueならば、URLのクエリパラメータがルールにマッチした件数も`match_counts`に数えます。
+            URLのマスク結果は記録して再利用するので、数える場合はURLを参照するたびに記録を引く分だけ遅くなります。
     """
-    # Parse the URL
-    parsed_url = urlparse(url)
-    query_params = parse_qs(parsed_url.query)
-
-    # Mask the sensitive keys
-    for key in masked_keys:
-        if key in query_params:
-            query_params[key] = [STR_REDACTED] * len(query_params[key])
-
-    # Reconstruct the query string and URL
-    masked_query = urlencode(query_params, doseq=True)
-    masked_url = urlunparse(
-        (
-            parsed_url.scheme,
-            parsed_url.netloc,
-            parsed_url.path,
-            parsed_url.params,
-            masked_query,
-            parsed_url.fragment,
-        )
-    )
-    return masked_url
 
+    def __init__(self, policy: SanitizePolicy | None = None, *, count_url_matches: bool = False) -> None:
+        self.policy = policy if policy is not None else DEFAULT_SANITIZE_POLICY
+        self.match_counts: Counter[str] = Counter()
+        """ルールの名前ごとの、マッチした件数"""
+        self._urls = _CountingUrlMasker(self.policy, self.match_counts) if count_url_matches else _UrlMasker(self.policy)
+
+    def mask_url(self, url: str) -> str:
+        """
+        URLのQuery Stringに含まれるセンシティブな値をマスクします。
+        """
+        return self._urls[url]
+
+    def _mask_cookie_pair(self, pair: str) -> str:
+        name, separator, _ = pair.partition("=")
+        rule_name = self.policy.cookie_matcher.match(name.strip())
+        if rule_name is None or separator == "":
+            return pair
+        self.match_counts[rule_name] += 1
+        return f"{name}={STR_REDACTED}"
+
+    def mask_cookie_header(self, value: str) -> str:
+        """
+        `Cookie`ヘッダの値（`name1=value1; name2=value2`）のうち、`cookie`のルールにマッチするCookieの値をマスクします。
+        """
+        return ";".join(self._mask_cookie_pair(e) for e in value.split(";"))
+
+    def mask_set_cookie_header(self, value: str) -> str:
+        """
+        `Set-Cookie`ヘッダの値のうち、`cookie`のルールにマッチするCookieの値をマスクします。
+        複数のCookieは改行区切りで1個のヘッダにまとめられていることがあります。`Path`などの属性はそのまま残します。
+        """
+        lines = []
+        for line in value.split("\n"):
+            pair, separator, attributes = line.partition(";")
+            lines.append(f"{self._mask_cookie_pair(pair)}{separator}{attributes}")
+        return "\n".join(lines)
+
+    def _mask_cookies(self, cookies: list[dict[str, Any]]) -> None:
+        cookie_matcher = self.policy.cookie_matcher
+        for cookie in cookies:
+            rule_name = cookie_matcher.match(cookie["name"])
+            if rule_name is not None:
+                cookie["value"] = STR_REDACTED
+                self.match_counts[rule_name] += 1
+
+    def sanitize_initiator(self, initiator: dict[str, Any]) -> None:
+        """
+        キー`url`に対応する値をマスクします。
+        "_initiator"は標準仕様にはなく、`stack.parent`で数千段の入れ子になることもあるので、再帰呼び出しではなく明示的なスタックで走査します。
+        複数の箇所から参照されているdictやlistは、1回だけ走査します。
+        """
+        urls = self._urls
+        stack: list[Any] = [initiator]
+        visited = {id(initiator)}
+        # ループ内での属性の参照を減らすため、ローカル変数に束縛する
+        push = stack.append
+        pop = stack.pop
+        mark_visited = visited.add
+        while stack:
+            node = pop()
+            if type(node) is dict:
+                for key, value in node.items():
+                    value_type = type(value)
+                    if value_type is str:
+                        if key == "url":
+                            masked_url = urls[value]
+                            # 値が変わらない場合も記録済みの文字列に置き換えて、同じURLの文字列を共有する
+                            if masked_url is not value:
+                                node[key] = masked_url
+                    elif (value_type is dict or value_type is list) and id(value) not in visited:
+                        mark_visited(id(value))
+                        push(value)
+            else:
+                for value in node:
+                    value_type = type(value)
+                    if (value_type is dict or value_type is list) and id(value) not in visited:
+                        mark_visited(id(value))
+                        push(value)
+
+    def _match_header(self, header: dict[str, Any], header_matcher: NameMatcher) -> str | None:
+        """
+        ヘッダの名前にマッチするルールの名前を返します。
+        """
+        # ほとんどのヘッダはルールにマッチしないので、`NameMatcher.match`を呼び出さずに完全一致のdictを直接引く
+        name = header["name"].lower()
+        if name in header_matcher.rule_by_name:
+            return header_matcher.rule_by_name[name]
+        return header_matcher.match_pattern(name) if header_matcher.has_pattern else None
+
+    def sanitize_request(self, request: dict[str, Any]) -> None:
+        policy = self.policy
+        match_counts = self.match_counts
+        header_matcher = policy.request_header_matcher
+        header_rule_by_name = header_matcher.rule_by_name
+        check_header = header_matcher.has_pattern or policy.has_cookie_rules
+        for header in request["headers"]:
+            if header["name"].lower() in header_rule_by_name or check_header:
+                rule_name = self._match_header(header, header_matcher)
+                if rule_name is not None:
+                    header["value"] = STR_REDACTED
+                    match_counts[rule_name] += 1
+                elif policy.has_cookie_rules and header["name"].lower() == "cookie":
+                    header["value"] = self.mask_cookie_header(header["value"])
+
+        query_matcher = policy.query_matcher
+        query_rule_by_name = query_matcher.rule_by_name
+        for qs in request["queryString"]:
+            name = qs["name"]
+            if name in query_rule_by_name:
+                rule_name = query_rule_by_name[name]
+            elif query_matcher.has_pattern:
+                rule_name = query_matcher.match_pattern(name)
+                if rule_name is None:
+                    continue
+            else:
+                continue
+            qs["value"] = STR_REDACTED
+            match_counts[rule_name] += 1
+
+        if policy.has_cookie_rules:
+            self._mask_cookies(request.get("cookies", []))
+        request["url"] = self._urls[request["url"]]
+        apply_json_path_rules(request, policy.json_path_rules["request"], match_counts)
+
+    def sanitize_response(self, response: dict[str, Any]) -> None:
+        policy = self.policy
+        header_matcher = policy.response_header_matcher
+        header_rule_by_name = header_matcher.rule_by_name
+        check_header = header_matcher.has_pattern or policy.has_cookie_rules
+        for header in response["headers"]:
+            if header["name"].lower() in header_rule_by_name or check_header:
+                rule_name = self._match_header(header, header_matcher)
+                if rule_name is not None:
+                    header["value"] = STR_REDACTED
+                    self.match_counts[rule_name] += 1
+                elif policy.has_cookie_rules and header["name"].lower() == "set-cookie":
+                    header["value"] = self.mask_set_cookie_header(header["value"])
+
+        if policy.has_cookie_rules:
+            self._mask_cookies(response.get("cookies", []))
+        apply_json_path_rules(response, policy.json_path_rules["response"], self.match_counts)
+
+    def sanitize_entry(self, entry: dict[str, Any]) -> dict[str, Any]:
+        """
+        `log.entries`の要素1件から機密情報をマスクします。
+        """
+        if "_initiator" in entry:
+            self.sanitize_initiator(entry["_initiator"])
+        self.sanitize_request(entry["request"])
+        self.sanitize_response(entry["response"])
+        apply_json_path_rules(entry, self.policy.json_path_rules[""], self.match_counts)
+        return entry
+
+    def sanitize_entry_with_profile(self, entry: dict[str, Any], stage_seconds: dict[str, float]) -> dict[str, Any]:
+        """
+        `sanitize_entry`と同じ処理を行い、処理ごとの経過時間を`stage_seconds`に加算します。
+        URLのマスクは`sanitize_initiator`と`sanitize_request`の経過時間に、entry直下の`json_path`のルールは`sanitize_response`の経過時間に含まれます。
+        """
+        perf_counter = time.perf_counter
+        start = perf_counter()
+        if "_initiator" in entry:
+            self.sanitize_initiator(entry["_initiator"])
+        initiator_end = perf_counter()
+        self.sanitize_request(entry["request"])
+        request_end = perf_counter()
+        self.sanitize_response(entry["response"])
+        apply_json_path_rules(entry, self.policy.json_path_rules[""], self.match_counts)
+        response_end = perf_counter()
+        stage_seconds["sanitize_initiator"] += initiator_end - start
+        stage_seconds["sanitize_request"] += request_end - initiator_end
+        stage_seconds["sanitize_response"] += response_end - request_end
+        return entry
 
-def sanitize_response(response: dict[str, Any]) -> dict[str, Any]:
-    response["content"]["text"] = STR_REDACTED
-    response["cookies"] = []
 
-    headers = response["headers"]
-    for header in headers:
-        if header["name"].lower() in SENSITIVE_RESPONSE_HEADER_KEYS:
-            header["value"] = STR_REDACTED
+_default_sanitizer = HarSanitizer()
+"""HARファイルに依存しない関数（`sanitize_entry`など）で利用するインスタンス"""
+
 
+def sanitize_response(response: dict[str, Any]) -> dict[str, Any]:
+    _default_sanitizer.sanitize_response(response)
     return response
 
 
 def sanitize_initiator(initiator: dict[str, Any]) -> dict[str, Any]:
     """
     キー`url`に対応する値をマスクする。
-    "_initiator"は標準仕様にはないので、再帰的にアクセスして処理する。
+    "_initiator"は標準仕様にはないので、入れ子のdictやlistをすべて走査して処理する。
 
     """
-    for key, value in initiator.items():
-        if isinstance(value, dict):
-            initiator[key] = sanitize_initiator(value)
-        elif isinstance(value, list):
-            for index, item in enumerate(value):
-                if isinstance(item, dict):
-                    value[index] = sanitize_initiator(item)
-        elif isinstance(value, str):
-            if key == "url":
-                initiator[key] = mask_query_string_in_url(initiator["url"], SENSITIVE_QUERY_STRING_KEYS)
-
+    _default_sanitizer.sanitize_initiator(initiator)
     return initiator
 
 
-def sanitize_url(url: str) -> str:
+def sanitize_request(request: dict[str, Any]) -> dict[str, Any]:
+    _default_sanitizer.sanitize_request(request)
+    return request
+
+
+def sanitize_entry(entry: dict[str, Any]) -> dict[str, Any]:
     """
-    URLのQuery Stringに含まれるセンシティブな値をマスクする
+    `log.entries`の要素1件から機密情報をマスクします。
     """
-    return mask_query_string_in_url(url, SENSITIVE_QUERY_STRING_KEYS)
+    return _default_sanitizer.sanitize_entry(entry)
 
 
-def sanitize_request(request: dict[str, Any]) -> dict[str, Any]:
-    if "postData" in request:
-        request["postData"]["text"] = STR_REDACTED
-    request["cookies"] = []
-    headers = request["headers"]
-
-    for header in headers:
-        if header["name"].lower() in SENSITIVE_REQUEST_HEADER_KEYS:
-            header["value"] = STR_REDACTED
-
-    query_string_list = request["queryString"]
-    for qs in query_string_list:
-        if qs["name"] in SENSITIVE_QUERY_STRING_KEYS:
-            qs["value"] = STR_REDACTED
+def _create_sanitize_stage_seconds() -> dict[str, float]:
+    return {"sanitize_initiator": 0.0, "sanitize_request": 0.0, "sanitize_response": 0.0}
 
-    request["url"] = sanitize_url(request["url"])
-    return request
 
+def _add_stage_seconds(profiler: Profiler, stage_seconds: dict[str, float]) -> None:
+    for name, seconds in stage_seconds.items():
+        profiler.add_stage_seconds(name, seconds)
 
-def sanitize_har_object(data: dict[str, Any]) -> dict[str, Any]:
-    for entry in data["log"]["entries"]:
-        if "_initiator" in entry:
-            entry["_initiator"] = sanitize_initiator(entry["_initiator"])
-        entry["request"] = sanitize_request(entry["request"])
-        entry["response"] = sanitize_response(entry["response"])
+
+def sanitize_har_object(data: dict[str, Any], *, policy: SanitizePolicy | None = None) -> dict[str, Any]:
+    entries = data["log"]["entries"]
+    sanitizer = HarSanitizer(policy)
+    profiler = get_profiler()
+    if profiler.enabled:
+        stage_seconds = _create_sanitize_stage_seconds()
+        for entry in entries:
+            sanitizer.sanitize_entry_with_profile(entry, stage_seconds)
+        _add_stage_seconds(profiler, stage_seconds)
+        profiler.add_entries(len(entries))
+        return data
+
+    for entry in entries:
+        sanitizer.sanitize_entry(entry)
     return data
 
 
-def main(args: Namespace) -> None:
-    input_data = json.loads(args.har_file.read_text(encoding="utf-8"))
-    output_data = sanitize_har_object(input_data)
-    output_string = json.dumps(output_data, ensure_ascii=False)
+def _sanitize_har_stream_with_profile(input_fp: TextIO, output_fp: BinaryIO, profiler: Profiler, policy: SanitizePolicy | None) -> None:
+    """
+    `sanitize_har_stream`と同じ処理を行い、読み込み・マスク・書き込みの経過時間を計測します。
+    """
+    perf_counter = time.perf_counter
+    stage_seconds = {"parse": 0.0, **_create_sanitize_stage_seconds(), "write": 0.0}
+    sanitizer = HarSanitizer(policy)
+    writer = HarStreamWriter(output_fp)
+    events = iter_har_events(input_fp)
+    entry_count = 0
+    while True:
+        start = perf_counter()
+        event = next(events, None)
+        stage_seconds["parse"] += perf_counter() - start
+        if event is None:
+            break
+        if event.kind == "entry":
+            event = event._replace(value=sanitizer.sanitize_entry_with_profile(event.value, stage_seconds))
+            entry_count += 1
+        start = perf_counter()
+        writer.write(event)
+        stage_seconds["write"] += perf_counter() - start
+
+    _add_stage_seconds(profiler, stage_seconds)
+    profiler.add_entries(entry_count)
+
+
+def sanitize_har_stream(input_fp: TextIO, output_fp: BinaryIO, *, policy: SanitizePolicy | None = None) -> None:
+    """
+    HARファイルを`log.entries`の要素ごとに読み込んで機密情報をマスクし、そのまま出力先に書き込みます。
+    HARファイル全体をメモリに読み込まないので、メモリ使用量は最大のentryのサイズに依存します。
+
+    出力内容は`ahs.har_io.dumps_json(sanitize_har_object(data))`と同じです。
+    """
+    profiler = get_profiler()
+    if profiler.enabled:
+        _sanitize_har_stream_with_profile(input_fp, output_fp, profiler, policy)
+        return
+
+    sanitizer = HarSanitizer(policy)
+    writer = HarStreamWriter(output_fp)
+    for event in iter_har_events(input_fp):
+        if event.kind == "entry":
+            writer.write(event._replace(value=sanitizer.sanitize_entry(event.value)))
+        else:
+            writer.write(event)
+
+
+def _sanitize_in_memory(har_file: Path, output_file: Path | None, policy: SanitizePolicy | None) -> None:
+    profiler = get_profiler()
+    with profiler.stage("parse"):
+        input_data = load_json_file(har_file)
+    output_data = sanitize_har_object(input_data, policy=policy)
+    with profiler.stage("serialize"):
+        output_bytes = dumps_json(output_data)
+    with profiler.stage("write"):
+        write_json_bytes(output_bytes, output_file)
+
+
+def _sanitize_streaming(har_file: Path, output_file: Path | None, policy: SanitizePolicy | None) -> None:
+    with open_text(har_file) as input_fp:
+        if output_file is not None:
+            output_file.parent.mkdir(exist_ok=True, parents=True)
+            with open_compressed(output_file, "wb") as output_fp:
+                sanitize_har_stream(input_fp, output_fp, policy=policy)
+        else:
+            sys.stdout.flush()
+            sanitize_har_stream(input_fp, sys.stdout.buffer, policy=policy)
+            sys.stdout.buffer.write(b"\n")
+            sys.stdout.buffer.flush()
+
+
+def sanitize_har_file(har_file: Path, output_file: Path | None, *, mode: str = "stream", policy: SanitizePolicy | None = None) -> None:
+    """
+    HARファイルから機密情報をマスクして、`output_file`に書き込みます。
+
+    Args:
+        output_file: 出力先。Noneならば標準出力に出力します。
+        mode: 処理方法。`stream`、`memory`、`inplace`のいずれか。圧縮されたHARファイルはmmapできないので、`inplace`の代わりに`stream`で処理します。
+        policy: マスクする対象。Noneならば`DEFAULT_SANITIZE_POLICY`。
+            `inplace`はデフォルトのマスク対象しか扱えないので、ポリシーを指定した場合は`stream`で処理します。
+    """
+    with get_profiler().file(har_file):
+        if mode == "memory":
+            _sanitize_in_memory(har_file, output_file, policy)
+        elif mode == "inplace" and policy is None and get_compression(har_file.name) is None:
+            # 循環importを避けるため、関数内でimportする
+            from ahs.sanitize_inplace import sanitize_har_file_inplace
+
+            sanitize_har_file_inplace(har_file, output_file)
+        else:
+            _sanitize_streaming(har_file, output_file, policy)
+
+
+def sanitize_har_bytes(data: bytes, *, mode: str = "stream", policy: SanitizePolicy | None = None) -> bytes:
+    """
+    メモリ上のHARファイルの内容から機密情報をマスクして、マスクした内容を返します。
+
+    Args:
+        mode: 処理方法。`sanitize_har_file`と同じです。
+            `stream`は入力のバイト列からentryを1件ずつ読み書きするので、HARファイル全体のオブジェクトを生成しません。
+    """
+    profiler = get_profiler()
+    output_fp = io.BytesIO()
+    if mode == "memory":
+        with profiler.stage("parse"):
+            input_data = loads_json(data)
+        output_data = sanitize_har_object(input_data, policy=policy)
+        with profiler.stage("serialize"):
+            return dumps_json(output_data)
+    if mode == "inplace" and policy is None:
+        from ahs.sanitize_inplace import sanitize_har_buffer
+
+        with profiler.stage("sanitize_inplace"):
+            profiler.add_entries(sanitize_har_buffer(data, output_fp))
+    else:
+        sanitize_har_stream(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8", newline=""), output_fp, policy=policy)
+    return output_fp.getvalue()
+
+
+class SanitizeResult(NamedTuple):
+    har_file: Path | str
+    """HARファイルのパス、またはストレージのオブジェクトのURI"""
+    output_file: Path | str
+    file_size: int
+    """入力ファイルのサイズ[byte]"""
+    elapsed_seconds: float
+    error: str | None = None
+    """失敗した場合のエラーメッセージ"""
+
+
+def _try_sanitize_har_file(har_file: Path, output_file: Path, mode: str, policy: SanitizePolicy | None) -> SanitizeResult:
+    """
+    HARファイルから機密情報をマスクします。プロセスプールのワーカーでも実行できるよう、例外を送出せずに結果を返します。
+    """
+    start_time = time.perf_counter()
+    error = None
+    try:
+        file_size = har_file.stat().st_size
+        sanitize_har_file(har_file, output_file, mode=mode, policy=policy)
+    except Exception as e:
+        file_size = 0
+        error = f"{type(e).__name__}: {e}"
+    return SanitizeResult(har_file, output_file, file_size, time.perf_counter() - start_time, error)
+
+
+def sanitize_har_files(
+    har_files: list[HarFileInput], output_dir: Path, *, mode: str = "stream", policy: SanitizePolicy | None = None, jobs: int = 1
+) -> list[SanitizeResult]:
+    """
+    複数のHARファイルから機密情報をマスクして、`output_dir`に書き込みます。
+    `jobs`が2以上ならば、プロセスプールで並列に処理します。
+
+    Returns:
+        HARファイルごとの処理結果。`har_files`と同じ順番です。
+    """
+    output_files = [output_dir / e.relative_path for e in har_files]
+    if len(set(output_files)) != len(output_files):
+        raise ValueError("出力先のファイルパスが重複しています。同じ名前のHARファイルは、別々のサブディレクトリに配置してください。")
+
+    if jobs <= 1:
+        return [_try_sanitize_har_file(e.path, output_file, mode, policy) for e, output_file in zip(har_files, output_files, strict=True)]
+
+    profiler = get_profiler()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(run_with_profile, profiler.enabled, _try_sanitize_har_file, e.path, output_file, mode, policy)
+            for e, output_file in zip(har_files, output_files, strict=True)
+        ]
+        results = []
+        for future in futures:
+            result, file_profiles = future.result()
+            profiler.merge(file_profiles)
+            results.append(result)
+        return results
+
+
+def sanitize_har_objects(
+    input_location: StorageLocation,
+    output_location: StorageLocation,
+    *,
+    max_concurrency: int,
+    mode: str = "stream",
+    policy: SanitizePolicy | None = None,
+) -> list[SanitizeResult]:
+    """
+    ストレージにある複数のHARファイルから機密情報をマスクして、出力先のストレージに書き込みます。
+    ダウンロードとアップロードはスレッドプールで並行して行い、その間にダウンロード済みのHARファイルをマスクします。
+    オブジェクトは展開した内容全体をメモリに読み込むので、同時にメモリに載るオブジェクトは最大`max_concurrency`個です。
+
+    Args:
+        mode: 処理方法。`sanitize_har_bytes`と同じです。
+
+    Returns:
+        HARファイルごとの処理結果。キーの昇順です。
+    """
+    profiler = get_profiler()
+    keys = list_har_keys(input_location)
+    results: list[SanitizeResult] = []
+    write_futures = []
+    with ConcurrentWriter(output_location, max_concurrency=max_concurrency) as writer:
+        for key, har_object in zip(keys, iter_har_objects(input_location, keys, max_concurrency=max_concurrency), strict=True):
+            input_uri = input_location.storage.get_uri(key)
+            if isinstance(har_object, BaseException):
+                results.append(SanitizeResult(input_uri, "", 0, 0, f"{type(har_object).__name__}: {har_object}"))
+                continue
+
+            start_time = time.perf_counter()
+            try:
+                with profiler.file(input_uri, file_size=har_object.size):
+                    output_bytes = sanitize_har_bytes(har_object.data, mode=mode, policy=policy)
+            except Exception as e:
+                results.append(SanitizeResult(input_uri, "", har_object.size, time.perf_counter() - start_time, f"{type(e).__name__}: {e}"))
+                continue
+
+            output_uri = output_location.storage.get_uri(output_location.prefix + har_object.relative_key)
+            write_futures.append((len(results), writer.write(har_object.relative_key, output_bytes)))
+            results.append(SanitizeResult(input_uri, output_uri, har_object.size, time.perf_counter() - start_time))
+
+    for index, future in write_futures:
+        exception = future.exception()
+        if exception is not None:
+            results[index] = results[index]._replace(error=f"{type(exception).__name__}: {exception}")
+    return results
+
+
+def _main_with_storage(args: Namespace, policy: SanitizePolicy | None) -> None:
+    if len(args.har_file) > 0:
+        raise ValueError("HARファイルのパスと`--input_uri`は同時に指定できません。")
+    output_uri = args.output_uri if args.output_uri is not None else args.output_dir
+    if output_uri is None:
+        raise ValueError("`--input_uri`を指定した場合は、`--output_uri`または`--output_dir`を指定してください。")
+    if args.jobs != 1:
+        raise ValueError(
+            "`--input_uri`を指定した場合は、`--jobs`を指定できません。並行してダウンロードする数は`--max_concurrency`で指定してください。"
+        )
+
+    input_location = open_storage(args.input_uri, endpoint_url=args.endpoint_url, max_concurrency=args.max_concurrency)
+    output_location = open_storage(str(output_uri), endpoint_url=args.endpoint_url, max_concurrency=args.max_concurrency)
+    start_time = time.perf_counter()
+    results = sanitize_har_objects(input_location, output_location, max_concurrency=args.max_concurrency, mode=args.mode, policy=policy)
+    print_summary(results, time.perf_counter() - start_time)
+    if any(e.error is not None for e in results):
+        sys.exit(1)
+
+
+def print_summary(results: list[SanitizeResult], elapsed_seconds: float) -> None:
+    """
+    HARファイルごとの成否と、全体のスループットを標準エラー出力に出力します。
+    """
+    for result in results:
+        if result.error is None:
+            size_mb = result.file_size / 1024**2
+            print(f"[OK] {result.har_file} -> {result.output_file} ({size_mb:.1f} MB, {result.elapsed_seconds:.2f} s)", file=sys.stderr)  # noqa: T201
+        else:
+            print(f"[FAILED] {result.har_file} :: {result.error}", file=sys.stderr)  # noqa: T201
+
+    success_count = sum(1 for e in results if e.error is None)
+    total_size_mb = sum(e.file_size for e in results) / 1024**2
+    throughput = total_size_mb / elapsed_seconds if elapsed_seconds > 0 else 0
+    print(  # noqa: T201
+        f"{success_count}/{len(results)}件のHARファイルのマスクに成功しました。 :: "
+        f"{total_size_mb:.1f} MB, {elapsed_seconds:.2f} s, {throughput:.1f} MB/s",
+        file=sys.stderr,
+    )
+
+
+def _count_matches_in_har_file(har_file: Path, policy: SanitizePolicy | None) -> dict[str, Any]:
+    """
+    HARファイルのentryをマスクして、ルールごとにマッチした件数を数えます。マスクした結果は書き込みません。
+    プロセスプールのワーカーでも実行できるよう、例外を送出せずに`error`キーにエラーの内容を格納します。
+    """
+    profiler = get_profiler()
+    sanitizer = HarSanitizer(policy, count_url_matches=True)
+    entry_count = 0
+    try:
+        with profiler.file(har_file), profiler.stage("sanitize"):
+            for entry in iter_har_file_entries(har_file):
+                sanitizer.sanitize_entry(entry)
+                entry_count += 1
+            profiler.add_entries(entry_count)
+    except Exception as e:
+        return {"har_file": str(har_file), "error": f"{type(e).__name__}: {e}"}
+    match_counts = sanitizer.match_counts
+    return {"har_file": str(har_file), "entry_count": entry_count, "matches": {name: match_counts[name] for name in sanitizer.policy.rule_names}}
+
+
+def create_sanitize_report(har_files: list[Path], *, policy: SanitizePolicy | None = None, jobs: int = 1) -> dict[str, Any]:
+    """
+    HARファイルを書き込まずにマスクして、ルールごとにマッチした件数を数えます。
+    `jobs`が2以上ならば、プロセスプールで並列に処理します。
+
+    Returns:
+        `files`（HARファイルごとの件数。`har_files`と同じ順番）と`total`（全HARファイルの合計）をキーに持つdict
+    """
+    func = functools.partial(_count_matches_in_har_file, policy=policy)
+    if jobs <= 1:
+        files = [func(har_file) for har_file in har_files]
+    else:
+        profiler = get_profiler()
+        profiled_func = functools.partial(run_with_profile, profiler.enabled, func)
+        files = []
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for result, file_profiles in executor.map(profiled_func, har_files, chunksize=max(1, len(har_files) // (jobs * 4))):
+                profiler.merge(file_profiles)
+                files.append(result)
+
+    rule_names = (policy if policy is not None else DEFAULT_SANITIZE_POLICY).rule_names
+    succeeded_files = [e for e in files if "error" not in e]
+    total = {
+        "entry_count": sum(e["entry_count"] for e in succeeded_files),
+        "matches": {name: sum(e["matches"][name] for e in succeeded_files) for name in rule_names},
+    }
+    return {"files": files, "total": total}
+
+
+def _main_report(args: Namespace, policy: SanitizePolicy | None) -> None:
+    if args.input_uri is not None or args.output_uri is not None or args.output_dir is not None:
+        raise ValueError("`--report`を指定した場合は、`--input_uri`、`--output_uri`、`--output_dir`は指定できません。")
+    if len(args.har_file) == 0:
+        raise ValueError("HARファイルのパスを指定してください。")
+
+    har_files = [e.path for e in collect_har_files(args.har_file)]
+    report = create_sanitize_report(har_files, policy=policy, jobs=args.jobs)
+    output_string = json.dumps(report, ensure_ascii=False, indent=2)
     if args.output is not None:
         output_file: Path = args.output
         output_file.parent.mkdir(exist_ok=True, parents=True)
@@ -136,6 +669,41 @@ def main(args: Namespace) -> None:
     else:
         print(output_string)  # noqa: T201
 
+    error_count = sum(1 for e in report["files"] if "error" in e)
+    if error_count > 0:
+        print(f"{error_count}/{len(har_files)}件のHARファイルの処理に失敗しました。", file=sys.stderr)  # noqa: T201
+        sys.exit(1)
+
+
+def main(args: Namespace) -> None:
+    policy = load_sanitize_policy(args.policy_file) if args.policy_file is not None else None
+    if args.report:
+        _main_report(args, policy)
+        return
+    if args.input_uri is not None:
+        _main_with_storage(args, policy)
+        return
+    if args.output_uri is not None:
+        raise ValueError("`--output_uri`は`--input_uri`と一緒に指定してください。")
+    if len(args.har_file) == 0:
+        raise ValueError("HARファイルのパスか`--input_uri`を指定してください。")
+
+    har_files = collect_har_files(args.har_file)
+    if args.output_dir is None:
+        if len(har_files) != 1:
+            raise ValueError(
+                f"{len(har_files)}件のHARファイルが見つかりました。複数のHARファイルを処理する場合は、`--output_dir`を指定してください。"
+            )
+        sanitize_har_file(har_files[0].path, args.output, mode=args.mode, policy=policy)
+        return
+
+    start_time = time.perf_counter()
+    results = sanitize_har_files(har_files, args.output_dir, mode=args.mode, policy=policy, jobs=args.jobs)
+    print_summary(results, time.perf_counter() - start_time)
+    if any(e.error is not None for e in results):
+        # 失敗したファイルがあることを呼び出し元に伝えるため、Exit Codeを1にする
+        sys.exit(1)
+
 
 def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
     subcommand_name = "sanitize"
@@ -144,7 +712,51 @@ def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParse
     parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
     parser.set_defaults(func=main)
 
-    parser.add_argument("har_file", type=Path)
-    parser.add_argument("-o", "--output", type=Path, help="出力先。未指定ならば標準出力に出力します。")
+    parser.add_argument(
+        "har_file",
+        type=Path,
+        nargs="*",
+        help="HARファイルのパス。ディレクトリ（配下の`*.har`、`*.har.gz`、`*.har.zst`、`*.har.xz`ファイルを再帰的に処理）やglobパターンも指定できます。",
+    )
+    output_group = parser.add_mutually_exclusive_group()
+    output_group.add_argument("-o", "--output", type=Path, help="出力先。未指定ならば標準出力に出力します。HARファイルが1個のときのみ指定できます。")
+    output_group.add_argument(
+        "--output_dir",
+        type=Path,
+        help="出力先ディレクトリ。複数のHARファイルを処理する場合は必須です。処理が終わると、ファイルごとの成否とスループットを標準エラー出力に出力します。",
+    )
+    output_group.add_argument(
+        "--output_uri", help="`--input_uri`を指定したときの出力先のストレージのURI。`s3://bucket/prefix/`またはディレクトリを指定します。"
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="`--output_dir`または`--report`を指定したときに、並列に処理するプロセス数。`--input_uri`とは併用できません。",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=["stream", "memory", "inplace"],
+        default="stream",
+        help="処理方法。"
+        "`stream`は`log.entries`の要素を1件ずつ読み書きするので、メモリ使用量は最大のentryのサイズに依存します。"
+        "`memory`はHARファイル全体をメモリに読み込んでから処理します。"
+        "`inplace`はHARファイルをパースせずに、マスク対象の値のバイト範囲だけを置き換えて、それ以外はそのまま書き込みます。"
+        "entryの走査はPythonで行うので、通常は`stream`の方が高速です。"
+        "圧縮されたHARファイルと、`--policy_file`を指定した場合は`stream`で処理します。",
+    )
+    parser.add_argument(
+        "--policy_file",
+        type=Path,
+        help="マスクする対象（ヘッダ、クエリパラメータ、Cookie、JSONのパス）を定義したポリシーファイル（JSON）のパス。"
+        "未指定ならば、`Authorization`ヘッダやCookie、S3の署名付きURLのクエリパラメータなどをマスクします。",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="マスクした結果を書き込まずに、ルールごとにマッチした件数をJSONで出力します。出力先は`--output`で指定します。",
+    )
+    add_storage_arguments(parser)
 
     return parser
@@ -0,0 +1,441 @@
+"""
+HARファイルをパースせずに、マスク対象の値のバイト範囲だけを置き換えて出力します。`annofab_har sanitize --mode inplace`で利用します。
+
+HARファイルをmmapして先頭から走査し、以下の値のバイト範囲を特定します。
+
+* `request.postData.text`、`response.content.text`
+* `request.cookies`、`response.cookies`
+* マスク対象のヘッダ、マスク対象のクエリパラメータ
+* `request.url`と、`_initiator`のうちマスク対象のURLを含むもの
+
+置き換えない範囲は、mmapした領域の`memoryview`をそのまま出力先に書き込むので、バイト列のコピーが発生しません。
+出力内容は`--mode stream`とは空白やエスケープの有無が異なりますが、パースした結果は同じです。
+
+Pythonで1文字ずつ走査すると遅いので、HARの構造に沿って必要なオブジェクト（entry、`request`、`response`など）の中だけを走査します。
+それ以外の値は、標準ライブラリの`json`モジュールのスキャナ（C実装）で終端を探して読み飛ばし、長い文字列は`bytes.find`で終端を探します。
+ヘッダや`_initiator`などは、マスク対象を含む可能性がある場合だけデコードしてマスクし、エンコードした結果で置き換えます。
+
+それでもentryごとの走査はPythonで行うので、C実装のJSONライブラリでパースする`--mode stream`より遅いことがほとんどです。
+"""
+
+import json
+import json.scanner
+import mmap
+import re
+import sys
+from collections.abc import Callable, Mapping
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from ahs.compression import open_compressed
+from ahs.har_io import get_json_backend
+from ahs.profiling import get_profiler
+from ahs.sanitize_har import HarSanitizer
+from ahs.sanitize_policy import DEFAULT_SANITIZE_POLICY, STR_REDACTED, NameMatcher
+
+WINDOW_SIZE = 8 * 1024**2
+"""
+コンテナを読み飛ばすときに、文字列に変換する範囲の初期サイズ[byte]。
+コンテナがこの範囲に収まらない場合は、範囲を広げます。
+"""
+
+_FLUSH_REPLACEMENT_COUNT = 4096
+"""置き換える範囲がこの個数以上溜まったら、entryの区切りで出力先に書き込みます。"""
+
+_STRING = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_STRING_PATTERN = re.compile(_STRING)
+
+_SIMPLE_STRING_LENGTH = 256
+"""正規表現で読み飛ばす文字列の最大長。Pythonの正規表現は1文字ずつ照合するので、長い文字列は`bytes.find`で終端を探します。"""
+
+_SIMPLE_STRING = rb'"[^"\\]{0,%d}"' % _SIMPLE_STRING_LENGTH
+_SIMPLE_VALUE = (
+    _SIMPLE_STRING
+    + rb"|-?[0-9][0-9.eE+\-]*|true|false|null"
+    + rb'|\{[^{}\[\]"]*(?:'
+    + _SIMPLE_STRING
+    + rb'[^{}\[\]"]*)*\}|\[[^{}\[\]"]*(?:'
+    + _SIMPLE_STRING
+    + rb'[^{}\[\]"]*)*\]'
+)
+"""エスケープを含まない短い文字列、スカラー値、それらだけを含むオブジェクトや配列にマッチする正規表現"""
+
+_MEMBER_PATTERN = re.compile(rb"\s*(" + _STRING + rb")\s*:\s*(?:(" + _SIMPLE_VALUE + rb")\s*([,}]))?")
+"""
+オブジェクトのキー（グループ1）にマッチする正規表現。
+値が`_SIMPLE_VALUE`にマッチする場合は、値（グループ2）とその後の区切り文字（グループ3）にもマッチします。
+"""
+_SEPARATOR_PATTERN = re.compile(rb"\s*([,}\]])")
+_WHITESPACE_PATTERN = re.compile(rb"\s*")
+_EMPTY_OBJECT_PATTERN = re.compile(rb"\{\s*\}")
+_EMPTY_ARRAY_PATTERN = re.compile(rb"\[\s*\]")
+_SCALAR_PATTERN = re.compile(rb"-?[0-9][0-9.eE+\-]*|true|false|null")
+
+_OPEN_BRACE = ord("{")
+_OPEN_BRACKET = ord("[")
+_QUOTE = ord('"')
+
+_REDACTED_JSON = json.dumps(STR_REDACTED).encode("utf-8")
+_EMPTY_ARRAY_JSON = b"[]"
+
+
+def _create_keyword_pattern(matcher: NameMatcher, *, is_json_string: bool = True) -> re.Pattern[bytes]:
+    """
+    `matcher`のルールにマッチする名前を含む可能性があるバイト列にマッチする正規表現を返します。
+    エスケープを含む文字列はデコードしないと比較できないので、`\\u`にもマッチさせます。
+    正規表現のルールがある場合は、名前をデコードしないと判定できないので、常にマッチする正規表現を返します。
+
+    Args:
+        is_json_string: Trueならば、名前をJSONの文字列（`"`で囲んだもの）として探します。
+    """
+    if matcher.has_pattern:
+        return re.compile(b"")
+    names = sorted(matcher.rule_by_name)
+    alternatives = [re.escape(json.dumps(e).encode("utf-8") if is_json_string else e.encode("utf-8")) for e in names]
+    return re.compile(b"|".join([*alternatives, rb"\\u"]), re.IGNORECASE if matcher.ignore_case else 0)
+
+
+_REQUEST_HEADER_PATTERN = _create_keyword_pattern(DEFAULT_SANITIZE_POLICY.request_header_matcher)
+_RESPONSE_HEADER_PATTERN = _create_keyword_pattern(DEFAULT_SANITIZE_POLICY.response_header_matcher)
+_QUERY_STRING_PATTERN = _create_keyword_pattern(DEFAULT_SANITIZE_POLICY.query_matcher)
+_URL_PATTERN = re.compile(_create_keyword_pattern(DEFAULT_SANITIZE_POLICY.query_matcher, is_json_string=False).pattern + rb"|[?&][^=&#\"]*[%+]")
+"""
+`HarSanitizer.mask_url`で変わる可能性があるURLにマッチする正規表現。
+パーセントエンコードされたクエリパラメータの名前は、デコードしないと比較できないので、`%`や`+`を含む名前にもマッチさせます。
+"""
+
+
+def _find_string_end(buffer: Any, start: int) -> int:  # noqa: ANN401
+    """
+    `start`の`"`から始まるJSONの文字列の、終了位置（閉じる`"`の次）を返します。
+    """
+    end = buffer.find(b'"', start + 1)
+    if end == -1:
+        raise ValueError(f"{start}バイト目から始まる文字列が閉じられていません。")
+    if buffer.find(b"\\", start + 1, end) == -1:
+        return end + 1
+    # エスケープを含む文字列は、エスケープされた`"`が多いこともあるので正規表現で照合する
+    match = _STRING_PATTERN.match(buffer, start)
+    if match is None:
+        raise ValueError(f"{start}バイト目から始まる文字列が閉じられていません。")
+    return match.end()
+
+
+class _InplaceSanitizer:
+    """
+    1個のHARファイルについて、置き換えるバイト範囲を記録して、出力先に書き込みます。
+    """
+
+    def __init__(self, buffer: Any, output_fp: BinaryIO) -> None:  # noqa: ANN401
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.output_fp = output_fp
+        self.position = 0
+        """出力先に書き込んだ、入力のバイト位置"""
+        self.replacements: list[tuple[int, int, bytes]] = []
+        """置き換える範囲の開始位置、終了位置、置き換えた後のバイト列。位置の昇順です。"""
+        self.entry_count = 0
+        self.is_found_entries = False
+        self.sanitizer = HarSanitizer()
+        self.json_backend = get_json_backend()
+
+        self._scan_once = json.scanner.make_scanner(json.JSONDecoder())  # type: ignore[arg-type]
+        # latin-1でデコードすると、文字列のインデックスとバイト位置が一致する
+        self._window = ""
+        self._window_start = 0
+        self._window_size = WINDOW_SIZE
+
+        self._entry_handlers = {
+            b'"request"': self.walk_request,
+            b'"response"': self.walk_response,
+            b'"_initiator"': self.sanitize_initiator,
+        }
+        self._request_handlers = {
+            b'"url"': self.mask_url,
+            b'"headers"': self.sanitize_request_headers,
+            b'"queryString"': self.sanitize_query_string,
+            b'"postData"': self.walk_text_object,
+        }
+        self._response_handlers = {
+            b'"headers"': self.sanitize_response_headers,
+            b'"content"': self.walk_text_object,
+        }
+
+    def flush(self, end: int) -> None:
+        """
+        入力の`end`までのバイト列を、置き換えながら出力先に書き込みます。
+        """
+        write = self.output_fp.write
+        view = self.view
+        position = self.position
+        for start, stop, value in self.replacements:
+            if position < start:
+                write(view[position:start])
+            write(value)
+            position = stop
+        self.replacements.clear()
+        if position < end:
+            write(view[position:end])
+        self.position = end
+
+    def replace(self, start: int, end: int, value: bytes) -> None:
+        self.replacements.append((start, end, value))
+
+    def skip_container(self, start: int) -> int:
+        """
+        `start`から始まるオブジェクトまたは配列の、終了位置を返します。
+        """
+        while True:
+            offset = start - self._window_start
+            if 0 <= offset < len(self._window):
+                try:
+                    _, end = self._scan_once(self._window, offset)
+                    return self._window_start + end
+                except (StopIteration, json.JSONDecodeError) as e:
+                    # コンテナが範囲に収まっていない
+                    if self._window_start + len(self._window) >= len(self.buffer):
+                        raise ValueError(f"{start}バイト目から始まるJSONの値が不正です。 :: {e}") from e
+                    if offset == 0:
+                        self._window_size *= 2
+            self._window_start = start
+            self._window = str(self.view[start : start + self._window_size], "latin-1")
+
+    def skip_value(self, start: int) -> int:
+        """
+        `start`から始まるJSONの値の、終了位置を返します。
+        """
+        first = self.buffer[start]
+        if first == _QUOTE:
+            return _find_string_end(self.buffer, start)
+        if first in b"{[":
+            return self.skip_container(start)
+        match = _SCALAR_PATTERN.match(self.buffer, start)
+        if match is None:
+            raise ValueError(f"{start}バイト目にJSONの値がありません。")
+        return match.end()
+
+    def walk_object(
+        self, start: int, handlers: Mapping[bytes, Callable[[int], int]], replaced_key: bytes | None = None, replaced_value: bytes = b""
+    ) -> int:
+        """
+        `start`から始まるオブジェクトを走査して、終了位置を返します。
+
+        Args:
+            handlers: キーから、値の開始位置を受け取って値の終了位置を返す関数へのdict。それ以外のキーの値は読み飛ばします。
+            replaced_key: 値全体を`replaced_value`で置き換えるキー。存在しなければ、オブジェクトの末尾に追加します。
+        """
+        buffer = self.buffer
+        if buffer[start] != _OPEN_BRACE:
+            return self.skip_value(start)
+        is_found = False
+        empty_match = _EMPTY_OBJECT_PATTERN.match(buffer, start)
+        if empty_match is not None:
+            close_position = empty_match.end() - 1
+            has_members = False
+        else:
+            position = start + 1
+            while True:
+                member_match = _MEMBER_PATTERN.match(buffer, position)
+                if member_match is None:
+                    raise ValueError(f"{position}バイト目にオブジェクトのキーがありません。")
+                key, simple_value, simple_separator = member_match.groups()
+                # エスケープを含むキーは、デコードしてから比較する
+                key = _normalize_key(key) if b"\\" in key else key
+                handler = handlers.get(key)
+                if handler is None and key != replaced_key and simple_separator is not None:
+                    # 多くの値は短い文字列やスカラー値なので、区切り文字までまとめて読み飛ばす
+                    if simple_separator == b"}":
+                        close_position = member_match.end() - 1
+                        break
+                    position = member_match.end()
+                    continue
+
+                value_start = member_match.start(2) if simple_value is not None else member_match.end()
+                if key == replaced_key:
+                    is_found = True
+                    position = self.replace_value(value_start, replaced_value)
+                else:
+                    position = handler(value_start) if handler is not None else self.skip_value(value_start)
+                separator_match = _SEPARATOR_PATTERN.match(buffer, position)
+                if separator_match is None or separator_match.group(1) == b"]":
+                    raise ValueError(f"{position}バイト目に`,`または`}}`がありません。")
+                if separator_match.group(1) == b"}":
+                    close_position = separator_match.start(1)
+                    break
+                position = separator_match.end()
+            has_members = True
+
+        if replaced_key is not None and not is_found:
+            separator = b"," if has_members else b""
+            self.replace(close_position, close_position, separator + replaced_key + b":" + replaced_value)
+        return close_position + 1
+
+    def replace_value(self, start: int, value: bytes) -> int:
+        """
+        `start`から始まる値を`value`で置き換えて、元の値の終了位置を返します。
+        """
+        end = self.skip_value(start)
+        if self.view[start:end] != value:
+            self.replace(start, end, value)
+        return end
+
+    def walk_array(self, start: int, on_element: Callable[[int], int]) -> int:
+        """
+        `start`から始まる配列を走査して、終了位置を返します。
+
+        Args:
+            on_element: 要素の開始位置を受け取って、要素の終了位置を返す関数
+        """
+        buffer = self.buffer
+        if buffer[start] != _OPEN_BRACKET:
+            return self.skip_value(start)
+        empty_match = _EMPTY_ARRAY_PATTERN.match(buffer, start)
+        if empty_match is not None:
+            return empty_match.end()
+        position = start + 1
+        while True:
+            position = on_element(_WHITESPACE_PATTERN.match(buffer, position).end())  # type: ignore[union-attr]
+            separator_match = _SEPARATOR_PATTERN.match(buffer, position)
+            if separator_match is None or separator_match.group(1) == b"}":
+                raise ValueError(f"{position}バイト目に`,`または`]`がありません。")
+            if separator_match.group(1) == b"]":
+                return separator_match.end()
+            position = separator_match.end()
+
+    def sanitize_value(self, start: int, pattern: re.Pattern[bytes], sanitize: Callable[[Any], object]) -> int:
+        """
+        `start`から始まる値を読み飛ばして、終了位置を返します。
+        値が`pattern`にマッチする場合だけ、デコードして`sanitize`でマスクし、エンコードした結果で置き換えます。
+        """
+        end = self.skip_value(start)
+        if pattern.search(self.buffer, start, end) is not None:
+            value = self.json_backend.loads(bytes(self.view[start:end]))
+            sanitize(value)
+            self.replace(start, end, self.json_backend.dumps(value))
+        return end
+
+    def mask_url(self, start: int) -> int:
+        end = self.skip_value(start)
+        if _URL_PATTERN.search(self.buffer, start, end) is not None:
+            url = json.loads(bytes(self.view[start:end]))
+            masked_url = self.sanitizer.mask_url(url) if type(url) is str else url
+            if masked_url != url:
+                self.replace(start, end, json.dumps(masked_url, ensure_ascii=False).encode("utf-8"))
+        return end
+
+    def walk_log(self, start: int) -> int:
+        return self.walk_object(start, {b'"entries"': self.walk_entries})
+
+    def walk_entries(self, start: int) -> int:
+        if self.buffer[start] != _OPEN_BRACKET:
+            return self.skip_value(start)
+        self.is_found_entries = True
+        return self.walk_array(start, self.walk_entry)
+
+    def walk_entry(self, start: int) -> int:
+        end = self.walk_object(start, self._entry_handlers)
+        self.entry_count += 1
+        if len(self.replacements) >= _FLUSH_REPLACEMENT_COUNT:
+            self.flush(end)
+        return end
+
+    def walk_request(self, start: int) -> int:
+        return self.walk_object(start, self._request_handlers, b'"cookies"', _EMPTY_ARRAY_JSON)
+
+    def walk_response(self, start: int) -> int:
+        return self.walk_object(start, self._response_handlers, b'"cookies"', _EMPTY_ARRAY_JSON)
+
+    def walk_text_object(self, start: int) -> int:
+        """`postData`と`content`"""
+        return self.walk_object(start, {}, b'"text"', _REDACTED_JSON)
+
+    def sanitize_initiator(self, start: int) -> int:
+        return self.sanitize_value(start, _URL_PATTERN, self.sanitizer.sanitize_initiator)
+
+    def sanitize_request_headers(self, start: int) -> int:
+        return self.sanitize_value(start, _REQUEST_HEADER_PATTERN, _sanitize_request_headers)
+
+    def sanitize_response_headers(self, start: int) -> int:
+        return self.sanitize_value(start, _RESPONSE_HEADER_PATTERN, _sanitize_response_headers)
+
+    def sanitize_query_string(self, start: int) -> int:
+        return self.sanitize_value(start, _QUERY_STRING_PATTERN, _sanitize_query_string)
+
+    def run(self) -> int:
+        """
+        Returns:
+            処理したentryの件数
+        """
+        start = _WHITESPACE_PATTERN.match(self.buffer).end()  # type: ignore[union-attr]
+        if start < len(self.buffer):
+            self.walk_object(start, {b'"log"': self.walk_log})
+        if not self.is_found_entries:
+            raise ValueError("`log.entries`が見つかりませんでした。")
+        self.flush(len(self.buffer))
+        return self.entry_count
+
+
+def _normalize_key(key: bytes) -> bytes:
+    """
+    エスケープを含むオブジェクトのキー（`"\\u0075rl"`など）をデコードして、エスケープしない形式（`"url"`）に変換します。
+    """
+    return json.dumps(json.loads(key)).encode("utf-8")
+
+
+def _mask_matched_values(items: list[dict[str, Any]], matcher: NameMatcher) -> None:
+    for item in items:
+        if matcher.match(item["name"]) is not None:
+            item["value"] = STR_REDACTED
+
+
+def _sanitize_request_headers(headers: list[dict[str, Any]]) -> None:
+    _mask_matched_values(headers, DEFAULT_SANITIZE_POLICY.request_header_matcher)
+
+
+def _sanitize_response_headers(headers: list[dict[str, Any]]) -> None:
+    _mask_matched_values(headers, DEFAULT_SANITIZE_POLICY.response_header_matcher)
+
+
+def _sanitize_query_string(query_string: list[dict[str, Any]]) -> None:
+    _mask_matched_values(query_string, DEFAULT_SANITIZE_POLICY.query_matcher)
+
+
+def sanitize_har_buffer(buffer: Any, output_fp: BinaryIO) -> int:  # noqa: ANN401
+    """
+    HARファイルの内容から機密情報をマスクして、出力先に書き込みます。
+    マスク対象の値のバイト範囲だけを置き換えて、それ以外のバイト列はそのまま書き込みます。
+
+    Args:
+        buffer: HARファイルの内容。`bytes`や`mmap.mmap`など
+        output_fp: 出力先
+
+    Returns:
+        処理したentryの件数
+    """
+    sanitizer = _InplaceSanitizer(buffer, output_fp)
+    try:
+        return sanitizer.run()
+    finally:
+        # mmapを閉じられるように、参照を解放する
+        sanitizer.view.release()
+
+
+def sanitize_har_file_inplace(har_file: Path, output_file: Path | None) -> None:
+    """
+    圧縮されていないHARファイルをmmapして機密情報をマスクし、`output_file`に書き込みます。
+
+    Args:
+        output_file: 出力先。Noneならば標準出力に出力します。拡張子が`.gz`、`.zst`、`.xz`の場合は圧縮して書き込みます。
+    """
+    profiler = get_profiler()
+    with har_file.open("rb") as input_fp, mmap.mmap(input_fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        if output_file is not None:
+            output_file.parent.mkdir(exist_ok=True, parents=True)
+            with open_compressed(output_file, "wb") as output_fp, profiler.stage("sanitize_inplace"):
+                entry_count = sanitize_har_buffer(buffer, output_fp)
+        else:
+            sys.stdout.flush()
+            with profiler.stage("sanitize_inplace"):
+                entry_count = sanitize_har_buffer(buffer, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+    profiler.add_entries(entry_count)
@@ -0,0 +1,333 @@
+"""
+`sanitize`コマンドでマスクする対象（ポリシー）を定義します。
+
+ポリシーは、以下の種類のルールのリストです。
+
+* `request_header` : 名前がマッチするリクエストヘッダの値をマスクします。大文字小文字は区別しません。
+* `response_header` : 名前がマッチするレスポンスヘッダの値をマスクします。大文字小文字は区別しません。
+* `query` : 名前がマッチするクエリパラメータの値を、`request.url`、`request.queryString`、`_initiator`のURLでマスクします。
+* `cookie` : 名前がマッチするCookieの値を、`cookies`と`Cookie`/`Set-Cookie`ヘッダでマスクします。
+* `json_path` : entryからのパス（`request.postData.text`のような`.`区切りのキー）の値を置き換えます。親のオブジェクトが存在しない場合は何もしません。
+
+名前のルールは、同じ種類のルールをまとめて1個のマッチャーにコンパイルします。
+名前の完全一致はdictで、正規表現は1個の正規表現（各ルールを名前付きグループにした選択）で判定するので、ルールを増やしてもentryの走査は1回です。
+"""
+
+import copy
+import json
+import re
+from collections import Counter
+from collections.abc import Callable, Collection, Mapping, Sequence
+from pathlib import Path
+from typing import Any, NamedTuple
+from urllib.parse import unquote_plus
+
+STR_REDACTED = "REDACTED"
+"""編集済を表す文字列"""
+
+SENSITIVE_QUERY_STRING_KEYS = {"X-Amz-Credential", "X-Amz-Signature", "X-Amz-Security-Token"}
+
+SENSITIVE_REQUEST_HEADER_KEYS = {"authorization", "cookie"}
+"""
+マスク対象のリクエストヘッダのキー
+
+Notes:
+    小文字で比較するため、小文字で定義すること。
+"""
+
+
+SENSITIVE_RESPONSE_HEADER_KEYS = {"set-cookie"}
+"""
+マスク対象のリクエストヘッダのキー
+
+Notes:
+    小文字で比較するため、小文字で定義すること。
+"""
+
+NAME_RULE_TYPES = ["request_header", "response_header", "query", "cookie"]
+"""名前でマッチするルールの種類"""
+
+RULE_TYPES = [*NAME_RULE_TYPES, "json_path"]
+
+
+class SanitizeRule(NamedTuple):
+    """
+    マスクするルールです。名前のルールは`names`または`pattern`、`json_path`のルールは`path`を指定します。
+    """
+
+    name: str
+    """ルールの名前。`--report`でマッチした件数を出力するときに利用します。"""
+    type: str
+    """ルールの種類。`RULE_TYPES`のいずれか"""
+    names: tuple[str, ...] = ()
+    """完全一致する名前"""
+    pattern: str | None = None
+    """名前全体にマッチする正規表現"""
+    path: tuple[str, ...] = ()
+    """`json_path`のルールで置き換える値の、entryからのパス"""
+    replacement: Any = STR_REDACTED
+    """`json_path`のルールで置き換える値"""
+
+
+def _create_default_rules() -> list[SanitizeRule]:
+    rules = [SanitizeRule(f"request_header:{e}", "request_header", names=(e,)) for e in sorted(SENSITIVE_REQUEST_HEADER_KEYS)]
+    rules.extend(SanitizeRule(f"response_header:{e}", "response_header", names=(e,)) for e in sorted(SENSITIVE_RESPONSE_HEADER_KEYS))
+    rules.extend(SanitizeRule(f"query:{e}", "query", names=(e,)) for e in sorted(SENSITIVE_QUERY_STRING_KEYS))
+    for path, replacement in [
+        ("request.postData.text", STR_REDACTED),
+        ("request.cookies", []),
+        ("response.content.text", STR_REDACTED),
+        ("response.cookies", []),
+    ]:
+        rules.append(SanitizeRule(f"json_path:{path}", "json_path", path=tuple(path.split(".")), replacement=replacement))
+    return rules
+
+
+DEFAULT_SANITIZE_RULES = _create_default_rules()
+"""デフォルトのルール。ポリシーファイルを指定しない場合のマスク対象と同じです。"""
+
+
+class NameMatcher:
+    """
+    複数のルールの名前をまとめて判定します。
+    完全一致の名前はdictで判定し、正規表現は1個の正規表現にまとめて判定します。
+
+    Args:
+        ignore_case: Trueならば、大文字小文字を区別しません。
+    """
+
+    def __init__(self, rules: Sequence[SanitizeRule], *, ignore_case: bool = False) -> None:
+        self.ignore_case = ignore_case
+        self.rule_by_name: dict[str, str] = {}
+        """
+        完全一致する名前から、ルールの名前へのdict。先に定義したルールを優先します。
+        `ignore_case`がTrueならば、キーは小文字です。
+        """
+        patterns = []
+        self._rule_by_group: dict[str, str] = {}
+        for index, rule in enumerate(rules):
+            for name in rule.names:
+                self.rule_by_name.setdefault(name.lower() if ignore_case else name, rule.name)
+            if rule.pattern is not None:
+                group_name = f"_rule{index}"
+                patterns.append(f"(?P<{group_name}>{rule.pattern})")
+                self._rule_by_group[group_name] = rule.name
+
+        flags = re.IGNORECASE if ignore_case else 0
+        self._pattern = re.compile("|".join(patterns), flags) if len(patterns) > 0 else None
+        # 名前を含むかどうかを、文字列全体を1回走査して判定するための正規表現
+        keywords = [re.escape(e) for e in self.rule_by_name] + [f"(?:{e})" for e in patterns]
+        self._search_pattern = re.compile("|".join(keywords), flags) if len(keywords) > 0 else None
+
+    def __bool__(self) -> bool:
+        return self._search_pattern is not None
+
+    @property
+    def has_pattern(self) -> bool:
+        return self._pattern is not None
+
+    def match(self, name: str) -> str | None:
+        """
+        名前にマッチするルールの名前を返します。マッチしなければNoneを返します。
+        """
+        rule_name = self.rule_by_name.get(name.lower() if self.ignore_case else name)
+        if rule_name is not None or self._pattern is None:
+            return rule_name
+        return self.match_pattern(name)
+
+    def match_pattern(self, name: str) -> str | None:
+        """
+        名前全体にマッチする正規表現のルールの名前を返します。
+        呼び出し側で`rule_by_name`を直接引いて、見つからなかった場合だけ呼び出すことを想定しています。
+        """
+        if self._pattern is None:
+            return None
+        match = self._pattern.fullmatch(name)
+        if match is None:
+            return None
+        # 選択の中でマッチしたルールのグループは、最後に閉じたグループになる
+        return self._rule_by_group[match.lastgroup] if match.lastgroup is not None else None
+
+    def search(self, text: str) -> bool:
+        """
+        `text`が、いずれかのルールにマッチする名前を含む可能性があるかどうかを返します。
+        """
+        return self._search_pattern is not None and self._search_pattern.search(text) is not None
+
+
+def mask_query_string(url: str, rule_by_name: Mapping[str, str], match_pattern: Callable[[str], str | None] | None = None) -> tuple[str, list[str]]:
+    """
+    URLのQuery Stringのうち、ルールにマッチするクエリパラメータの値をマスクします。
+    マスク対象のクエリパラメータの値だけを置き換えて、それ以外の部分は元の文字列のまま残します。
+
+    Args:
+        rule_by_name: 完全一致するクエリパラメータの名前から、ルールの名前へのdict
+        match_pattern: `rule_by_name`に含まれない名前について、マッチするルールの名前を返す関数
+
+    Returns:
+        マスクしたURLと、マッチしたルールの名前のリスト
+    """
+    fragment_start = url.find("#")
+    query_end = len(url) if fragment_start == -1 else fragment_start
+    query_start = url.find("?", 0, query_end)
+    if query_start == -1:
+        return url, []
+
+    params = url[query_start + 1 : query_end].split("&")
+    matched_rules = []
+    for index, param in enumerate(params):
+        raw_name, _, value = param.partition("=")
+        # `urllib.parse.parse_qs`と同様に、値が空のパラメータは対象外にする
+        if value == "":
+            continue
+        name = unquote_plus(raw_name) if "%" in raw_name or "+" in raw_name else raw_name
+        if name in rule_by_name:
+            rule_name: str | None = rule_by_name[name]
+        elif match_pattern is not None:
+            rule_name = match_pattern(name)
+        else:
+            continue
+        if rule_name is not None:
+            params[index] = f"{raw_name}={STR_REDACTED}"
+            matched_rules.append(rule_name)
+
+    if len(matched_rules) == 0:
+        return url, []
+    return f"{url[: query_start + 1]}{'&'.join(params)}{url[query_end:]}", matched_rules
+
+
+def mask_query_string_in_url(url: str, masked_keys: Collection[str]) -> str:
+    """
+    URLのQuery Stringに含まれるセンシティブな値をマスクする
+
+    マスク対象のクエリパラメータの値だけを置き換えて、それ以外の部分は元の文字列のまま残します。
+    マスク対象のキーを含まないURLは、パースせずにそのまま返します。
+    """
+    # ほとんどのURLはQuery Stringを含まないので、先に`?`の有無を判定する
+    if "?" not in url or not any(key in url for key in masked_keys):
+        return url
+    masked_url, _ = mask_query_string(url, {key: key for key in masked_keys})
+    return masked_url
+
+
+class _JsonPathRule(NamedTuple):
+    name: str
+    parent_keys: tuple[str, ...]
+    key: str
+    replacement: Any
+    is_mutable: bool
+
+
+class SanitizePolicy:
+    """
+    コンパイル済みのポリシーです。プロセスプールのワーカーに渡せるよう、pickleできます。
+    """
+
+    def __init__(self, rules: Sequence[SanitizeRule]) -> None:
+        self.rules = list(rules)
+        self.rule_names = [e.name for e in self.rules]
+
+        def filter_rules(rule_type: str) -> list[SanitizeRule]:
+            return [e for e in self.rules if e.type == rule_type]
+
+        self.request_header_matcher = NameMatcher(filter_rules("request_header"), ignore_case=True)
+        self.response_header_matcher = NameMatcher(filter_rules("response_header"), ignore_case=True)
+        self.query_matcher = NameMatcher(filter_rules("query"))
+        self.cookie_matcher = NameMatcher(filter_rules("cookie"))
+        self.has_cookie_rules = bool(self.cookie_matcher)
+
+        self.json_path_rules: dict[str, list[_JsonPathRule]] = {"request": [], "response": [], "": []}
+        """`request`、`response`、それ以外（キーは空文字列）ごとのルール。`request`と`response`のルールのパスは、それぞれからの相対パスです。"""
+        for rule in filter_rules("json_path"):
+            path = rule.path
+            group = path[0] if len(path) > 1 and path[0] in {"request", "response"} else ""
+            relative_path = path[1:] if group != "" else path
+            is_mutable = isinstance(rule.replacement, (list, dict))
+            self.json_path_rules[group].append(_JsonPathRule(rule.name, relative_path[:-1], relative_path[-1], rule.replacement, is_mutable))
+
+    def mask_url(self, url: str) -> tuple[str, list[str]]:
+        """
+        URLのQuery Stringのうち、`query`のルールにマッチするクエリパラメータの値をマスクします。
+
+        Returns:
+            マスクしたURLと、マッチしたルールの名前のリスト
+        """
+        matcher = self.query_matcher
+        # ほとんどのURLはQuery Stringを含まないので、正規表現で探す前に`?`の有無を判定する
+        if "?" not in url or not matcher.search(url):
+            return url, []
+        return mask_query_string(url, matcher.rule_by_name, matcher.match_pattern if matcher.has_pattern else None)
+
+
+def apply_json_path_rules(data: dict[str, Any], rules: Sequence[_JsonPathRule], match_counts: Counter[str]) -> None:
+    """
+    `json_path`のルールで、値を置き換えます。親のオブジェクトが存在しない場合は何もしません。
+    置き換えたルールの件数を、`match_counts`に加算します。
+    """
+    # entryごとに呼び出すので、NamedTupleの属性を参照せずにアンパックする
+    for name, parent_keys, key, replacement, is_mutable in rules:
+        parent: Any = data
+        for parent_key in parent_keys:
+            if type(parent) is not dict:
+                break
+            parent = parent.get(parent_key)
+        if type(parent) is not dict:
+            continue
+        if is_mutable:
+            # 複数のentryで同じlistやdictを共有しないよう、コピーする。空のlistやdictは`deepcopy`より生成する方が速い
+            parent[key] = copy.deepcopy(replacement) if len(replacement) > 0 else type(replacement)()
+        else:
+            parent[key] = replacement
+        match_counts[name] += 1
+
+
+def _parse_rule(index: int, config: dict[str, Any]) -> SanitizeRule:
+    rule_type = config.get("type")
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"ポリシーファイルの{index}番目のルールの`type`が不正です。 :: type={rule_type!r}, choices={RULE_TYPES}")
+
+    if rule_type == "json_path":
+        path = config.get("path")
+        if not isinstance(path, str) or path == "":
+            raise ValueError(f"ポリシーファイルの{index}番目のルールに`path`が指定されていません。")
+        name = config.get("name", f"json_path:{path}")
+        return SanitizeRule(name, rule_type, path=tuple(path.split(".")), replacement=config.get("replacement", STR_REDACTED))
+
+    names = config.get("names", [])
+    pattern = config.get("pattern")
+    if len(names) == 0 and pattern is None:
+        raise ValueError(f"ポリシーファイルの{index}番目のルールに`names`または`pattern`が指定されていません。")
+    if pattern is not None:
+        try:
+            compiled_pattern = re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"ポリシーファイルの{index}番目のルールの`pattern`が不正な正規表現です。 :: pattern={pattern!r}, {e}") from e
+        if compiled_pattern.groupindex:
+            raise ValueError(f"ポリシーファイルの{index}番目のルールの`pattern`には、名前付きグループを指定できません。 :: pattern={pattern!r}")
+    name = config.get("name", f"{rule_type}:{pattern if pattern is not None else ','.join(names)}")
+    return SanitizeRule(name, rule_type, names=tuple(names), pattern=pattern)
+
+
+def load_sanitize_policy(policy_file: Path) -> SanitizePolicy:
+    """
+    ポリシーファイル（JSON）を読み込んで、コンパイルします。
+
+    ポリシーファイルの形式は`{"include_default_rules": true, "rules": [{"name": "...", "type": "...", ...}]}`です。
+    `include_default_rules`がtrue（デフォルト）ならば、`DEFAULT_SANITIZE_RULES`の後ろに`rules`を追加します。
+    """
+    config = json.loads(policy_file.read_text(encoding="utf-8"))
+    rules = list(DEFAULT_SANITIZE_RULES) if config.get("include_default_rules", True) else []
+    rules.extend(_parse_rule(index, e) for index, e in enumerate(config.get("rules", [])))
+    rule_names = [e.name for e in rules]
+    duplicated_names = sorted({e for e in rule_names if rule_names.count(e) > 1})
+    if len(duplicated_names) > 0:
+        raise ValueError(f"ポリシーファイルのルールの名前が重複しています。 :: {duplicated_names}")
+    try:
+        return SanitizePolicy(rules)
+    except re.error as e:
+        # インラインフラグ（`(?i)`など）は、1個の正規表現にまとめると先頭以外に現れるのでエラーになる
+        raise ValueError(f"ポリシーファイルの`pattern`を1個の正規表現にまとめられません。 :: {e}") from e
+
+
+DEFAULT_SANITIZE_POLICY = SanitizePolicy(DEFAULT_SANITIZE_RULES)
+"""ポリシーファイルを指定しない場合のポリシー"""
@@ -0,0 +1,250 @@
+"""
+HARファイルを格納したストレージ（ローカルのディレクトリ、S3互換のオブジェクトストレージ）から、複数のオブジェクトを並行して読み書きします。
+
+ストレージはURIで指定します。
+
+    * `s3://bucket/prefix/` : S3互換のオブジェクトストレージ。利用するには`boto3`をインストールしてください。
+      MinIOなどを利用する場合は、エンドポイントURLを指定してください。
+    * `file:///path/to/dir` またはディレクトリのパス : ローカルのディレクトリ
+
+オブジェクトのダウンロードはスレッドプールで並行して行い、呼び出し元がダウンロード済みのオブジェクトを処理している間も、次のオブジェクトのダウンロードを続けます。
+`.har.gz`などの圧縮されたオブジェクトは、ダウンロードしたスレッドで展開します。
+"""
+
+import abc
+import argparse
+import collections
+import threading
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from ahs.compression import compress_bytes, decompress_bytes, get_compression
+from ahs.har_files import HAR_FILE_SUFFIXES
+
+DEFAULT_MAX_CONCURRENCY = 8
+"""並行して読み書きするオブジェクトの最大数"""
+
+
+def is_har_key(key: str) -> bool:
+    return key.endswith(HAR_FILE_SUFFIXES)
+
+
+class Storage(abc.ABC):
+    """
+    オブジェクトを読み書きするストレージです。キーは`/`区切りの文字列です。
+    スレッドセーフに実装してください。
+    """
+
+    @abc.abstractmethod
+    def list_keys(self, prefix: str = "") -> list[str]:
+        """
+        `prefix`で始まるキーを、昇順に返します。
+        """
+
+    @abc.abstractmethod
+    def read_bytes(self, key: str) -> bytes:
+        pass
+
+    @abc.abstractmethod
+    def write_bytes(self, key: str, data: bytes) -> None:
+        pass
+
+    @abc.abstractmethod
+    def get_uri(self, key: str) -> str:
+        """
+        オブジェクトのURIを返します。ログやCSVの`har_file`列に出力するときに利用します。
+        """
+
+
+class LocalStorage(Storage):
+    """
+    ローカルのディレクトリをストレージとして扱います。テストやオブジェクトストレージの代わりに利用できます。
+    """
+
+    def __init__(self, root_dir: Path) -> None:
+        self.root_dir = root_dir
+
+    def list_keys(self, prefix: str = "") -> list[str]:
+        if not self.root_dir.is_dir():
+            return []
+        keys = (e.relative_to(self.root_dir).as_posix() for e in self.root_dir.rglob("*") if e.is_file())
+        return sorted(e for e in keys if e.startswith(prefix))
+
+    def read_bytes(self, key: str) -> bytes:
+        return (self.root_dir / key).read_bytes()
+
+    def write_bytes(self, key: str, data: bytes) -> None:
+        path = self.root_dir / key
+        path.parent.mkdir(exist_ok=True, parents=True)
+        path.write_bytes(data)
+
+    def get_uri(self, key: str) -> str:
+        return str(self.root_dir / key)
+
+
+class S3Storage(Storage):
+    """
+    S3互換のオブジェクトストレージのバケットを扱います。`boto3`が必要です。
+
+    Args:
+        bucket: バケット名
+        endpoint_url: エンドポイントURL。MinIOなどを利用する場合に指定します。
+        max_pool_connections: コネクションプールの最大接続数。並行して読み書きするオブジェクトの最大数以上にしてください。
+    """
+
+    def __init__(self, bucket: str, *, endpoint_url: str | None = None, max_pool_connections: int = DEFAULT_MAX_CONCURRENCY) -> None:
+        try:
+            import boto3
+            import botocore.config
+        except ImportError as e:
+            raise ImportError("S3互換のオブジェクトストレージを利用するには、`boto3`をインストールしてください。 :: `pip install boto3`") from e
+
+        self.bucket = bucket
+        # boto3のクライアントはスレッドセーフなので、1個のクライアントのコネクションプールを全スレッドで共有する
+        self._client: Any = boto3.client("s3", endpoint_url=endpoint_url, config=botocore.config.Config(max_pool_connections=max_pool_connections))
+
+    def list_keys(self, prefix: str = "") -> list[str]:
+        keys: list[str] = []
+        paginator = self._client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(e["Key"] for e in page.get("Contents", []))
+        return sorted(keys)
+
+    def read_bytes(self, key: str) -> bytes:
+        return self._client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def write_bytes(self, key: str, data: bytes) -> None:
+        self._client.put_object(Bucket=self.bucket, Key=key, Body=data)
+
+    def get_uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+
+class StorageLocation(NamedTuple):
+    storage: Storage
+    prefix: str
+    """キーのプレフィックス。ディレクトリとして扱うので、空文字列でなければ`/`で終わります。"""
+
+
+def open_storage(uri: str, *, endpoint_url: str | None = None, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> StorageLocation:
+    """
+    URIから、ストレージとキーのプレフィックスを返します。
+
+    Args:
+        uri: `s3://bucket/prefix/`、`file:///path/to/dir`、またはディレクトリのパス
+        endpoint_url: S3互換のオブジェクトストレージのエンドポイントURL
+        max_concurrency: 並行して読み書きするオブジェクトの最大数
+    """
+    if uri.startswith("s3://"):
+        bucket, _, prefix = uri.removeprefix("s3://").partition("/")
+        if bucket == "":
+            raise ValueError(f"'{uri}'にバケット名が含まれていません。")
+        if prefix != "" and not prefix.endswith("/"):
+            prefix += "/"
+        return StorageLocation(S3Storage(bucket, endpoint_url=endpoint_url, max_pool_connections=max_concurrency), prefix)
+
+    return StorageLocation(LocalStorage(Path(uri.removeprefix("file://"))), "")
+
+
+def list_har_keys(location: StorageLocation) -> list[str]:
+    """
+    ストレージのプレフィックス配下にある、HARファイルのオブジェクトのキーを返します。
+    """
+    return [e for e in location.storage.list_keys(location.prefix) if is_har_key(e)]
+
+
+class HarObject(NamedTuple):
+    key: str
+    relative_key: str
+    """プレフィックスからの相対的なキー"""
+    data: bytes
+    """展開済みのHARファイルの内容"""
+    size: int
+    """ダウンロードしたオブジェクトのサイズ[byte]"""
+
+
+def _download_har_object(location: StorageLocation, key: str) -> HarObject:
+    data = location.storage.read_bytes(key)
+    return HarObject(key, key.removeprefix(location.prefix), decompress_bytes(data, get_compression(key)), len(data))
+
+
+def iter_har_objects(
+    location: StorageLocation, keys: Iterable[str], *, max_concurrency: int = DEFAULT_MAX_CONCURRENCY
+) -> Iterator[HarObject | BaseException]:
+    """
+    オブジェクトを並行してダウンロード・展開して、`keys`の順番に返します。
+    ダウンロード中または処理待ちのオブジェクトは最大`max_concurrency`個なので、メモリ使用量には上限があります。
+
+    ダウンロードに失敗したオブジェクトは、送出された例外を返します。
+    """
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        key_iterator = iter(keys)
+        pending: collections.deque[Future[HarObject]] = collections.deque()
+
+        def submit_next() -> None:
+            key = next(key_iterator, None)
+            if key is not None:
+                pending.append(executor.submit(_download_har_object, location, key))
+
+        for _ in range(max_concurrency):
+            submit_next()
+
+        while len(pending) > 0:
+            future = pending.popleft()
+            exception = future.exception()
+            # 呼び出し元が処理している間も次のダウンロードを進めるため、返す前に次のオブジェクトのダウンロードを開始する
+            submit_next()
+            yield exception if exception is not None else future.result()
+
+
+class ConcurrentWriter:
+    """
+    スレッドプールで並行してオブジェクトを書き込みます。
+    書き込み中のオブジェクトが`max_concurrency`個に達すると、`write`はいずれかの書き込みが終わるまで待ちます。
+
+    `with`文で利用してください。終了時にすべての書き込みが終わるまで待ちます。
+    """
+
+    def __init__(self, location: StorageLocation, *, max_concurrency: int = DEFAULT_MAX_CONCURRENCY) -> None:
+        self.location = location
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+
+    def _write(self, key: str, data: bytes) -> None:
+        try:
+            self.location.storage.write_bytes(key, compress_bytes(data, get_compression(key)))
+        finally:
+            self._semaphore.release()
+
+    def write(self, relative_key: str, data: bytes) -> "Future[None]":
+        """
+        プレフィックスからの相対的なキーに書き込みます。キーの拡張子が`.gz`などの場合は、圧縮して書き込みます。
+        """
+        self._semaphore.acquire()
+        return self._executor.submit(self._write, self.location.prefix + relative_key, data)
+
+    def __enter__(self) -> "ConcurrentWriter":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self._executor.shutdown(wait=True)
+
+
+def add_storage_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    ストレージからHARファイルを読み込むためのコマンドライン引数を追加します。
+    """
+    parser.add_argument(
+        "--input_uri",
+        help="HARファイルを格納したストレージのURI。`s3://bucket/prefix/`またはディレクトリを指定します。"
+        "配下の`*.har`、`*.har.gz`、`*.har.zst`、`*.har.xz`を並行してダウンロードしながら処理します。`s3://`を利用するには`boto3`が必要です。",
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help="`--input_uri`を指定したときに、並行してダウンロード/アップロードするオブジェクトの最大数",
+    )
+    parser.add_argument("--endpoint_url", help="S3互換のオブジェクトストレージ（MinIOなど）のエンドポイントURL")
@@ -0,0 +1,177 @@
+"""
+HARファイルから抽出したtimingの列を、ディスクにキャッシュします。
+
+キャッシュのキーは、HARファイルのパス、サイズ、更新日時（オプションでファイル内容のハッシュ値）です。
+HARファイルが変更されていなければ、`json.loads`せずにキャッシュから列を取得できます。
+
+キャッシュファイルは、1行目がJSONのヘッダ（文字列の列などの`list`の列を含む）、2行目以降が`array.array`の列のバイト列です。
+読み込むときに任意のコードを実行しないよう、pickleは利用しません。
+"""
+
+import array
+import hashlib
+import json
+import sys
+import tempfile
+from pathlib import Path
+from typing import IO
+
+from ahs.timing_columns import TimingColumns, get_row_count
+from ahs.utils import get_cache_base_dir
+
+CACHE_FORMAT_VERSION = 2
+"""キャッシュファイルの形式のバージョン。`TimingColumns`の構造を変更したら、インクリメントしてください。"""
+
+CACHE_FILE_SUFFIX = ".columns"
+
+DEFAULT_CACHE_MAX_SIZE = 1024**3
+"""キャッシュディレクトリの最大サイズ[byte]のデフォルト値"""
+
+
+def get_default_cache_dir() -> Path:
+    """
+    デフォルトのキャッシュディレクトリを返します。
+    環境変数`XDG_CACHE_HOME`が設定されていればその配下、そうでなければ`~/.cache`配下です。
+    """
+    return get_cache_base_dir() / "timing_columns"
+
+
+def _calculate_file_hash(file: Path) -> str:
+    hash_object = hashlib.sha256()
+    with file.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_object.update(chunk)
+    return hash_object.hexdigest()
+
+
+def write_timing_columns(columns: TimingColumns, fp: IO[bytes]) -> None:
+    """
+    列をキャッシュファイルの形式で書き込みます。
+    """
+    array_columns = {name: values.typecode for name, values in columns.items() if isinstance(values, array.array)}
+    header = {
+        "version": CACHE_FORMAT_VERSION,
+        "byteorder": sys.byteorder,
+        "row_count": get_row_count(columns),
+        "array_columns": array_columns,
+        "list_columns": {name: values for name, values in columns.items() if name not in array_columns},
+        "column_names": list(columns),
+    }
+    fp.write(json.dumps(header).encode("utf-8") + b"\n")
+    for name in array_columns:
+        columns[name].tofile(fp)
+
+
+def read_timing_columns(fp: IO[bytes]) -> TimingColumns:
+    """
+    キャッシュファイルから列を読み込みます。
+
+    Raises:
+        ValueError: キャッシュファイルの形式が不正な場合
+    """
+    try:
+        header = json.loads(fp.readline())
+        if header["version"] != CACHE_FORMAT_VERSION:
+            raise ValueError(f"キャッシュファイルの形式のバージョンが異なります。 :: {header['version']}")
+        row_count = header["row_count"]
+        list_columns = header["list_columns"]
+        array_columns = {}
+        for name, typecode in header["array_columns"].items():
+            values = array.array(typecode)
+            values.fromfile(fp, row_count)
+            if header["byteorder"] != sys.byteorder:
+                values.byteswap()
+            array_columns[name] = values
+        return {name: array_columns[name] if name in array_columns else list_columns[name] for name in header["column_names"]}
+    except (EOFError, KeyError, TypeError) as e:
+        raise ValueError(f"キャッシュファイルの形式が不正です。 :: {type(e).__name__}: {e}") from e
+
+
+class TimingColumnsCache:
+    """
+    HARファイルごとに`TimingColumns`をキャッシュします。
+    キャッシュディレクトリの合計サイズが`max_size`を超えたら、最後に使われた日時が古いものから削除します（LRU）。
+
+    Args:
+        cache_dir: キャッシュディレクトリ
+        max_size: キャッシュディレクトリの最大サイズ[byte]
+        use_content_hash: Trueならば、ファイル内容のハッシュ値もキャッシュのキーに含めます。
+            更新日時が変わらないままファイルが書き換えられる場合に指定します。ファイル全体を読み込むので、少し遅くなります。
+    """
+
+    def __init__(self, cache_dir: Path, *, max_size: int = DEFAULT_CACHE_MAX_SIZE, use_content_hash: bool = False) -> None:
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.use_content_hash = use_content_hash
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def get_cache_file(self, har_file: Path) -> Path:
+        """
+        HARファイルに対応するキャッシュファイルのパスを返します。
+        `use_content_hash`がTrueならばファイル全体を読み込むので、`load`と`save`には同じ戻り値を渡してください。
+        """
+        stat = har_file.stat()
+        key_items = [str(CACHE_FORMAT_VERSION), str(har_file.resolve()), str(stat.st_size), str(stat.st_mtime_ns)]
+        if self.use_content_hash:
+            key_items.append(_calculate_file_hash(har_file))
+        key = hashlib.sha256("\0".join(key_items).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{key}{CACHE_FILE_SUFFIX}"
+
+    def get(self, har_file: Path) -> TimingColumns | None:
+        """
+        キャッシュから列を取得します。キャッシュが存在しない場合はNoneを返します。
+        """
+        return self.load(self.get_cache_file(har_file))
+
+    def put(self, har_file: Path, columns: TimingColumns) -> None:
+        """
+        列をキャッシュに書き込みます。
+        """
+        self.save(self.get_cache_file(har_file), columns)
+
+    def load(self, cache_file: Path) -> TimingColumns | None:
+        """
+        キャッシュファイルから列を取得します。キャッシュファイルが存在しないか、形式が不正な場合はNoneを返します。
+        """
+        try:
+            with cache_file.open("rb") as f:
+                columns = read_timing_columns(f)
+        except (OSError, ValueError):
+            self.miss_count += 1
+            return None
+
+        # LRUで削除するために、最後に使われた日時として更新日時を更新する
+        cache_file.touch()
+        self.hit_count += 1
+        return columns
+
+    def save(self, cache_file: Path, columns: TimingColumns) -> None:
+        """
+        列をキャッシュファイルに書き込んで、キャッシュディレクトリが最大サイズを超えていれば古いものを削除します。
+        """
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        # 書き込み途中のファイルを読み込まないよう、一時ファイルに書き込んでからリネームする
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as f:
+            write_timing_columns(columns, f)
+        Path(f.name).replace(cache_file)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        キャッシュディレクトリの合計サイズが最大サイズ以下になるまで、最後に使われた日時が古いキャッシュから削除します。
+        """
+        cache_files = []
+        for cache_file in self.cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"):
+            try:
+                stat = cache_file.stat()
+            except FileNotFoundError:
+                continue
+            cache_files.append((stat.st_mtime_ns, stat.st_size, cache_file))
+
+        total_size = sum(size for _, size, _ in cache_files)
+        for _, size, cache_file in sorted(cache_files):
+            if total_size <= self.max_size:
+                break
+            cache_file.unlink(missing_ok=True)
+            total_size -= size
@@ -0,0 +1,168 @@
+"""
+HARファイルの`log.entries`から、timingに関する情報を列ごとに抽出します。
+
+pandasに依存しないので、DataFrameを必要としないツールからも利用できます。
+"""
+
+import array
+import math
+import operator
+import re
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from ahs.entry_filter import EntryFilter
+
+TIMING_KEYS = ["blocked", "dns", "connect", "send", "wait", "receive", "ssl"]
+"""`timings`から抽出するキー"""
+
+TIMING_COLUMNS = [
+    "startedDateTime",
+    "request.method",
+    "request.url",
+    "response.status",
+    "response.content.size",
+    "response.content.mimeType",
+    "response.headers.contentLength",
+    "time",
+    *[f"timings.{key}" for key in TIMING_KEYS],
+]
+"""抽出する列の名前。`to_timing_csv`コマンドが出力するCSVの列と同じ順番です。"""
+
+STRING_COLUMNS = ["startedDateTime", "request.method", "request.url", "response.content.mimeType"]
+"""文字列の列。値は`list[str]`です。"""
+
+INT_COLUMNS = ["response.status", "response.content.size"]
+"""整数の列。値は`array.array("q")`です。"""
+
+FLOAT_COLUMNS = ["time", *[f"timings.{key}" for key in TIMING_KEYS]]
+"""浮動小数点数の列。値は`array.array("d")`です。値が存在しない場合はNaNです。"""
+
+NULLABLE_INT_COLUMNS = ["response.headers.contentLength"]
+"""Noneを含む整数の列。値は`list[int | None]`です。"""
+
+TimingColumns = dict[str, Any]
+"""列名をキー、列の値（`list`または`array.array`）を値とするdict"""
+
+
+def get_content_length(headers: list[dict[str, Any]]) -> int | None:
+    for header in headers:
+        if header["name"].lower() == "content-length":
+            return int(header["value"])
+    return None
+
+
+S3_URL_PATTERN = re.compile("https://.*amazonaws\\.com/")
+"""AWS S3へアクセスしているURLにマッチする正規表現"""
+
+
+def is_s3_url(url: str) -> bool:
+    """
+    AWS S3へアクセスしているURLかどうかを返します。
+    """
+    return S3_URL_PATTERN.search(url) is not None
+
+
+def match_entry(entry: dict[str, Any], is_s3_path: bool) -> bool:
+    if is_s3_path:
+        return is_s3_url(entry["request"]["url"])
+    return True
+
+
+def create_empty_timing_columns() -> TimingColumns:
+    columns: TimingColumns = {}
+    for name in TIMING_COLUMNS:
+        if name in INT_COLUMNS:
+            columns[name] = array.array("q")
+        elif name in FLOAT_COLUMNS:
+            columns[name] = array.array("d")
+        else:
+            columns[name] = []
+    return columns
+
+
+class TimingColumnsBuilder:
+    """
+    entryを1件ずつ受け取って、`TIMING_COLUMNS`の列に値を追加します。
+    entryごとに中間のdictを作らず、列ごとの配列に直接値を追加します。
+
+    Args:
+        is_s3_path: Trueならば、AWS S3へアクセスしているリクエストのみを追加します。
+        entry_filter: 指定した場合は、条件を満たすentryのみを追加します。
+    """
+
+    def __init__(self, *, is_s3_path: bool = False, entry_filter: "EntryFilter | None" = None) -> None:
+        self.is_s3_path = is_s3_path
+        self.entry_filter = entry_filter
+        self.columns = create_empty_timing_columns()
+        columns = self.columns
+        self._append_started_date_time = columns["startedDateTime"].append
+        self._append_method = columns["request.method"].append
+        self._append_url = columns["request.url"].append
+        self._append_status = columns["response.status"].append
+        self._append_content_size = columns["response.content.size"].append
+        self._append_mime_type = columns["response.content.mimeType"].append
+        self._append_content_length = columns["response.headers.contentLength"].append
+        self._append_time = columns["time"].append
+        self._timing_appenders = [(key, columns[f"timings.{key}"].append) for key in TIMING_KEYS]
+
+    def add(self, entry: dict[str, Any]) -> None:
+        if not match_entry(entry, self.is_s3_path):
+            return
+        if self.entry_filter is not None and not self.entry_filter.match_entry(entry):
+            return
+
+        request = entry["request"]
+        response = entry["response"]
+        content = response["content"]
+        timings = entry["timings"]
+
+        self._append_started_date_time(entry["startedDateTime"])
+        self._append_method(request["method"])
+        self._append_url(request["url"])
+        self._append_status(response["status"])
+        self._append_content_size(content["size"])
+        self._append_mime_type(content["mimeType"])
+        self._append_content_length(get_content_length(response["headers"]))
+        self._append_time(entry["time"])
+        for key, append_timing in self._timing_appenders:
+            value = timings.get(key)
+            append_timing(math.nan if value is None else value)
+
+
+def extract_timing_columns(
+    entries: Iterable[dict[str, Any]], *, is_s3_path: bool = False, entry_filter: "EntryFilter | None" = None
+) -> TimingColumns:
+    """
+    `log.entries`から、`TIMING_COLUMNS`の列を抽出します。
+
+    Args:
+        entries: `log.entries`の要素
+        is_s3_path: Trueならば、AWS S3へアクセスしているリクエストのみを抽出します。
+        entry_filter: 指定した場合は、条件を満たすentryのみを抽出します。
+    """
+    builder = TimingColumnsBuilder(is_s3_path=is_s3_path, entry_filter=entry_filter)
+    add = builder.add
+    for entry in entries:
+        add(entry)
+    return builder.columns
+
+
+def get_row_count(columns: TimingColumns) -> int:
+    return len(columns["startedDateTime"])
+
+
+def select_timing_columns(columns: TimingColumns, indices: Iterable[int]) -> TimingColumns:
+    """
+    `indices`の位置の行だけを含む列を返します。
+    """
+    indices = list(indices)
+    result = create_empty_timing_columns()
+    if len(indices) == 0:
+        return result
+    get_items = operator.itemgetter(*indices)
+    for name, values in columns.items():
+        items = get_items(values)
+        result[name].extend(items if len(indices) > 1 else (items,))
+    return result
@@ -1,13 +1,44 @@
 import argparse
-import json
+import collections
+import hashlib
+import io
 import re
 import sys
+from collections.abc import Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import Any
-
-import pandas
+from typing import TYPE_CHECKING, Any, TextIO
 
+from ahs.compression import get_compression, open_compressed, open_text, strip_compression_suffix
+from ahs.entry_filter import FILTER_PRESETS, EntryFilter, compile_entry_filter
+from ahs.har_index import iter_indexed_entries, load_or_build_index, select_records
+from ahs.har_io import loads_json
+from ahs.har_stream import iter_har_entries, iter_har_file_entries
+from ahs.profiling import FileProfile, get_profiler, run_with_profile
 from ahs.sanitize_har import sanitize_url
+from ahs.storage import add_storage_arguments, iter_har_objects, list_har_keys, open_storage
+from ahs.timing_cache import DEFAULT_CACHE_MAX_SIZE, TimingColumnsCache, get_default_cache_dir
+from ahs.timing_columns import (
+    FLOAT_COLUMNS,
+    INT_COLUMNS,
+    NULLABLE_INT_COLUMNS,
+    TIMING_COLUMNS,
+    TimingColumns,
+    extract_timing_columns,
+    get_content_length,
+    get_row_count,
+    match_entry,  # noqa: F401 後方互換性のためにimportしている
+)
+from ahs.utils import parse_iso_datetime
+
+if TYPE_CHECKING:
+    import pandas
+    import pyarrow
+
+# pandasやnumpyのimportには時間がかかるため、`sanitize`コマンドなどの起動が遅くならないよう、`ahs`パッケージではこれらを関数内でimportしている
+
+DICTIONARY_ENCODED_COLUMNS = ["request.method", "response.content.mimeType"]
+"""Parquet/Arrow形式で出力するときに、辞書エンコーディングする列"""
 
 
 def _minimize_request(request: dict[str, Any]) -> dict[str, Any]:
@@ -17,13 +48,6 @@ def _minimize_request(request: dict[str, Any]) -> dict[str, Any]:
     return result
 
 
-def get_content_length(headers: list[dict[str, Any]]) -> int | None:
-    for header in headers:
-        if header["name"].lower() == "content-length":
-            return int(header["value"])
-    return None
-
-
 def _minimize_response(response: dict[str, Any]) -> dict[str, Any]:
     result = {}
     for key in ("status",):
@@ -51,63 +75,507 @@ def minimize_entry(entry: dict[str, Any]) -> dict[str, Any]:
     return result
 
 
-def match_entry(entry: dict[str, Any], is_s3_path: bool) -> bool:
-    if is_s3_path:
-        url = entry["request"]["url"]
-        return re.search("https://.*amazonaws\\.com/", url) is not None
-    return True
+def create_dataframe_from_timing_columns(columns: TimingColumns) -> "pandas.DataFrame":
+    """
+    `extract_timing_columns`で抽出した列から、pandas.DataFrameを生成します。
+    timingの列はfloat64、`response.status`などはint64、`response.headers.contentLength`はNoneを含むのでInt64になります。
+    """
+    import numpy
+    import pandas
 
+    data: dict[str, Any] = {}
+    for name in TIMING_COLUMNS:
+        values = columns[name]
+        if name in FLOAT_COLUMNS:
+            data[name] = numpy.asarray(values, dtype=numpy.float64)
+        elif name in INT_COLUMNS:
+            data[name] = numpy.asarray(values, dtype=numpy.int64)
+        elif name in NULLABLE_INT_COLUMNS:
+            data[name] = pandas.array(values, dtype="Int64")
+        else:
+            # entryが0件でもfloat64にならないよう、object型を指定する
+            data[name] = numpy.asarray(values, dtype=object)
+    return pandas.DataFrame(data, columns=TIMING_COLUMNS)
 
-def create_dataframe_from_har_object(data: dict[str, Any], *, is_s3_path: bool) -> pandas.DataFrame:
+
+def create_dataframe_from_har_object(data: dict[str, Any], *, is_s3_path: bool) -> "pandas.DataFrame":
     """
     harファイルの内容をpandas.DataFrameに変換します。
     """
-    tmp_list = [minimize_entry(entry) for entry in data["log"]["entries"] if match_entry(entry, is_s3_path)]
-    df_har = pandas.json_normalize(tmp_list)
-
-    columns = [
-        "startedDateTime",
-        "request.method",
-        "request.url",
-        "response.status",
-        "response.content.size",
-        "response.content.mimeType",
-        "response.headers.contentLength",
-        "time",
-        "timings.blocked",
-        "timings.dns",
-        "timings.connect",
-        "timings.send",
-        "timings.wait",
-        "timings.receive",
-        "timings.ssl",
-    ]
-    return df_har[columns]
+    columns = extract_timing_columns(data["log"]["entries"], is_s3_path=is_s3_path)
+    return create_dataframe_from_timing_columns(columns)
 
 
-def main(args: argparse.Namespace) -> None:
-    if len(args.har_file) == 1:
-        har_file: Path = args.har_file[0]
-        input_data = json.loads(har_file.read_text(encoding="utf-8"))
-        df_har = create_dataframe_from_har_object(input_data, is_s3_path=args.only_s3_path)
+def convert_dataframe_for_columnar_format(df_har: "pandas.DataFrame") -> "pandas.DataFrame":
+    """
+    Parquet/Arrow形式で出力するために、列の型を変換します。
+
+    * `startedDateTime`をdatetime型（UTC）に変換します。
+    * `request.method`と`response.content.mimeType`をcategory型にして、辞書エンコーディングで出力されるようにします。
+    """
+    import pandas
+
+    df_har = df_har.copy()
+    df_har["startedDateTime"] = pandas.to_datetime(df_har["startedDateTime"], format="ISO8601", utc=True)
+    for column in DICTIONARY_ENCODED_COLUMNS:
+        df_har[column] = df_har[column].astype("category")
+    return df_har
+
+
+def write_dataframe(df_har: "pandas.DataFrame", output_file: Path | None, output_format: str) -> None:
+    """
+    DataFrameを`output_format`の形式で出力します。
+
+    Args:
+        output_file: 出力先。Noneならば標準出力に出力します。
+        output_format: `csv`, `parquet`, `arrow`のいずれか
+    """
+    if output_format == "csv":
+        if output_file is not None:
+            output_file.parent.mkdir(exist_ok=True, parents=True)
+            df_har.to_csv(output_file, index=False, encoding="utf-8")
+        else:
+            df_har.to_csv(sys.stdout, index=False, encoding="utf-8")
+        return
+
+    if output_file is None:
+        raise ValueError(f"`--format {output_format}`を指定した場合は、`--output`も指定してください。")
+
+    df_har = convert_dataframe_for_columnar_format(df_har)
+    output_file.parent.mkdir(exist_ok=True, parents=True)
+    if output_format == "parquet":
+        df_har.to_parquet(output_file, index=False)
+    elif output_format == "arrow":
+        df_har.to_feather(output_file)
     else:
-        df_har_list = []
+        raise ValueError(f"Unexpected format: {output_format}")
+
+
+def _create_arrow_schema(schema: "pyarrow.Schema") -> "pyarrow.Schema":
+    """
+    HARファイルごとのDataFrameを1個のファイルに書き込むための、共通のスキーマを返します。
+
+    * 辞書のインデックスの型はカテゴリ数によって変わるので、int32に揃えます。
+    * entryが0件のDataFrameでは文字列の列がnull型になるので、文字列型にします。
+    """
+    import pyarrow
+
+    fields = []
+    for field in schema:
+        if pyarrow.types.is_dictionary(field.type):
+            field = field.with_type(pyarrow.dictionary(pyarrow.int32(), pyarrow.string()))  # noqa: PLW2901
+        elif pyarrow.types.is_null(field.type):
+            field = field.with_type(pyarrow.string())  # noqa: PLW2901
+        fields.append(field)
+    return pyarrow.schema(fields, metadata=schema.metadata)
+
+
+class DataFrameWriter:
+    """
+    DataFrameを少しずつ、`output_format`の形式で1個のファイルに書き込みます。
+    複数のHARファイルのDataFrameを、すべてメモリに載せずに出力するために利用します。
+
+    `with`文で利用してください。
+
+    Args:
+        output_file: 出力先。Noneならば標準出力に出力します。CSVの場合、拡張子が`.gz`などならば圧縮します。
+        output_format: `csv`, `parquet`, `arrow`のいずれか
+    """
+
+    def __init__(self, output_file: Path | None, output_format: str) -> None:
+        if output_format not in {"csv", "parquet", "arrow"}:
+            raise ValueError(f"Unexpected format: {output_format}")
+        if output_format != "csv" and output_file is None:
+            raise ValueError(f"`--format {output_format}`を指定した場合は、`--output`も指定してください。")
+        self.output_file = output_file
+        self.output_format = output_format
+        self._csv_fp: TextIO | None = None
+        self._arrow_writer: Any = None
+        self._arrow_schema: pyarrow.Schema | None = None
+
+    def _open_csv(self) -> TextIO:
+        if self.output_file is None:
+            return sys.stdout
+        self.output_file.parent.mkdir(exist_ok=True, parents=True)
+        return io.TextIOWrapper(open_compressed(self.output_file, "wb"), encoding="utf-8", newline="")
+
+    def _open_arrow_writer(self, schema: "pyarrow.Schema") -> Any:  # noqa: ANN401
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        assert self.output_file is not None
+        self.output_file.parent.mkdir(exist_ok=True, parents=True)
+        if self.output_format == "parquet":
+            return pyarrow.parquet.ParquetWriter(self.output_file, schema)
+        # `DataFrame.to_feather`と同じく、lz4が利用できれば圧縮する
+        compression = "lz4" if pyarrow.Codec.is_available("lz4_frame") else None
+        return pyarrow.ipc.new_file(self.output_file, schema, options=pyarrow.ipc.IpcWriteOptions(compression=compression))
+
+    def write(self, df_har: "pandas.DataFrame") -> None:
+        """
+        DataFrameを出力先の末尾に追加します。列は最初に書き込んだDataFrameと同じにしてください。
+        """
+        if self.output_format == "csv":
+            is_first = self._csv_fp is None
+            if self._csv_fp is None:
+                self._csv_fp = self._open_csv()
+            df_har.to_csv(self._csv_fp, header=is_first, index=False)
+            return
+
+        import pyarrow
+
+        table = pyarrow.Table.from_pandas(convert_dataframe_for_columnar_format(df_har), preserve_index=False)
+        if self._arrow_schema is None:
+            self._arrow_schema = _create_arrow_schema(table.schema)
+            self._arrow_writer = self._open_arrow_writer(self._arrow_schema)
+        self._arrow_writer.write_table(table.cast(self._arrow_schema))
+
+    def close(self) -> None:
+        if self._csv_fp is not None and self._csv_fp is not sys.stdout:
+            self._csv_fp.close()
+        if self._arrow_writer is not None:
+            self._arrow_writer.close()
+
+    def __enter__(self) -> "DataFrameWriter":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
+
+
+def get_partition_file_name(har_file: Path, output_format: str) -> str:
+    """
+    データセットディレクトリに出力するときの、HARファイルごとのファイル名を返します。
+    異なるディレクトリにある同じ名前のHARファイルが衝突しないよう、HARファイルのパスのハッシュ値を含めます。
+    """
+    path_hash = hashlib.sha1(str(har_file.resolve()).encode("utf-8")).hexdigest()[:8]
+    stem = Path(strip_compression_suffix(har_file.name)).stem
+    return f"{stem}-{path_hash}.{output_format}"
+
+
+def load_timing_columns(
+    har_file: Path, *, is_s3_path: bool = False, entry_filter: EntryFilter | None = None, cache: TimingColumnsCache | None = None
+) -> TimingColumns:
+    """
+    HARファイルからtimingの列を抽出します。
+    `cache`が指定されていれば、キャッシュに存在する場合はHARファイルを読み込まずにキャッシュから取得します。
+    キャッシュには絞り込む前の列を格納するので、`is_s3_path`や`entry_filter`が異なっていてもキャッシュを利用できます。
+    絞り込みは、抽出した列に対してまとめて行います。
+
+    Args:
+        is_s3_path: Trueならば、AWS S3へアクセスしているリクエストのみを抽出します。`entry_filter`にプリセット`s3`を指定した場合と同じです。
+        entry_filter: 指定した場合は、条件を満たすentryのみを抽出します。
+    """
+    profiler = get_profiler()
+    columns = None
+    cache_file = None
+    if cache is not None:
+        with profiler.stage("cache"):
+            # `--cache_content_hash`ではキャッシュファイルのパスの算出にファイル全体を読み込むので、1回だけ算出する
+            cache_file = cache.get_cache_file(har_file)
+            columns = cache.load(cache_file)
+    if columns is None:
+        with profiler.stage("extract"):
+            columns = extract_timing_columns(iter_har_file_entries(har_file))
+        if cache is not None and cache_file is not None:
+            with profiler.stage("cache"):
+                cache.save(cache_file, columns)
+    profiler.add_entries(get_row_count(columns))
+
+    if is_s3_path or entry_filter is not None:
+        with profiler.stage("filter"):
+            if is_s3_path:
+                columns = compile_entry_filter(presets=["s3"]).filter_columns(columns)
+            if entry_filter is not None:
+                columns = entry_filter.filter_columns(columns)
+    return columns
+
+
+def load_timing_columns_with_index(
+    har_file: Path,
+    *,
+    is_s3_path: bool = False,
+    entry_filter: EntryFilter | None = None,
+    since: float | None = None,
+    until: float | None = None,
+    url_regex: re.Pattern[str] | None = None,
+) -> TimingColumns:
+    """
+    HARファイルの索引を利用して、絞り込んだentryだけからtimingの列を抽出します。
+    索引ファイルが存在しないか古い場合は、索引を作成します。
+
+    Args:
+        entry_filter: 指定した場合は、条件を満たすentryのみを抽出します。
+            索引に含まれるフィールド（ホストやHTTPステータスなど）の条件は、entryをデコードする前に判定します。
+        since: `startedDateTime`がこのUNIX時間[秒]以降のentryを抽出します。
+        until: `startedDateTime`がこのUNIX時間[秒]より前のentryを抽出します。
+        url_regex: URLがこの正規表現にマッチするentryを抽出します。
+    """
+    profiler = get_profiler()
+    with profiler.stage("index"):
+        index = load_or_build_index(har_file)
+        records = select_records(index.records, since=since, until=until)
+        if entry_filter is not None:
+            records = [record for record in records if entry_filter.match_index_record(record)]
+    profiler.add_entries(len(index.records))
+    entries = iter_indexed_entries(har_file, records)
+    if url_regex is not None:
+        entries = (entry for entry in entries if url_regex.search(entry["request"]["url"]) is not None)
+    with profiler.stage("extract"):
+        return extract_timing_columns(entries, is_s3_path=is_s3_path, entry_filter=entry_filter)
+
+
+def _is_in_time_range(entry: dict[str, Any], since: float | None, until: float | None) -> bool:
+    try:
+        started_timestamp = parse_iso_datetime(entry["startedDateTime"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return False
+    return (since is None or started_timestamp >= since) and (until is None or started_timestamp < until)
+
+
+def load_timing_columns_from_stream(
+    har_file: Path,
+    *,
+    entry_filter: EntryFilter | None = None,
+    since: float | None = None,
+    until: float | None = None,
+    url_regex: re.Pattern[str] | None = None,
+) -> TimingColumns:
+    """
+    HARファイルを先頭から読み込みながら、絞り込んだentryからtimingの列を抽出します。
+    索引を作成できない圧縮されたHARファイルで、`load_timing_columns_with_index`の代わりに利用します。
+    引数は`load_timing_columns_with_index`と同じです。
+    """
+    with open_text(har_file) as f, get_profiler().stage("extract"):
+        entries = iter_har_entries(f)
+        if since is not None or until is not None:
+            entries = (entry for entry in entries if _is_in_time_range(entry, since, until))
+        if url_regex is not None:
+            entries = (entry for entry in entries if url_regex.search(entry["request"]["url"]) is not None)
+        return extract_timing_columns(entries, entry_filter=entry_filter)
+
+
+def create_entry_filter(args: argparse.Namespace) -> EntryFilter | None:
+    """
+    コマンドライン引数の`--filter`、`--preset`、`--only_s3_path`から、`EntryFilter`を生成します。
+    """
+    presets = list(args.preset) if args.preset is not None else []
+    if args.only_s3_path and "s3" not in presets:
+        presets.append("s3")
+    expressions = args.filter if args.filter is not None else []
+    if len(presets) == 0 and len(expressions) == 0:
+        return None
+    return compile_entry_filter(expressions, presets=presets)
+
+
+def sanitize_url_column(df_har: "pandas.DataFrame") -> None:
+    """
+    `request.url`列のURLから、センシティブな値をマスクします。DataFrameはその場で書き換えます。
+    同じURLは1回だけマスクします。
+    """
+    if len(df_har) == 0:
+        # 空のSeriesを`map`するとfloat64になってしまうので、何もしない
+        return
+    urls = df_har["request.url"]
+    masked_urls = {url: sanitize_url(url) for url in urls.unique()}
+    df_har["request.url"] = urls.map(masked_urls)
+
+
+def _create_dataframe_from_har_file(
+    har_file: Path, args: argparse.Namespace, cache: TimingColumnsCache | None, entry_filter: EntryFilter | None
+) -> "pandas.DataFrame":
+    profiler = get_profiler()
+    with profiler.file(har_file):
+        if args.since is not None or args.until is not None or args.url_regex is not None:
+            # 圧縮されたHARファイルは索引を作成できないので、先頭から読み込みながら絞り込む
+            load_func = load_timing_columns_from_stream if get_compression(har_file.name) is not None else load_timing_columns_with_index
+            columns = load_func(
+                har_file,
+                entry_filter=entry_filter,
+                since=args.since,
+                until=args.until,
+                url_regex=re.compile(args.url_regex) if args.url_regex is not None else None,
+            )
+        else:
+            columns = load_timing_columns(har_file, entry_filter=entry_filter, cache=cache)
+        with profiler.stage("dataframe"):
+            df_har = create_dataframe_from_timing_columns(columns)
+        if args.sanitize_url:
+            with profiler.stage("sanitize_url"):
+                sanitize_url_column(df_har)
+        return df_har
+
+
+_WORKER_ARGUMENT_NAMES = ["filter", "preset", "only_s3_path", "since", "until", "url_regex", "sanitize_url"]
+"""`_create_dataframe_in_worker`で利用するコマンドライン引数"""
+
+
+def _create_dataframe_in_worker(har_file: Path, args: argparse.Namespace, cache: TimingColumnsCache | None) -> tuple["pandas.DataFrame", int, int]:
+    """
+    プロセスプールのワーカーで、HARファイルのDataFrameを生成します。
+    `EntryFilter`はpickleできないので、ワーカーで`args`からコンパイルします。
+
+    Returns:
+        DataFrameと、ワーカーでのキャッシュのヒット数とミス数
+    """
+    hit_count, miss_count = (cache.hit_count, cache.miss_count) if cache is not None else (0, 0)
+    df_har = _create_dataframe_from_har_file(har_file, args, cache, create_entry_filter(args))
+    if cache is None:
+        return df_har, 0, 0
+    return df_har, cache.hit_count - hit_count, cache.miss_count - miss_count
+
+
+def iter_dataframes_from_har_files(
+    args: argparse.Namespace, cache: TimingColumnsCache | None, entry_filter: EntryFilter | None
+) -> Iterator[tuple[Path, "pandas.DataFrame"]]:
+    """
+    `args.har_file`のHARファイルごとに、timingの情報のDataFrameを`args.har_file`の順番に返します。
+
+    `args.jobs`が2以上ならば、プロセスプールで並列に処理します。
+    処理中または書き込み待ちのDataFrameは最大`args.jobs * 2`個なので、HARファイルがいくつあってもメモリ使用量には上限があります。
+    """
+    if args.jobs <= 1:
         for har_file in args.har_file:
-            input_data = json.loads(har_file.read_text(encoding="utf-8"))
-            df_sub_har = create_dataframe_from_har_object(input_data, is_s3_path=args.only_s3_path)
-            df_sub_har["har_file"] = str(har_file)
-            df_har_list.append(df_sub_har)
-        df_har = pandas.concat(df_har_list, ignore_index=True)
-
-    if args.sanitize_url:
-        df_har["request.url"] = df_har["request.url"].apply(sanitize_url)
-
-    if args.output is not None:
-        output_file: Path = args.output
-        output_file.parent.mkdir(exist_ok=True, parents=True)
-        df_har.to_csv(output_file, index=False, encoding="utf-8")
+            yield har_file, _create_dataframe_from_har_file(har_file, args, cache, entry_filter)
+        return
+
+    # `args`には`command_help`などpickleできない値が含まれるので、ワーカーで利用する引数だけを渡す
+    worker_args = argparse.Namespace(**{name: getattr(args, name) for name in _WORKER_ARGUMENT_NAMES})
+    profiler = get_profiler()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        har_file_iterator = iter(args.har_file)
+        pending: collections.deque[tuple[Path, Future[tuple[tuple[pandas.DataFrame, int, int], list[FileProfile]]]]] = collections.deque()
+
+        def submit_next() -> None:
+            har_file = next(har_file_iterator, None)
+            if har_file is not None:
+                pending.append(
+                    (har_file, executor.submit(run_with_profile, profiler.enabled, _create_dataframe_in_worker, har_file, worker_args, cache))
+                )
+
+        # 呼び出し元が書き込んでいる間もワーカーが処理を進められるよう、プロセス数の2倍まで投入しておく
+        for _ in range(args.jobs * 2):
+            submit_next()
+
+        while len(pending) > 0:
+            har_file, future = pending.popleft()
+            (df_har, hit_count, miss_count), file_profiles = future.result()
+            profiler.merge(file_profiles)
+            if cache is not None:
+                cache.hit_count += hit_count
+                cache.miss_count += miss_count
+            submit_next()
+            yield har_file, df_har
+
+
+def iter_dataframes_from_storage(args: argparse.Namespace, entry_filter: EntryFilter | None) -> Iterator["pandas.DataFrame"]:
+    """
+    `args.input_uri`のストレージにあるHARファイルを並行してダウンロードしながら、オブジェクトごとにtimingの情報のDataFrameを返します。
+    `har_file`列には、オブジェクトのURIを格納します。
+    """
+    if len(args.har_file) > 0:
+        raise ValueError("HARファイルのパスと`--input_uri`は同時に指定できません。")
+    if args.append or args.since is not None or args.until is not None or args.url_regex is not None:
+        raise ValueError("`--input_uri`と、`--append`、`--since`、`--until`、`--url_regex`は同時に指定できません。")
+    if args.jobs != 1 or args.cache:
+        raise ValueError("`--input_uri`と、`--jobs`、`--cache`は同時に指定できません。並行数は`--max_concurrency`で指定してください。")
+
+    profiler = get_profiler()
+    location = open_storage(args.input_uri, endpoint_url=args.endpoint_url, max_concurrency=args.max_concurrency)
+    keys = list_har_keys(location)
+    if len(keys) == 0:
+        raise ValueError(f"'{args.input_uri}'にHARファイルが存在しません。")
+    for key, har_object in zip(keys, iter_har_objects(location, keys, max_concurrency=args.max_concurrency), strict=True):
+        uri = location.storage.get_uri(key)
+        if isinstance(har_object, BaseException):
+            raise RuntimeError(f"'{uri}'のダウンロードに失敗しました。") from har_object
+        with profiler.file(uri, file_size=har_object.size):
+            with profiler.stage("parse"):
+                entries = loads_json(har_object.data)["log"]["entries"]
+            profiler.add_entries(len(entries))
+            with profiler.stage("extract"):
+                columns = extract_timing_columns(entries)
+            if entry_filter is not None:
+                with profiler.stage("filter"):
+                    columns = entry_filter.filter_columns(columns)
+            with profiler.stage("dataframe"):
+                df_sub_har = create_dataframe_from_timing_columns(columns)
+            if args.sanitize_url:
+                with profiler.stage("sanitize_url"):
+                    sanitize_url_column(df_sub_har)
+        df_sub_har["har_file"] = uri
+        yield df_sub_har
+
+
+def append_to_dataset(args: argparse.Namespace, cache: TimingColumnsCache | None, entry_filter: EntryFilter | None) -> None:
+    """
+    HARファイルごとに1個のファイル（パーティション）を、`args.output`のディレクトリに書き込みます。
+    既存のパーティションは書き換えないので、新しいHARファイルだけを追加できます。
+    """
+    if args.output is None:
+        raise ValueError("`--append`を指定した場合は、`--output`にデータセットのディレクトリを指定してください。")
+
+    dataset_dir: Path = args.output
+    for har_file, df_har in iter_dataframes_from_har_files(args, cache, entry_filter):
+        df_har["har_file"] = str(har_file)
+        with get_profiler().stage("write"):
+            write_dataframe(df_har, dataset_dir / get_partition_file_name(har_file, args.format), args.format)
+
+
+def create_cache(args: argparse.Namespace) -> TimingColumnsCache | None:
+    if not args.cache:
+        return None
+    cache_dir = args.cache_dir if args.cache_dir is not None else get_default_cache_dir()
+    return TimingColumnsCache(cache_dir, max_size=args.cache_max_size * 1024**2, use_content_hash=args.cache_content_hash)
+
+
+def write_dataframes(df_har_iterator: Iterator["pandas.DataFrame"], output_file: Path | None, output_format: str) -> None:
+    """
+    DataFrameを順番に1個のファイルに書き込みます。書き込んだDataFrameはすぐに解放されます。
+    """
+    profiler = get_profiler()
+    with DataFrameWriter(output_file, output_format) as writer:
+        for df_har in df_har_iterator:
+            with profiler.stage("write"):
+                writer.write(df_har)
+
+
+def main(args: argparse.Namespace) -> None:
+    entry_filter = create_entry_filter(args)
+    if args.input_uri is not None:
+        write_dataframes(iter_dataframes_from_storage(args, entry_filter), args.output, args.format)
+        return
+    if len(args.har_file) == 0:
+        raise ValueError("HARファイルのパスか`--input_uri`を指定してください。")
+
+    cache = create_cache(args)
+    if args.append:
+        append_to_dataset(args, cache, entry_filter)
     else:
-        df_har.to_csv(sys.stdout, index=False, encoding="utf-8")
+        # HARファイルが1個の場合は、`har_file`列を出力しない
+        has_har_file_column = len(args.har_file) > 1
+
+        def iter_dataframes() -> Iterator["pandas.DataFrame"]:
+            for har_file, df_har in iter_dataframes_from_har_files(args, cache, entry_filter):
+                if has_har_file_column:
+                    df_har["har_file"] = str(har_file)
+                yield df_har
+
+        write_dataframes(iter_dataframes(), args.output, args.format)
+
+    if cache is not None:
+        print(f"キャッシュ :: hit={cache.hit_count}, miss={cache.miss_count}", file=sys.stderr)  # noqa: T201
+
+
+def parse_datetime_argument(value: str) -> float:
+    """
+    コマンドライン引数で指定された日時を、UNIX時間[秒]に変換します。
+    """
+    dt = parse_iso_datetime(value)
+    if dt.tzinfo is None:
+        dt = dt.astimezone()
+    return dt.timestamp()
 
 
 def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParser:
@@ -117,9 +585,69 @@ def add_parser(subparsers: argparse._SubParsersAction) -> argparse.ArgumentParse
     parser = subparsers.add_parser(subcommand_name, description=subcommand_help, help=subcommand_help)
     parser.set_defaults(func=main)
 
-    parser.add_argument("har_file", type=Path, nargs="+", help="HARファイルのパス。")
+    parser.add_argument("har_file", type=Path, nargs="*", help="HARファイルのパス。`*.har.gz`、`*.har.zst`、`*.har.xz`は展開しながら読み込みます。")
     parser.add_argument("-o", "--output", type=Path, help="出力先。未指定ならば標準出力に出力します。")
-    parser.add_argument("--only_s3_path", action="store_true", help="AWS S3へアクセスしているリクエストのみを抽出します。")
+    parser.add_argument("--only_s3_path", action="store_true", help="AWS S3へアクセスしているリクエストのみを抽出します。`--preset s3`と同じです。")
+    parser.add_argument(
+        "--filter",
+        nargs="+",
+        help="entryを絞り込むフィルタ式。`{フィールド}{演算子}{値}`の形式で指定します。複数指定した場合は、すべてを満たすentryを抽出します。"
+        "(ex) `host=example.com` `path^=/api/` `mime^=image/` `status=200..299` `time>=1000`",
+    )
+    parser.add_argument(
+        "--preset", nargs="+", choices=list(FILTER_PRESETS), help="名前を付けたフィルタ式の組み合わせ。`s3`はAWS S3へのリクエストです。"
+    )
     parser.add_argument("--sanitize_url", action="store_true", help="URLのQuery Stringに含まれるセンシティブな値をマスクします。")
+    parser.add_argument(
+        "--format",
+        choices=["csv", "parquet", "arrow"],
+        default="csv",
+        help="出力形式。`parquet`と`arrow`を指定するにはpyarrowが必要です。"
+        "`parquet`と`arrow`では、`startedDateTime`をdatetime型に変換し、`request.method`と`response.content.mimeType`を辞書エンコーディングで出力します。",
+    )
+    parser.add_argument(
+        "--append",
+        action="store_true",
+        help="`--output`をデータセットのディレクトリとみなして、HARファイルごとに1個のファイルを書き込みます。既存のファイルは書き換えません。",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="複数のHARファイルを並列に処理するプロセス数。HARファイルごとに、処理が終わった順ではなく指定した順番で出力に追記します。",
+    )
+
+    parser.add_argument(
+        "--since",
+        type=parse_datetime_argument,
+        help="`startedDateTime`がこの日時以降のentryだけを抽出します。ISO 8601形式で指定します。タイムゾーンを省略した場合はローカル時刻です。"
+        "`--since`、`--until`、`--url_regex`のいずれかを指定すると、HARファイルの索引を利用して、絞り込んだentryだけを読み込みます。",
+    )
+    parser.add_argument("--until", type=parse_datetime_argument, help="`startedDateTime`がこの日時より前のentryだけを抽出します。")
+    parser.add_argument("--url_regex", help="URLがこの正規表現にマッチするentryだけを抽出します。")
+
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="HARファイルから抽出した情報をキャッシュディレクトリに保存して、同じHARファイルを再度処理するときに利用します。",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        type=Path,
+        help="キャッシュディレクトリ。未指定ならば`$XDG_CACHE_HOME/annofab_har/timing_columns`（`XDG_CACHE_HOME`が未設定なら`~/.cache`配下）を利用します。",
+    )
+    parser.add_argument(
+        "--cache_max_size",
+        type=int,
+        default=DEFAULT_CACHE_MAX_SIZE // 1024**2,
+        help="キャッシュディレクトリの最大サイズ[MiB]。超えた場合は、最後に使われた日時が古いキャッシュから削除します。",
+    )
+    parser.add_argument(
+        "--cache_content_hash",
+        action="store_true",
+        help="ファイル内容のハッシュ値もキャッシュのキーに含めます。指定しない場合は、ファイルのパス、サイズ、更新日時をキーにします。",
+    )
+    add_storage_arguments(parser)
 
     return parser
@@ -0,0 +1,24 @@
+import datetime
+import os
+from pathlib import Path
+
+
+def parse_iso_datetime(value: str) -> datetime.datetime:
+    """
+    HARファイルの`startedDateTime`のようなISO 8601形式の文字列を、datetimeに変換します。
+
+    Python 3.10の`datetime.datetime.fromisoformat`は末尾の`Z`に対応していないため、`+00:00`に置き換えてから変換します。
+    """
+    if value.endswith(("Z", "z")):
+        value = value[:-1] + "+00:00"
+    return datetime.datetime.fromisoformat(value)
+
+
+def get_cache_base_dir() -> Path:
+    """
+    annofab-harが利用するキャッシュディレクトリを返します。
+    環境変数`XDG_CACHE_HOME`が設定されていればその配下、そうでなければ`~/.cache`配下です。
+    """
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME")
+    base_dir = Path(xdg_cache_home) if xdg_cache_home else Path.home() / ".cache"
+    return base_dir / "annofab_har"
@@ -0,0 +1,91 @@
+# noqa: INP001
+"""
+圧縮されていないHARファイルと、圧縮されたHARファイル（`.har.gz`, `.har.zst`, `.har.xz`）を入力したときの、処理時間と読み込んだバイト数を比較します。
+
+読み込んだバイト数は`/proc/self/io`の`rchar`の差分です。ページキャッシュから読み込んだ分も含みます。Linux以外では空欄になります。
+
+Examples:
+    $ python benchmarks/compressed_input.py --num_entries 10000 50000
+"""
+
+import argparse
+import functools
+import importlib.util
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from har_generator import write_har_file
+
+from ahs.compression import open_compressed
+from ahs.sanitize_har import sanitize_har_file
+from ahs.to_timing_csv import load_timing_columns
+
+PROC_IO_FILE = Path("/proc/self/io")
+
+
+def read_rchar() -> int | None:
+    if not PROC_IO_FILE.exists():
+        return None
+    for line in PROC_IO_FILE.read_text().splitlines():
+        key, _, value = line.partition(":")
+        if key == "rchar":
+            return int(value)
+    return None
+
+
+def compress_file(input_file: Path, output_file: Path) -> None:
+    with input_file.open("rb") as input_fp, open_compressed(output_file, "wb") as output_fp:
+        while chunk := input_fp.read(1024 * 1024):
+            output_fp.write(chunk)
+
+
+def measure(func: Callable[[], object]) -> tuple[float, int | None]:
+    """
+    経過時間[秒]と、読み込んだバイト数を返します。
+    """
+    rchar_before = read_rchar()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    rchar_after = read_rchar()
+    return elapsed, (rchar_after - rchar_before) if rchar_before is not None and rchar_after is not None else None
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="圧縮されたHARファイルを入力したときの処理時間と読み込んだバイト数を計測します。")
+    parser.add_argument("--num_entries", type=int, nargs="+", default=[10000, 50000], help="生成するHARファイルのentry数")
+    parser.add_argument("--content_size", type=int, default=4096, help="1entryあたりの`content.text`の文字数")
+    return parser
+
+
+def main() -> None:
+    args = create_parser().parse_args()
+    suffixes = ["", ".gz", ".xz"]
+    if importlib.util.find_spec("zstandard") is not None:
+        suffixes.append(".zst")
+
+    with tempfile.TemporaryDirectory() as str_temp_dir:
+        temp_dir = Path(str_temp_dir)
+        print("num_entries,input,file_size_mb,task,elapsed_seconds,read_mb")
+        for num_entries in args.num_entries:
+            raw_file = temp_dir / f"{num_entries}.har"
+            write_har_file(raw_file, num_entries, content_size=args.content_size)
+            for suffix in suffixes:
+                har_file = raw_file.with_name(raw_file.name + suffix)
+                if suffix != "":
+                    compress_file(raw_file, har_file)
+                file_size_mb = har_file.stat().st_size / 1024**2
+                tasks: dict[str, Callable[[], object]] = {
+                    "to_timing_csv": functools.partial(load_timing_columns, har_file),
+                    "sanitize": functools.partial(sanitize_har_file, har_file, temp_dir / "output.har", mode="stream"),
+                }
+                for task_name, func in tasks.items():
+                    elapsed, read_bytes = measure(func)
+                    read_mb = f"{read_bytes / 1024**2:.1f}" if read_bytes is not None else ""
+                    print(f"{num_entries},{har_file.name},{file_size_mb:.1f},{task_name},{elapsed:.2f},{read_mb}")
+
+
+if __name__ == "__main__":
+    main()
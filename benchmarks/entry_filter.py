@@ -0,0 +1,125 @@
+# noqa: INP001
+"""
+entryの絞り込みについて、従来の実装（entryごとに`re.search`を呼ぶ）とフィルタ式による実装の処理時間を比較します。
+
+* `legacy` : entryごとに`re.search`で判定しながら列を抽出します。
+* `precheck` : コンパイル済みのフィルタ式で、entryごとに判定しながら列を抽出します。
+* `vectorized` : 抽出済みの列（キャッシュから取得した列に相当）に対して、マスクを計算して絞り込みます。
+
+Examples:
+    $ python benchmarks/entry_filter.py --num_entries 100000 500000
+"""
+
+import argparse
+import functools
+import random
+import re
+import time
+from collections.abc import Callable
+from typing import Any
+from urllib.parse import urlsplit
+
+import numpy  # noqa: F401 numpyのimport時間を計測に含めないよう、事前にimportしている
+from har_generator import create_entry
+
+from ahs.entry_filter import EntryFilter, compile_entry_filter
+from ahs.timing_columns import TimingColumns, TimingColumnsBuilder, extract_timing_columns, get_row_count
+
+OTHER_URLS = [
+    "https://annofab.com/api/v1/projects/abc/tasks?page=1",
+    "https://annofab.com/static/js/main.0123abcd.js",
+    "https://d2rljy8mjgrfyd.cloudfront.net/3d-editor-latest/index.html",
+]
+OTHER_MIME_TYPES = ["application/json", "application/javascript", "text/html"]
+
+
+def create_entries(num_entries: int) -> list[dict[str, Any]]:
+    """
+    S3へのリクエストとそれ以外のリクエストが半分ずつ含まれる、entryのリストを生成します。
+    """
+    rng = random.Random(0)
+    entries = []
+    for index in range(num_entries):
+        entry = create_entry(index, content_size=0, rng=rng)
+        if index % 2 == 1:
+            entry["request"]["url"] = OTHER_URLS[index % len(OTHER_URLS)]
+            entry["response"]["content"]["mimeType"] = OTHER_MIME_TYPES[index % len(OTHER_MIME_TYPES)]
+        if index % 10 == 0:
+            entry["response"]["status"] = 404
+        entries.append(entry)
+    return entries
+
+
+def legacy_match_s3(entry: dict[str, Any]) -> bool:
+    return re.search("https://.*amazonaws\\.com/", entry["request"]["url"]) is not None
+
+
+def legacy_match_complex(entry: dict[str, Any]) -> bool:
+    url = entry["request"]["url"]
+    return (
+        (urlsplit(url).hostname or "").endswith(".amazonaws.com")
+        and entry["response"]["content"]["mimeType"].startswith("image/")
+        and 200 <= entry["response"]["status"] <= 299
+        and entry["time"] >= 100
+    )
+
+
+def extract_with_legacy_filter(entries: list[dict[str, Any]], match: Callable[[dict[str, Any]], bool]) -> int:
+    builder = TimingColumnsBuilder()
+    for entry in entries:
+        if match(entry):
+            builder.add(entry)
+    return get_row_count(builder.columns)
+
+
+def extract_with_precheck(entries: list[dict[str, Any]], entry_filter: EntryFilter) -> int:
+    return get_row_count(extract_timing_columns(entries, entry_filter=entry_filter))
+
+
+def filter_columns(columns: TimingColumns, entry_filter: EntryFilter) -> int:
+    return get_row_count(entry_filter.filter_columns(columns))
+
+
+CASES: dict[str, tuple[Callable[[dict[str, Any]], bool], list[str]]] = {
+    "s3": (legacy_match_s3, [r"url~https://.*amazonaws\.com/"]),
+    "host+mime+status+time": (legacy_match_complex, ["host$=.amazonaws.com", "mime^=image/", "status=200..299", "time>=100"]),
+}
+
+
+def measure(func: Callable[[], int]) -> tuple[float, int]:
+    start = time.perf_counter()
+    row_count = func()
+    return time.perf_counter() - start, row_count
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="entryの絞り込みの処理時間を比較します。")
+    parser.add_argument("--num_entries", type=int, nargs="+", default=[100000, 500000], help="entryの件数")
+    return parser
+
+
+def main() -> None:
+    args = create_parser().parse_args()
+    print("num_entries,case,engine,seconds,rows,speedup")
+    for num_entries in args.num_entries:
+        entries = create_entries(num_entries)
+        columns = extract_timing_columns(entries)
+        for case_name, (legacy_match, expressions) in CASES.items():
+            entry_filter = compile_entry_filter(expressions)
+            engines: dict[str, Callable[[], int]] = {
+                "legacy": functools.partial(extract_with_legacy_filter, entries, legacy_match),
+                "precheck": functools.partial(extract_with_precheck, entries, entry_filter),
+                "vectorized": functools.partial(filter_columns, columns, entry_filter),
+            }
+            legacy_seconds = None
+            legacy_rows = None
+            for engine_name, func in engines.items():
+                seconds, rows = measure(func)
+                if legacy_seconds is None:
+                    legacy_seconds, legacy_rows = seconds, rows
+                assert rows == legacy_rows
+                print(f"{num_entries},{case_name},{engine_name},{seconds:.3f},{rows},{legacy_seconds / seconds:.1f}")
+
+
+if __name__ == "__main__":
+    main()
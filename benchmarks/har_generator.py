@@ -0,0 +1,301 @@
+# noqa: INP001
+"""
+ベンチマーク用に、AnnofabのHARファイルに似た合成HARファイルを生成します。
+
+* `create_entry` / `write_har_file` : S3の署名付きURLへの画像のリクエストだけからなる、単純なHARファイル
+* `create_annofab_entry` / `write_annofab_har_file` : アノテーションエディタ画面（画像、動画、3次元）の通信を模したHARファイル。
+  フレームのリクエスト（S3の署名付きURL）、Annofab WebAPIのリクエスト、静的ファイルのリクエストが混在し、
+  `_initiator`には非同期処理をまたいだ深いコールスタックが含まれます。
+"""
+
+import datetime
+import json
+import random
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any, Literal
+
+EditorType = Literal["image", "video", "3dpc"]
+
+EDITOR_TYPES: list[EditorType] = ["image", "video", "3dpc"]
+
+EntryKind = Literal["frame", "api", "static", "editor_start", "editor_end"]
+
+RANDOM_ENTRY_KINDS: list[EntryKind] = ["frame", "api", "static"]
+RANDOM_ENTRY_KIND_WEIGHTS = [6, 3, 1]
+
+FRAME_FILES: dict[EditorType, tuple[str, str]] = {
+    "image": ("png", "image/png"),
+    "video": ("mp4", "video/mp4"),
+    "3dpc": ("pcd", "application/octet-stream"),
+}
+"""エディタの種類ごとの、フレームのファイルの拡張子とMIMEタイプ"""
+
+EDITOR_3DPC_URL = "https://d2rljy8mjgrfyd.cloudfront.net/3d-editor-latest/index.html"
+"""3次元エディタ画面のURL。`ahs.editor_loadtime`の組み込みのルールで、読み込みの開始とみなすリクエスト"""
+
+SCRIPT_URLS = [
+    "https://annofab.com/static/js/main.0123abcd.js",
+    "https://annofab.com/static/js/vendor.4567efgh.js",
+    "https://d2rljy8mjgrfyd.cloudfront.net/3d-editor-latest/static/js/editor.89abcdef.js",
+]
+
+
+def create_entry(index: int, *, content_size: int, rng: random.Random) -> dict[str, Any]:
+    started = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(milliseconds=index * 10)
+    url = (
+        f"https://annofab-bucket.s3.ap-northeast-1.amazonaws.com/frames/{index}.png"
+        f"?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential=AKIA{index:016d}%2F20250101%2Fap-northeast-1%2Fs3%2Faws4_request"
+        f"&X-Amz-Date=20250101T000000Z&X-Amz-Expires=3600&X-Amz-Signature={rng.getrandbits(128):032x}&X-Amz-SignedHeaders=host"
+    )
+    return {
+        "startedDateTime": started.isoformat().replace("+00:00", "Z"),
+        "time": rng.uniform(10, 500),
+        "request": {
+            "method": "GET",
+            "url": url,
+            "httpVersion": "http/2.0",
+            "headers": [{"name": "authorization", "value": "Bearer xxx"}, {"name": "accept", "value": "image/png"}],
+            "queryString": [{"name": "X-Amz-Signature", "value": "abc"}],
+            "cookies": [{"name": "session", "value": "xxx"}],
+            "headersSize": -1,
+            "bodySize": 0,
+        },
+        "response": {
+            "status": 200,
+            "statusText": "",
+            "httpVersion": "http/2.0",
+            "headers": [{"name": "content-length", "value": str(content_size)}, {"name": "set-cookie", "value": "a=b"}],
+            "cookies": [],
+            "content": {"size": content_size, "mimeType": "image/png", "text": "A" * content_size, "encoding": "base64"},
+            "redirectURL": "",
+            "headersSize": -1,
+            "bodySize": -1,
+        },
+        "cache": {},
+        "timings": {"blocked": 1.5, "dns": -1, "ssl": -1, "connect": -1, "send": 0.1, "wait": rng.uniform(5, 100), "receive": rng.uniform(1, 50)},
+        "_initiator": {
+            "type": "script",
+            "stack": {
+                "callFrames": [{"functionName": "load", "scriptId": "1", "url": "https://annofab.com/main.js", "lineNumber": 1, "columnNumber": 2}]
+            },
+        },
+    }
+
+
+def write_har_file(output_file: Path, num_entries: int, *, content_size: int = 1024, seed: int = 0) -> None:
+    """
+    合成HARファイルを書き込みます。
+    entryを1件ずつ書き込むので、巨大なファイルでもメモリをほとんど使いません。
+    """
+    rng = random.Random(seed)
+    with output_file.open("w", encoding="utf-8") as f:
+        f.write('{"log": {"version": "1.2", "creator": {"name": "WebInspector", "version": "537.36"}, "pages": [], "entries": [')
+        for index in range(num_entries):
+            if index > 0:
+                f.write(", ")
+            f.write(json.dumps(create_entry(index, content_size=content_size, rng=rng), ensure_ascii=False))
+        f.write("]}}")
+
+
+def write_har_file_with_size(output_file: Path, size: int, *, content_size: int = 1024, seed: int = 0) -> None:
+    """
+    おおよそ`size`バイトになるように、entryの件数を調整して合成HARファイルを書き込みます。
+    """
+    entry_size = len(json.dumps(create_entry(0, content_size=content_size, rng=random.Random(seed)), ensure_ascii=False)) + 2
+    write_har_file(output_file, max(1, size // entry_size), content_size=content_size, seed=seed)
+
+
+def create_signed_s3_url(path: str, rng: random.Random) -> str:
+    return (
+        f"https://annofab-bucket.s3.ap-northeast-1.amazonaws.com/{path}"
+        f"?X-Amz-Algorithm=AWS4-HMAC-SHA256&X-Amz-Credential=AKIA{rng.getrandbits(64):016X}%2F20250101%2Fap-northeast-1%2Fs3%2Faws4_request"
+        f"&X-Amz-Date=20250101T000000Z&X-Amz-Expires=3600&X-Amz-Security-Token={rng.getrandbits(256):064x}"
+        f"&X-Amz-Signature={rng.getrandbits(256):064x}&X-Amz-SignedHeaders=host"
+    )
+
+
+def create_initiator(depth: int, rng: random.Random, *, signed_url: str | None = None) -> dict[str, Any]:
+    """
+    Chrome DevToolsが出力する形式の`_initiator`を生成します。
+    `depth`個のコールフレームを、`Promise.then`などの非同期処理の境界（`parent`）で区切って入れ子にします。
+    `signed_url`を指定した場合は、最も内側のコールフレームのURLにします（署名付きURLから読み込んだWeb Workerなど）。
+    """
+
+    def create_call_frames(count: int) -> list[dict[str, Any]]:
+        return [
+            {
+                "functionName": f"f{rng.randrange(1000)}",
+                "scriptId": str(rng.randrange(1, 500)),
+                "url": rng.choice(SCRIPT_URLS),
+                "lineNumber": rng.randrange(1, 10000),
+                "columnNumber": rng.randrange(1, 200),
+            }
+            for _ in range(count)
+        ]
+
+    stack: dict[str, Any] | None = None
+    remaining = max(1, depth)
+    while remaining > 0:
+        count = min(remaining, rng.randint(1, 4))
+        remaining -= count
+        frame_stack: dict[str, Any] = {"callFrames": create_call_frames(count)}
+        if stack is not None:
+            frame_stack["description"] = rng.choice(["Promise.then", "setTimeout", "await"])
+            frame_stack["parent"] = stack
+        stack = frame_stack
+
+    assert stack is not None
+    if signed_url is not None:
+        stack["callFrames"][0]["url"] = signed_url
+    return {"type": "script", "stack": stack}
+
+
+def create_annofab_entry(
+    started: datetime.datetime,
+    *,
+    kind: EntryKind,
+    editor_type: EditorType,
+    frame_index: int,
+    content_size: int,
+    initiator_depth: int,
+    rng: random.Random,
+) -> dict[str, Any]:
+    """
+    アノテーションエディタ画面の通信を模したentryを生成します。
+
+    Args:
+        kind: リクエストの種類。`frame`はS3の署名付きURLへのフレームのリクエストです。
+        content_size: フレームの`content.text`の文字数
+        initiator_depth: `_initiator`のコールスタックの深さ
+    """
+    method = "GET"
+    status = 200
+    request_headers = [{"name": "accept", "value": "*/*"}, {"name": "user-agent", "value": "Mozilla/5.0"}]
+    query_string: list[dict[str, str]] = []
+    request_cookies: list[dict[str, str]] = []
+    signed_url = None
+    post_data = None
+    if kind == "frame":
+        extension, mime_type = FRAME_FILES[editor_type]
+        url = create_signed_s3_url(f"projects/p1/inputs/i{frame_index // 100}/frames/{frame_index:06d}.{extension}", rng)
+        query_string = [{"name": name, "value": value} for name, _, value in (e.partition("=") for e in url.split("?", 1)[1].split("&"))]
+        text = "A" * content_size
+        status = 403 if rng.random() < 0.01 else 200
+        # 署名付きURLから読み込んだWeb Workerが、フレームを読み込む場合がある
+        if rng.random() < 0.2:
+            signed_url = create_signed_s3_url("projects/p1/workers/decoder.js", rng)
+    elif kind == "api":
+        url = f"https://annofab.com/api/v1/projects/p1/tasks/t{rng.randrange(1000)}/annotation?v={rng.randrange(100)}"
+        mime_type = "application/json"
+        text = json.dumps({"details": [{"annotation_id": f"a{i}", "label_id": "car"} for i in range(rng.randint(1, 20))]})
+        request_headers.append({"name": "authorization", "value": f"Bearer {rng.getrandbits(256):064x}"})
+        request_cookies = [{"name": "session", "value": f"{rng.getrandbits(128):032x}"}]
+        if rng.random() < 0.3:
+            method = "PUT"
+            post_data = {"mimeType": "application/json", "text": text}
+    elif kind == "editor_start":
+        url = EDITOR_3DPC_URL
+        mime_type = "text/html"
+        text = "<!DOCTYPE html><html></html>"
+    elif kind == "editor_end":
+        method = "POST"
+        url = "https://annofab.com/api/v1/projects/p1/tasks/t1/validate-operation"
+        mime_type = "application/json"
+        text = "{}"
+        post_data = {"mimeType": "application/json", "text": "{}"}
+        request_cookies = [{"name": "session", "value": f"{rng.getrandbits(128):032x}"}]
+    else:
+        url = rng.choice(SCRIPT_URLS)
+        mime_type = "application/javascript"
+        text = "console.log(0);" * 16
+
+    time = rng.uniform(10, 500)
+    request: dict[str, Any] = {
+        "method": method,
+        "url": url,
+        "httpVersion": "http/2.0",
+        "headers": request_headers,
+        "queryString": query_string,
+        "cookies": request_cookies,
+        "headersSize": -1,
+        "bodySize": 0 if post_data is None else len(post_data["text"]),
+    }
+    if post_data is not None:
+        request["postData"] = post_data
+    return {
+        "startedDateTime": started.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        "time": time,
+        "request": request,
+        "response": {
+            "status": status,
+            "statusText": "",
+            "httpVersion": "http/2.0",
+            "headers": [
+                {"name": "content-type", "value": mime_type},
+                {"name": "content-length", "value": str(len(text))},
+                {"name": "set-cookie", "value": f"session={rng.getrandbits(64):016x}; Secure"},
+            ],
+            "cookies": [],
+            "content": {"size": len(text), "mimeType": mime_type, "text": text, **({"encoding": "base64"} if kind == "frame" else {})},
+            "redirectURL": "",
+            "headersSize": -1,
+            "bodySize": -1,
+        },
+        "cache": {},
+        "timings": {"blocked": 1.5, "dns": -1, "ssl": -1, "connect": -1, "send": 0.1, "wait": time * 0.6, "receive": time * 0.4 - 1.6},
+        "_initiator": create_initiator(initiator_depth, rng, signed_url=signed_url),
+        "_priority": "High",
+        "_resourceType": "fetch",
+    }
+
+
+def iter_annofab_entries(
+    num_entries: int, *, editor_type: EditorType = "image", content_size: int = 1024, initiator_depth: int = 16, seed: int = 0
+) -> Iterator[dict[str, Any]]:
+    """
+    アノテーションエディタ画面の通信を模したentryを、`startedDateTime`の昇順に`num_entries`件返します。
+    10件のうち、おおよそ6件がフレーム、3件がWebAPI、1件が静的ファイルのリクエストです。
+    3次元エディタの場合は、最初のentryがエディタ画面のリクエスト、最後のentryが`validate-operation`のリクエストになります。
+    """
+    rng = random.Random(seed)
+    started = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+    frame_index = 0
+    for index in range(num_entries):
+        started += datetime.timedelta(milliseconds=rng.randint(1, 20))
+        kind: EntryKind
+        if editor_type == "3dpc" and index == 0:
+            kind = "editor_start"
+        elif editor_type == "3dpc" and index == num_entries - 1 and num_entries > 1:
+            kind = "editor_end"
+        else:
+            kind = rng.choices(RANDOM_ENTRY_KINDS, weights=RANDOM_ENTRY_KIND_WEIGHTS)[0]
+        yield create_annofab_entry(
+            started,
+            kind=kind,
+            editor_type=editor_type,
+            frame_index=frame_index,
+            content_size=content_size,
+            initiator_depth=initiator_depth,
+            rng=rng,
+        )
+        if kind == "frame":
+            frame_index += 1
+
+
+def write_annofab_har_file(
+    output_file: Path, num_entries: int, *, editor_type: EditorType = "image", content_size: int = 1024, initiator_depth: int = 16, seed: int = 0
+) -> None:
+    """
+    アノテーションエディタ画面の通信を模したHARファイルを書き込みます。
+    entryを1件ずつ書き込むので、100万件のような巨大なファイルでもメモリをほとんど使いません。
+    同じ引数ならば、同じ内容のファイルを生成します。
+    """
+    with output_file.open("w", encoding="utf-8") as f:
+        f.write('{"log": {"version": "1.2", "creator": {"name": "WebInspector", "version": "537.36"}, "pages": [], "entries": [')
+        entries = iter_annofab_entries(num_entries, editor_type=editor_type, content_size=content_size, initiator_depth=initiator_depth, seed=seed)
+        for index, entry in enumerate(entries):
+            if index > 0:
+                f.write(", ")
+            f.write(json.dumps(entry, ensure_ascii=False))
+        f.write("]}}")
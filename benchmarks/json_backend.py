@@ -0,0 +1,61 @@
+# noqa: INP001
+"""
+JSONライブラリごとに、合成HARファイルのパースとシリアライズのスループットを計測します。
+
+Examples:
+    $ python benchmarks/json_backend.py --size_mb 10 100 1000
+"""
+
+import argparse
+import gc
+import tempfile
+import time
+from pathlib import Path
+
+from har_generator import write_har_file_with_size
+
+from ahs.har_io import JSON_BACKEND_NAMES, create_json_backend
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="JSONライブラリごとに、HARファイルのパースとシリアライズのスループットを計測します。")
+    parser.add_argument("--size_mb", type=int, nargs="+", default=[10, 100, 1000], help="生成するHARファイルのおおよそのサイズ[MB]")
+    parser.add_argument("--backend", nargs="+", choices=JSON_BACKEND_NAMES, default=JSON_BACKEND_NAMES)
+    return parser
+
+
+def main() -> None:
+    args = create_parser().parse_args()
+    print("size_mb,backend,parse_seconds,parse_mb_per_second,serialize_seconds,serialize_mb_per_second")
+    with tempfile.TemporaryDirectory() as str_temp_dir:
+        for size_mb in args.size_mb:
+            har_file = Path(str_temp_dir) / f"{size_mb}.har"
+            write_har_file_with_size(har_file, size_mb * 1024**2)
+            data_bytes = har_file.read_bytes()
+            actual_size_mb = len(data_bytes) / 1024**2
+
+            for backend_name in args.backend:
+                try:
+                    backend = create_json_backend(backend_name)
+                except ImportError:
+                    print(f"{size_mb},{backend_name},,,,")
+                    continue
+
+                gc.collect()
+                start = time.perf_counter()
+                data = backend.loads(data_bytes)
+                parse_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                backend.dumps(data)
+                serialize_seconds = time.perf_counter() - start
+                del data
+
+                print(
+                    f"{size_mb},{backend_name},{parse_seconds:.3f},{actual_size_mb / parse_seconds:.1f},"
+                    f"{serialize_seconds:.3f},{actual_size_mb / serialize_seconds:.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
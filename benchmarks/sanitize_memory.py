@@ -0,0 +1,56 @@
+# noqa: INP001
+"""
+`annofab_har sanitize`の処理方法ごとに、ファイルサイズに対するピークメモリ使用量(RSS)を計測します。
+
+Examples:
+    $ python benchmarks/sanitize_memory.py --num_entries 1000 10000 100000
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from har_generator import write_har_file
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="`annofab_har sanitize`のピークメモリ使用量をファイルサイズごとに計測します。")
+    parser.add_argument("--num_entries", type=int, nargs="+", default=[1000, 10000, 50000], help="生成するHARファイルのentry数")
+    parser.add_argument("--content_size", type=int, default=4096, help="1entryあたりの`content.text`の文字数")
+    parser.add_argument("--mode", nargs="+", choices=["stream", "memory"], default=["stream", "memory"])
+    return parser
+
+
+def measure(har_file: Path, output_file: Path, mode: str) -> tuple[float, int]:
+    """
+    サブプロセスで`annofab_har sanitize`を実行して、経過時間[秒]とピークRSS[KiB]を返します。
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "ahs", "sanitize", str(har_file), "--output", str(output_file), "--mode", mode])
+    _, status, rusage = os.wait4(proc.pid, 0)
+    elapsed = time.perf_counter() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise RuntimeError(f"sanitize failed :: mode={mode}, har_file={har_file}")
+    return elapsed, rusage.ru_maxrss
+
+
+def main() -> None:
+    args = create_parser().parse_args()
+    with tempfile.TemporaryDirectory() as str_temp_dir:
+        temp_dir = Path(str_temp_dir)
+        print("num_entries,file_size_mb,mode,elapsed_seconds,peak_rss_mb")
+        for num_entries in args.num_entries:
+            har_file = temp_dir / f"{num_entries}.har"
+            write_har_file(har_file, num_entries, content_size=args.content_size)
+            file_size_mb = har_file.stat().st_size / 1024**2
+            for mode in args.mode:
+                elapsed, peak_rss_kib = measure(har_file, temp_dir / "output.har", mode)
+                print(f"{num_entries},{file_size_mb:.1f},{mode},{elapsed:.2f},{peak_rss_kib / 1024:.1f}")
+
+
+if __name__ == "__main__":
+    main()
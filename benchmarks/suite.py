@@ -0,0 +1,257 @@
+# noqa: INP001
+"""
+ホットパス（マスク、timingの抽出、CLI全体）の処理時間とピークメモリ使用量を計測し、履歴ファイルに追記して前回の結果と比較します。
+
+`har_generator.write_annofab_har_file`で、アノテーションエディタ画面の通信を模したHARファイルを生成して入力にします。
+同じ引数ならば同じ内容のHARファイルを生成するので、異なるコミットの結果を比較できます。
+
+各ベンチマークは新しいプロセスで実行し、そのプロセスのピークRSSを計測します。
+処理時間は`--repeat`回のうち最小値です。
+
+* `mask_query_string_in_url` : HARファイルに含まれるすべてのURL（`request.url`と`_initiator`のURL）をマスク
+* `sanitize_har_object` : パース済みのHARファイルの内容をマスク
+* `create_dataframe_from_har_object` : パース済みのHARファイルの内容からtimingのDataFrameを生成
+* `cli_sanitize` : `annofab_har sanitize`
+* `cli_sanitize_inplace` : `annofab_har sanitize --mode inplace`
+* `cli_to_timing_csv` : `annofab_har to_timing_csv`
+
+Examples:
+    $ python benchmarks/suite.py --num_entries 1000 10000 100000 --history_file bench_history.jsonl
+    $ python benchmarks/suite.py --num_entries 1000000 --benchmark cli_sanitize --data_dir /tmp/har_data
+    $ python benchmarks/suite.py --history_file bench_history.jsonl --threshold 0.2 --fail_on_regression
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from har_generator import EDITOR_TYPES, EditorType, write_annofab_har_file
+
+FUNCTION_BENCHMARKS = ["mask_query_string_in_url", "sanitize_har_object", "create_dataframe_from_har_object"]
+CLI_BENCHMARKS = ["cli_sanitize", "cli_sanitize_inplace", "cli_to_timing_csv"]
+BENCHMARKS = [*FUNCTION_BENCHMARKS, *CLI_BENCHMARKS]
+
+
+class BenchmarkResult(NamedTuple):
+    benchmark: str
+    editor_type: str
+    num_entries: int
+    content_size: int
+    file_size: int
+    seconds: float
+    peak_rss: int
+    """ピークRSS[byte]"""
+
+    @property
+    def key(self) -> tuple[str, str, int, int]:
+        """履歴ファイルの結果と比較するときのキー"""
+        return (self.benchmark, self.editor_type, self.num_entries, self.content_size)
+
+
+def get_peak_rss(rusage: resource.struct_rusage) -> int:
+    # Linuxの`ru_maxrss`はKiB単位、macOSはbyte単位
+    return rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+
+
+def iter_urls(value: Any) -> Iterator[str]:  # noqa: ANN401
+    """
+    `_initiator`などから、キー`url`の値を再帰的に返します。
+    """
+    if isinstance(value, dict):
+        for key, child in value.items():
+            if key == "url" and isinstance(child, str):
+                yield child
+            else:
+                yield from iter_urls(child)
+    elif isinstance(value, list):
+        for child in value:
+            yield from iter_urls(child)
+
+
+def create_function_benchmark(benchmark: str, data: dict[str, Any]) -> Callable[[], object]:
+    """
+    パース済みのHARファイルの内容から、計測対象の関数を返します。パースなどの準備は計測に含めません。
+    """
+    from ahs.sanitize_har import SENSITIVE_QUERY_STRING_KEYS, mask_query_string_in_url, sanitize_har_object
+    from ahs.to_timing_csv import create_dataframe_from_har_object
+
+    if benchmark == "mask_query_string_in_url":
+        urls = [url for entry in data["log"]["entries"] for url in iter_urls(entry)]
+        return lambda: [mask_query_string_in_url(url, SENSITIVE_QUERY_STRING_KEYS) for url in urls]
+    if benchmark == "sanitize_har_object":
+        return lambda: sanitize_har_object(data)
+    if benchmark == "create_dataframe_from_har_object":
+        return lambda: create_dataframe_from_har_object(data, is_s3_path=False)
+    raise ValueError(f"Unexpected benchmark: {benchmark}")
+
+
+def run_function_benchmark(benchmark: str, har_file: Path, repeat: int) -> tuple[float, int]:
+    """
+    ワーカープロセスで実行して、最小の処理時間[秒]とピークRSS[byte]を返します。
+    """
+    from ahs.har_io import load_json_file
+
+    seconds = []
+    for _ in range(repeat):
+        # `sanitize_har_object`はHARファイルの内容を書き換えるので、毎回読み込み直す
+        func = create_function_benchmark(benchmark, load_json_file(har_file))
+        start = time.perf_counter()
+        func()
+        seconds.append(time.perf_counter() - start)
+    return min(seconds), get_peak_rss(resource.getrusage(resource.RUSAGE_SELF))
+
+
+def run_cli_benchmark(benchmark: str, har_file: Path, output_dir: Path, repeat: int) -> tuple[float, int]:
+    """
+    サブプロセスで`annofab_har`を実行して、最小の処理時間[秒]とピークRSS[byte]を返します。
+    """
+    if benchmark == "cli_sanitize":
+        command = ["sanitize", str(har_file), "--output", str(output_dir / "output.har")]
+    elif benchmark == "cli_sanitize_inplace":
+        command = ["sanitize", str(har_file), "--output", str(output_dir / "output.har"), "--mode", "inplace"]
+    elif benchmark == "cli_to_timing_csv":
+        command = ["to_timing_csv", str(har_file), "--output", str(output_dir / "output.csv")]
+    else:
+        raise ValueError(f"Unexpected benchmark: {benchmark}")
+
+    seconds = []
+    peak_rss = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, "-m", "ahs", *command])
+        _, status, rusage = os.wait4(proc.pid, 0)
+        seconds.append(time.perf_counter() - start)
+        if os.waitstatus_to_exitcode(status) != 0:
+            raise RuntimeError(f"'annofab_har {' '.join(command)}'が失敗しました。")
+        peak_rss = max(peak_rss, get_peak_rss(rusage))
+    return min(seconds), peak_rss
+
+
+def prepare_har_file(data_dir: Path, editor_type: EditorType, num_entries: int, content_size: int) -> Path:
+    """
+    入力のHARファイルを生成します。同じ条件のHARファイルが`data_dir`に存在すれば、それを利用します。
+    """
+    har_file = data_dir / f"annofab-{editor_type}-{num_entries}-{content_size}.har"
+    if not har_file.exists():
+        temp_file = har_file.with_suffix(".har.tmp")
+        write_annofab_har_file(temp_file, num_entries, editor_type=editor_type, content_size=content_size)
+        temp_file.replace(har_file)
+    return har_file
+
+
+def run_benchmarks(args: argparse.Namespace, data_dir: Path, output_dir: Path) -> Iterator[BenchmarkResult]:
+    # ワーカープロセスのピークRSSに、親プロセスのメモリが含まれないようにspawnで起動する
+    mp_context = multiprocessing.get_context("spawn")
+    for editor_type in args.editor_type:
+        for num_entries in args.num_entries:
+            har_file = prepare_har_file(data_dir, editor_type, num_entries, args.content_size)
+            file_size = har_file.stat().st_size
+            for benchmark in args.benchmark:
+                if benchmark in CLI_BENCHMARKS:
+                    seconds, peak_rss = run_cli_benchmark(benchmark, har_file, output_dir, args.repeat)
+                else:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=mp_context) as executor:
+                        seconds, peak_rss = executor.submit(run_function_benchmark, benchmark, har_file, args.repeat).result()
+                yield BenchmarkResult(benchmark, editor_type, num_entries, args.content_size, file_size, seconds, peak_rss)
+
+
+def get_git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous_results(history_file: Path) -> dict[tuple[str, str, int, int], dict[str, Any]]:
+    """
+    履歴ファイルから、ベンチマークの条件ごとに最新の結果を返します。
+    """
+    results: dict[tuple[str, str, int, int], dict[str, Any]] = {}
+    if not history_file.exists():
+        return results
+    with history_file.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip() == "":
+                continue
+            record = json.loads(line)
+            results[(record["benchmark"], record["editor_type"], record["num_entries"], record["content_size"])] = record
+    return results
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="ホットパスの処理時間とピークメモリ使用量を計測し、前回の結果と比較します。")
+    parser.add_argument("--benchmark", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--editor_type", nargs="+", choices=EDITOR_TYPES, default=EDITOR_TYPES, help="生成するHARファイルのエディタの種類")
+    parser.add_argument(
+        "--num_entries", type=int, nargs="+", default=[1000, 10000], help="生成するHARファイルのentry数。1000から1000000程度を想定しています。"
+    )
+    parser.add_argument("--content_size", type=int, default=1024, help="フレームのリクエストの`content.text`の文字数")
+    parser.add_argument("--repeat", type=int, default=3, help="1ケースあたりの実行回数。処理時間は最小値を出力します。")
+    parser.add_argument("--data_dir", type=Path, help="生成したHARファイルを保存するディレクトリ。次回以降はHARファイルを生成せずに再利用します。")
+    parser.add_argument("--history_file", type=Path, help="結果を追記するJSON Linesファイル。前回の結果と比較します。")
+    parser.add_argument("--threshold", type=float, default=0.1, help="処理時間またはピークRSSが、前回よりこの割合以上増えた場合に劣化とみなします。")
+    parser.add_argument("--fail_on_regression", action="store_true", help="劣化したベンチマークがあれば、終了コード1で終了します。")
+    return parser
+
+
+def format_change(change: float | None) -> str:
+    return f"{change:+.1%}" if change is not None else ""
+
+
+def main() -> None:
+    args = create_parser().parse_args()
+    previous_results = load_previous_results(args.history_file) if args.history_file is not None else {}
+    metadata = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": get_git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+
+    regressions = []
+    print("benchmark,editor_type,num_entries,file_size_mb,seconds,entries_per_second,mb_per_second,peak_rss_mb,seconds_change,peak_rss_change")
+    with tempfile.TemporaryDirectory() as str_temp_dir:
+        temp_dir = Path(str_temp_dir)
+        data_dir = args.data_dir if args.data_dir is not None else temp_dir
+        data_dir.mkdir(exist_ok=True, parents=True)
+        for result in run_benchmarks(args, data_dir, temp_dir):
+            previous = previous_results.get(result.key)
+            seconds_change = result.seconds / previous["seconds"] - 1 if previous is not None else None
+            peak_rss_change = result.peak_rss / previous["peak_rss"] - 1 if previous is not None else None
+            if (seconds_change is not None and seconds_change >= args.threshold) or (
+                peak_rss_change is not None and peak_rss_change >= args.threshold
+            ):
+                regressions.append(result)
+
+            file_size_mb = result.file_size / 1024**2
+            print(
+                f"{result.benchmark},{result.editor_type},{result.num_entries},{file_size_mb:.1f},{result.seconds:.3f},"
+                f"{result.num_entries / result.seconds:.0f},{file_size_mb / result.seconds:.1f},{result.peak_rss / 1024**2:.1f},"
+                f"{format_change(seconds_change)},{format_change(peak_rss_change)}",
+                flush=True,
+            )
+            if args.history_file is not None:
+                args.history_file.parent.mkdir(exist_ok=True, parents=True)
+                with args.history_file.open("a", encoding="utf-8") as f:
+                    f.write(json.dumps({**metadata, **result._asdict()}) + "\n")
+
+    for result in regressions:
+        print(f"[REGRESSION] {result.benchmark} editor_type={result.editor_type} num_entries={result.num_entries}", file=sys.stderr)
+    if args.fail_on_regression and len(regressions) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
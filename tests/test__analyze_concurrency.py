@@ -0,0 +1,102 @@
+import json
+from pathlib import Path
+
+import numpy
+import pytest
+
+from ahs.__main__ import main
+from ahs.analyze_concurrency import analyze_request_intervals, create_request_intervals, find_critical_path, sweep_in_flight
+from tests.test__timing_columns import create_entry
+
+
+def create_intervals(requests: list[tuple[str, float, float, float]]):
+    """(URL, 開始時刻[ミリ秒], time[ミリ秒], timings.blocked[ミリ秒])のリストから生成する"""
+    started_date_times = [f"2025-01-01T00:00:{start / 1000:06.3f}Z" for _, start, _, _ in requests]
+    return create_request_intervals(started_date_times, [e[2] for e in requests], [e[3] for e in requests], [e[0] for e in requests])
+
+
+def test__sweep_in_flight():
+    start = numpy.array([0.0, 10.0, 20.0])
+    end = numpy.array([20.0, 30.0, 25.0])
+    _, times, counts = sweep_in_flight(start, end)
+    # 同じ時刻では終了を先に数えるので、20ミリ秒の時点で2件を超えない
+    assert times.tolist() == [0, 10, 20, 20, 25, 30]
+    assert counts.tolist() == [1, 2, 1, 2, 1, 0]
+
+
+def test__analyze_request_intervals():
+    intervals = create_intervals(
+        [
+            ("https://a.example.com/1", 0, 1000, -1),
+            ("https://a.example.com/2", 0, 1000, 0),
+            ("https://b.example.com/1", 500, 1000, 300),
+            # `time`が存在しないentryは除外する
+            ("https://b.example.com/2", 500, float("nan"), 0),
+            ("https://a.example.com/3", 1500, 500, 0),
+        ]
+    )
+    actual = analyze_request_intervals(intervals, connection_limit=2, timeline_bucket_ms=1000)
+    assert actual["started_at"] == "2025-01-01T00:00:00.000Z"
+    assert actual["request_count"] == 4
+    assert actual["duration_ms"] == 2000
+    assert actual["busy_ms"] == 2000
+    assert actual["max_in_flight"] == 3
+    assert actual["max_in_flight_at_ms"] == 500
+    assert actual["mean_in_flight"] == pytest.approx(3500 / 2000)
+    assert actual["blocked_request_count"] == 1
+
+    assert actual["hosts"][0] == {
+        "host": "a.example.com",
+        "request_count": 3,
+        "max_in_flight": 2,
+        "busy_ms": 1500,
+        "saturated_ms": 1000,
+        "blocked_request_count": 0,
+        "blocked_ms": 0,
+        "max_blocked_ms": 0,
+    }
+    assert actual["hosts"][1]["host"] == "b.example.com"
+    assert actual["hosts"][1]["max_blocked_ms"] == 300
+
+    assert actual["timeline"] == {"bucket_ms": 1000, "max_in_flight": [3, 2], "mean_in_flight": [2.5, 1.0]}
+    critical_path = actual["critical_path"]
+    assert critical_path["request_count"] == 2
+    # a.example.com/3は、その開始時刻に完了したb.example.com/1を待っていたとみなす
+    assert [e["url"] for e in critical_path["requests"]] == ["https://b.example.com/1", "https://a.example.com/3"]
+    assert critical_path["duration_ms"] == 1500
+
+
+def test__find_critical_path__timeが0のリクエストと連続するリクエスト():
+    intervals = create_intervals(
+        [
+            ("https://a.example.com/1", 0, 50, -1),
+            # キャッシュから読み込んだレスポンスは`time`が0になる
+            ("https://a.example.com/2", 100, 0, -1),
+            ("https://a.example.com/3", 100, 0, -1),
+            # 直前のリクエストの完了と同時に開始する
+            ("https://a.example.com/4", 100, 200, -1),
+            ("https://a.example.com/5", 300, 100, -1),
+        ]
+    )
+    # 同じ時刻に完了したリクエストを、自身を含めずに遡るので無限ループにならない
+    critical_path = find_critical_path(intervals)
+    assert [e["url"] for e in critical_path["requests"]] == [f"https://a.example.com/{i}" for i in range(1, 6)]
+    assert critical_path["duration_ms"] == 400
+
+
+def test__analyze_concurrency(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    entries = [
+        create_entry("https://bucket.s3.ap-northeast-1.amazonaws.com/a.png", "3"),
+        create_entry("https://annofab.com/api/v1/foo", None),
+    ]
+    har_file.write_text(json.dumps({"log": {"entries": entries}}))
+    output_file = tmp_path / "output.json"
+
+    main(["analyze_concurrency", str(har_file), "--output", str(output_file), "--filter", "host=annofab.com", "--timeline_bucket_ms", "0"])
+    actual = json.loads(output_file.read_text())
+    assert len(actual) == 1
+    assert actual[0]["har_file"] == str(har_file)
+    assert actual[0]["request_count"] == 1
+    assert actual[0]["max_in_flight"] == 1
+    assert "timeline" not in actual[0]
@@ -1,4 +1,15 @@
-from ahs.sanitize_har import sanitize_initiator
+import sys
+from typing import Any
+
+from ahs.sanitize_har import (
+    DEFAULT_SANITIZE_POLICY,
+    SENSITIVE_QUERY_STRING_KEYS,
+    HarSanitizer,
+    _UrlMasker,
+    mask_query_string_in_url,
+    sanitize_initiator,
+    sanitize_url,
+)
 
 
 def test__sanitize_initiator():
@@ -20,3 +31,62 @@ def test__sanitize_initiator2():
 
     actual = sanitize_initiator(initiator)
     assert actual["stack"]["callFrames"][0]["url"] == "https://example.com/foo?X-Amz-Credential=REDACTED"
+
+
+def test__mask_query_string_in_url__マスク対象以外はそのまま残す():
+    url = "https://example.com/foo?a=%2F+b&X-Amz-Signature=123&X-Amz-Credential=&c#X-Amz-Signature=456"
+    actual = mask_query_string_in_url(url, SENSITIVE_QUERY_STRING_KEYS)
+    assert actual == "https://example.com/foo?a=%2F+b&X-Amz-Signature=REDACTED&X-Amz-Credential=&c#X-Amz-Signature=456"
+
+
+def test__mask_query_string_in_url__マスク対象のキーを含まない():
+    url = "https://example.com/foo?b=%2f&a=1"
+    assert mask_query_string_in_url(url, SENSITIVE_QUERY_STRING_KEYS) == url
+    assert sanitize_url("https://example.com/foo#?X-Amz-Signature=1") == "https://example.com/foo#?X-Amz-Signature=1"
+
+
+def test__sanitize_url():
+    url = "https://bucket.s3.amazonaws.com/a.png?X-Amz-Security-Token=abc&X-Amz-Date=20250101T000000Z&X-Amz-Signature=def"
+    assert (
+        sanitize_url(url)
+        == "https://bucket.s3.amazonaws.com/a.png?X-Amz-Security-Token=REDACTED&X-Amz-Date=20250101T000000Z&X-Amz-Signature=REDACTED"
+    )
+
+
+def test__sanitize_initiator__深いコールスタック():
+    # 再帰呼び出しの上限を超える深さでも処理できる
+    stack: dict[str, Any] = {"callFrames": [{"url": "https://example.com/0.js?X-Amz-Signature=123"}]}
+    for index in range(sys.getrecursionlimit() * 2):
+        stack = {"callFrames": [{"url": f"https://example.com/{index % 3}.js?X-Amz-Signature=123"}], "parent": stack}
+    initiator: dict[str, Any] = {"type": "script", "stack": stack}
+
+    sanitize_initiator(initiator)
+    while "parent" in stack:
+        assert stack["callFrames"][0]["url"].endswith("X-Amz-Signature=REDACTED")
+        stack = stack["parent"]
+    assert stack["callFrames"][0]["url"] == "https://example.com/0.js?X-Amz-Signature=REDACTED"
+
+
+def test__HarSanitizer__sanitize_initiator():
+    shared_frame: dict[str, Any] = {"url": "https://example.com/foo?X-Amz-Credential=123"}
+    initiator: dict[str, Any] = {"type": "script", "stack": {"callFrames": [shared_frame, shared_frame, {"url": "https://example.com/main.js"}]}}
+    other_initiator: dict[str, Any] = {"url": "https://example.com/" + "main.js"}
+
+    sanitizer = HarSanitizer()
+    sanitizer.sanitize_initiator(initiator)
+    sanitizer.sanitize_initiator(other_initiator)
+    assert shared_frame["url"] == "https://example.com/foo?X-Amz-Credential=REDACTED"
+    # 同じURLは、同じ文字列オブジェクトを共有する
+    assert other_initiator["url"] is initiator["stack"]["callFrames"][2]["url"]
+
+
+def test__UrlMasker__上限に達したら最も長い間参照されていないURLから破棄する():
+    url_masker = _UrlMasker(DEFAULT_SANITIZE_POLICY, max_size=3)
+    urls = [f"https://example.com/{i}?X-Amz-Signature=123" for i in range(5)]
+    for url in urls:
+        url_masker[url]  # noqa: B018
+        # 先頭のURLは毎回参照するので破棄されない
+        url_masker[urls[0]]  # noqa: B018
+    assert list(url_masker) == [urls[3], urls[4], urls[0]]
+    assert list(url_masker.matched_rules) == [urls[0], urls[3], urls[4]]
+    assert url_masker[urls[4]] == "https://example.com/4?X-Amz-Signature=REDACTED"
@@ -0,0 +1,117 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from ahs.__main__ import main
+from ahs.compare_har import BootstrapOptions, SampleOptions, compare_har_files, normalize_url
+from tests.test__editor_loadtime import ENTRIES_3DPC, S3_URL, create_entry
+
+API_URL = "https://annofab.com/api/v1/projects"
+
+
+def create_har_file(path: Path, frame_time: float, api_time: float) -> Path:
+    entries: list[dict[str, Any]] = [
+        *ENTRIES_3DPC,
+        *[
+            create_entry("2025-01-01T00:00:10.000Z", "GET", f"{S3_URL}/x.bin?X-Amz-Date={i}&X-Amz-Signature={i}", time=frame_time + i)
+            for i in range(5)
+        ],
+        *[create_entry("2025-01-01T00:00:10.000Z", "GET", f"{API_URL}?page={i % 2 + 1}#top", time=api_time + i) for i in range(6)],
+    ]
+    for entry in entries:
+        # `to_timing_csv`コマンドなどが必要とするプロパティを補う
+        entry["response"].update(headers=[], content={**entry["response"]["content"], "size": 0})
+        entry["timings"] = {"blocked": -1, "dns": -1, "connect": -1, "send": 0, "wait": entry["time"], "receive": 0}
+    path.write_text(json.dumps({"log": {"entries": entries}}))
+    return path
+
+
+@pytest.fixture
+def har_files(tmp_path: Path) -> tuple[list[Path], list[Path]]:
+    before_files = [create_har_file(tmp_path / f"before{i}.har", frame_time=100, api_time=50) for i in range(2)]
+    after_files = [create_har_file(tmp_path / f"after{i}.har", frame_time=300, api_time=50) for i in range(3)]
+    return before_files, after_files
+
+
+def test__normalize_url():
+    assert normalize_url("https://example.com/a.png?X-Amz-Date=1&X-Amz-Credential=2&foo=3#bar") == (
+        "https://example.com/a.png?X-Amz-Date=REDACTED&X-Amz-Credential=REDACTED&foo=3"
+    )
+    assert normalize_url("https://cdn.example.com/a.png?Expires=1&Signature=2&Key-Pair-Id=3") == (
+        "https://cdn.example.com/a.png?Expires=REDACTED&Signature=REDACTED&Key-Pair-Id=REDACTED"
+    )
+    assert normalize_url("https://example.com/a.png?foo=3", ignore_query=True) == "https://example.com/a.png"
+
+
+def test__compare_har_files(har_files: tuple[list[Path], list[Path]]):
+    before_files, after_files = har_files
+    actual = compare_har_files(
+        before_files, after_files, sample_options=SampleOptions(editor_type="3dpc"), bootstrap_options=BootstrapOptions(iterations=200)
+    )
+    assert actual["before"] == {"har_file_count": 2, "entry_count": 2 * 17, "errors": []}
+
+    # 署名付きURLは1個のグループにまとめる。遅くなったグループが先頭
+    resource = actual["resources"][0]
+    assert resource["url"] == f"{S3_URL}/x.bin?X-Amz-Date=REDACTED&X-Amz-Signature=REDACTED"
+    assert (resource["before_count"], resource["after_count"]) == (10, 15)
+    assert resource["delta"] == 200
+    assert 0 < resource["delta_low"] <= 200 <= resource["delta_high"]
+    assert resource["is_significant"]
+
+    # フラグメントは除く
+    api_resources = [e for e in actual["resources"] if e["url"].startswith(API_URL)]
+    assert [e["url"] for e in api_resources] == [f"{API_URL}?page=1", f"{API_URL}?page=2"]
+    assert all(e["delta"] == 0 and not e["is_significant"] for e in api_resources)
+    # 値の個数が`min_count`未満のグループは比較しない
+    assert actual["unmatched"]["insufficient_count"] == len(ENTRIES_3DPC)
+
+    milestones = {e["milestone"]: e for e in actual["milestones"]}
+    assert milestones["first_frame_seconds"]["delta"] == 0
+
+
+def test__compare_har_files__HARファイルが少ないマイルストーンは信頼区間を算出しない(tmp_path: Path):
+    before_file = create_har_file(tmp_path / "before.har", frame_time=100, api_time=50)
+    after_file = create_har_file(tmp_path / "after.har", frame_time=300, api_time=50)
+    actual = compare_har_files(
+        [before_file], [after_file], sample_options=SampleOptions(editor_type="3dpc"), bootstrap_options=BootstrapOptions(iterations=200)
+    )
+    milestone = {e["milestone"]: e for e in actual["milestones"]}["time_seconds"]
+    assert (milestone["before_count"], milestone["after_count"]) == (1, 1)
+    assert milestone["delta"] == 0
+    assert (milestone["delta_low"], milestone["delta_high"], milestone["is_significant"]) == (None, None, None)
+
+
+def test__compare__jobsによらず同じ結果になる(tmp_path: Path):
+    before_files = [create_har_file(tmp_path / f"before{i}.har", frame_time=100 + i, api_time=50) for i in range(3)]
+    after_files = [create_har_file(tmp_path / f"after{i}.har", frame_time=120 - i, api_time=40 + i) for i in range(3)]
+    results = []
+    for jobs in ["1", "2"]:
+        output_file = tmp_path / f"output{jobs}.json"
+        main(
+            [
+                "compare",
+                "--before",
+                *map(str, before_files),
+                "--after",
+                *map(str, after_files),
+                "--group_by",
+                "method",
+                "host",
+                "--ignore_query",
+                "--bootstrap_iterations",
+                "100",
+                "--jobs",
+                jobs,
+                "--output",
+                str(output_file),
+            ]
+        )
+        results.append(json.loads(output_file.read_text()))
+
+    assert results[0] == results[1]
+    assert {(e["method"], e["host"]) for e in results[0]["resources"]} == {
+        ("GET", "bucket.s3.ap-northeast-1.amazonaws.com"),
+        ("GET", "annofab.com"),
+    }
@@ -0,0 +1,95 @@
+import gzip
+import json
+import lzma
+from pathlib import Path
+
+import pandas
+import pytest
+
+from ahs.__main__ import main
+from ahs.compression import compress_bytes, decompress_bytes, open_compressed, open_text, strip_compression_suffix
+from ahs.har_files import collect_har_files
+from ahs.har_stream import iter_har_file_entries
+from tests.test__process_har import ENTRIES
+
+COMPRESSIONS = [
+    pytest.param(".gz", id="gzip"),
+    pytest.param(".xz", id="xz"),
+    pytest.param(".zst", id="zstd"),
+]
+
+
+def skip_if_unsupported(suffix: str) -> None:
+    if suffix == ".zst":
+        pytest.importorskip("zstandard", reason="zstandardがインストールされていません。")
+
+
+def write_har_file(har_file: Path) -> None:
+    with open_compressed(har_file, "wb") as f:
+        f.write(json.dumps({"log": {"version": "1.2", "entries": ENTRIES}}).encode("utf-8"))
+
+
+@pytest.mark.parametrize("suffix", COMPRESSIONS)
+def test__open_compressed(tmp_path: Path, suffix: str):
+    skip_if_unsupported(suffix)
+    har_file = tmp_path / f"input.har{suffix}"
+    write_har_file(har_file)
+
+    assert har_file.read_bytes()[:1] != b"{"
+    with open_text(har_file) as f:
+        assert json.loads(f.read())["log"]["entries"] == ENTRIES
+    assert list(iter_har_file_entries(har_file)) == ENTRIES
+
+
+@pytest.mark.parametrize("suffix", COMPRESSIONS)
+def test__compress_bytes(suffix: str):
+    skip_if_unsupported(suffix)
+    compression = {".gz": "gzip", ".xz": "xz", ".zst": "zstd"}[suffix]
+    assert decompress_bytes(compress_bytes(b"abc", compression), compression) == b"abc"
+
+
+def test__strip_compression_suffix():
+    assert strip_compression_suffix("a.har.gz") == "a.har"
+    assert strip_compression_suffix("a.har") == "a.har"
+
+
+def test__collect_har_files(tmp_path: Path):
+    for name in ["a.har", "b.har.gz", "c.har.xz", "d.har.zst", "e.json.gz", "f.harx"]:
+        (tmp_path / name).write_bytes(b"")
+    assert [e.relative_path for e in collect_har_files([tmp_path])] == [Path("a.har"), Path("b.har.gz"), Path("c.har.xz"), Path("d.har.zst")]
+
+
+@pytest.mark.parametrize("mode", ["stream", "memory"])
+def test__sanitize(tmp_path: Path, mode: str):
+    har_file = tmp_path / "input.har.gz"
+    write_har_file(har_file)
+    output_file = tmp_path / "output.har.xz"
+
+    main(["sanitize", str(har_file), "--output", str(output_file), "--mode", mode])
+    actual = json.loads(lzma.decompress(output_file.read_bytes()))
+    assert actual["log"]["entries"][1]["request"]["url"] == "https://bucket.s3.ap-northeast-1.amazonaws.com/a.png?X-Amz-Signature=REDACTED"
+
+
+def test__to_timing_csv(tmp_path: Path):
+    har_file = tmp_path / "input.har.gz"
+    write_har_file(har_file)
+    output_file = tmp_path / "output.csv"
+
+    main(["to_timing_csv", str(har_file), "--output", str(output_file)])
+    assert len(pandas.read_csv(output_file)) == len(ENTRIES)
+
+    # 圧縮されたHARファイルは索引を作成できないので、先頭から読み込みながら絞り込む
+    main(["to_timing_csv", str(har_file), "--output", str(output_file), "--url_regex", "amazonaws"])
+    assert len(pandas.read_csv(output_file)) == 1
+    assert not (tmp_path / "input.har.gz.ahsidx").exists()
+
+
+def test__process(tmp_path: Path):
+    har_file = tmp_path / "input.har.gz"
+    write_har_file(har_file)
+    output_dir = tmp_path / "output"
+
+    main(["process", str(har_file), "--output_dir", str(output_dir)])
+    sanitized = json.loads(gzip.decompress((output_dir / "sanitize/input.har.gz").read_bytes()))
+    assert sanitized["log"]["version"] == "1.2"
+    assert len(pandas.read_csv(output_dir / "timing/input.csv")) == len(ENTRIES)
@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from ahs.__main__ import main
+from ahs.editor_loadtime import DEFAULT_EDITOR_RULE_CONFIGS, calc_editor_loading_time, compile_editor_rule
+
+
+def create_entry(started_date_time: str, method: str, url: str, mime_type: str = "text/html", time: float = 100) -> dict[str, Any]:
+    return {
+        "startedDateTime": started_date_time,
+        "time": time,
+        "request": {"method": method, "url": url},
+        "response": {"status": 200, "content": {"mimeType": mime_type}},
+    }
+
+
+S3_URL = "https://bucket.s3.ap-northeast-1.amazonaws.com/frames"
+
+ENTRIES_3DPC = [
+    create_entry("2025-01-01T00:00:00.000Z", "GET", f"{S3_URL}/old.bin"),
+    create_entry("2025-01-01T00:00:01.000Z", "GET", "https://d2rljy8mjgrfyd.cloudfront.net/3d-editor-latest/index.html"),
+    create_entry("2025-01-01T00:00:02.000Z", "GET", f"{S3_URL}/1.bin", time=500),
+    create_entry("2025-01-01T00:00:03.000Z", "GET", f"{S3_URL}/2.bin", time=2000),
+    create_entry("2025-01-01T00:00:04.000Z", "POST", "https://annofab.com/api/v1/validate-operation"),
+    create_entry("2025-01-01T00:00:05.000Z", "GET", f"{S3_URL}/3.bin"),
+]
+
+
+def test__calc_editor_loading_time__3dpc():
+    rule = compile_editor_rule("3dpc", DEFAULT_EDITOR_RULE_CONFIGS["3dpc"])
+    actual = calc_editor_loading_time({"log": {"entries": ENTRIES_3DPC}}, rule, nth_frames=[2, 3])
+    assert actual == {
+        "start_request.startedDateTime": "2025-01-01T00:00:01.000Z",
+        "end_request.startedDateTime": "2025-01-01T00:00:04.000Z",
+        "time_seconds": 3.0,
+        # `start`より前と`end`より後のフレームは含まない
+        "frame_count": 2,
+        "first_frame_seconds": 1.5,
+        "2_frame_seconds": 4.0,
+        "3_frame_seconds": None,
+        "all_frames_seconds": 4.0,
+    }
+
+
+def test__calc_editor_loading_time__startより前のentryは無視する():
+    # 前の画面で送信された`end`のリクエストで、計測を終了しない
+    entries = [create_entry("2024-12-31T23:59:59.000Z", "POST", "https://annofab.com/api/v1/validate-operation"), *ENTRIES_3DPC]
+    rule = compile_editor_rule("3dpc", DEFAULT_EDITOR_RULE_CONFIGS["3dpc"])
+    actual = calc_editor_loading_time({"log": {"entries": entries}}, rule)
+    assert actual["end_request.startedDateTime"] == "2025-01-01T00:00:04.000Z"
+    assert actual["time_seconds"] == 3.0
+    assert actual["frame_count"] == 2
+
+
+def test__calc_editor_loading_time__image():
+    entries = [
+        create_entry("2025-01-01T00:00:00.000Z", "GET", "https://annofab.com/index.html"),
+        create_entry("2025-01-01T00:00:01.000Z", "GET", f"{S3_URL}/1.png", mime_type="image/png", time=1000),
+        create_entry("2025-01-01T00:00:01.500Z", "GET", "https://annofab.com/logo.png", mime_type="image/png"),
+    ]
+    rule = compile_editor_rule("image", DEFAULT_EDITOR_RULE_CONFIGS["image"])
+    actual = calc_editor_loading_time({"log": {"entries": entries}}, rule)
+    assert actual["start_request.startedDateTime"] == "2025-01-01T00:00:00.000Z"
+    assert actual["frame_count"] == 1
+    assert actual["time_seconds"] == actual["all_frames_seconds"] == 2.0
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test__main(tmp_path: Path, jobs: int):
+    har_files = []
+    for name in ["a", "b"]:
+        har_file = tmp_path / f"{name}.har"
+        har_file.write_text(json.dumps({"log": {"entries": ENTRIES_3DPC}}))
+        har_files.append(str(har_file))
+    rule_file = tmp_path / "rule.json"
+    rule_file.write_text(json.dumps({"custom": {"frame": ["url$=.bin"]}}))
+    output_file = tmp_path / "output.json"
+
+    main(["editor_loadtime", *har_files, "--type", "custom", "--rule_file", str(rule_file), "--jobs", str(jobs), "--output", str(output_file)])
+    actual = json.loads(output_file.read_text())
+    assert [e["har_file"] for e in actual] == har_files
+    assert actual[0]["frame_count"] == 4
@@ -0,0 +1,48 @@
+import math
+
+import pandas
+import pytest
+
+from ahs.editor_statistics import create_dataframe_editor_statistics
+
+
+def create_row(har_file: str, started_date_time: str, mime_type: str, **kwargs) -> dict:
+    return {
+        "har_file": har_file,
+        "startedDateTime": started_date_time,
+        "response.status": 200,
+        "response.content.mimeType": mime_type,
+        "response.headers.contentLength": 100,
+        "time": 500.0,
+        "timings.receive": 10.0,
+        **kwargs,
+    }
+
+
+def test__create_dataframe_editor_statistics():
+    df_input = pandas.DataFrame(
+        [
+            # 並び順に関わらず、startedDateTimeが最も古いリクエストを起点にする
+            create_row("b.har", "2025-01-01T00:00:03.000Z", "image/png", **{"timings.receive": 30.0, "response.headers.contentLength": 300}),
+            create_row("b.har", "2025-01-01T00:00:00.000Z", "text/html"),
+            create_row("b.har", "2025-01-01T00:00:01.000Z", "image/png", **{"response.status": 404}),
+            create_row("a.har", "2025-01-01T00:00:00.000Z", "image/png"),
+            create_row("c.har", "2025-01-01T00:00:00.000Z", "text/html"),
+        ]
+    )
+    actual = create_dataframe_editor_statistics(df_input, nth_frames=[1, 2]).set_index("har_file")
+
+    assert list(actual.index) == ["a.har", "b.har", "c.har"]
+    assert actual.loc["b.har", "first_startedDateTime"] == "2025-01-01T00:00:00.000Z"
+    assert actual.loc["b.har", "1_frame_elapsed_seconds"] == pytest.approx(1.5)
+    assert actual.loc["b.har", "2_frame_elapsed_seconds"] == pytest.approx(3.5)
+    assert math.isnan(actual.loc["a.har", "2_frame_elapsed_seconds"])
+
+    assert actual.loc["b.har", "frame_count"] == 2
+    assert actual.loc["b.har", "fail_count"] == 1
+    assert actual.loc["b.har", "throughput"] == pytest.approx(400 / 40)
+    # 標準偏差は母標準偏差。値が1個の場合は0
+    assert actual.loc["b.har", "timings.receive_std"] == pytest.approx(10.0)
+    assert actual.loc["a.har", "timings.receive_std"] == 0
+    # フレームのリクエストが存在しないHARファイルは、統計情報がNaNになる
+    assert math.isnan(actual.loc["c.har", "frame_count"])
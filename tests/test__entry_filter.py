@@ -0,0 +1,53 @@
+import pytest
+
+from ahs.entry_filter import compile_entry_filter, get_url_host, get_url_path, parse_filter_expression
+from ahs.timing_columns import extract_timing_columns
+from tests.test__timing_columns import create_entry
+
+ENTRIES = [
+    create_entry("https://bucket.s3.ap-northeast-1.amazonaws.com/a.png", "3"),
+    create_entry("https://annofab.com/api/v1/foo", None),
+    create_entry("https://User@Annofab.com:443/static/main.js?x=1", None),
+]
+ENTRIES[1]["response"].update({"status": 404})
+ENTRIES[1]["response"]["content"]["mimeType"] = "application/json"
+ENTRIES[2]["time"] = 1500
+
+
+def test__get_url_host():
+    assert get_url_host("https://User@Annofab.com:443/static/main.js?x=1") == "annofab.com"
+    assert get_url_host("http://[::1]:8080/") == "::1"
+    assert get_url_host("data:image/png;base64,xxx") == ""
+
+
+def test__get_url_path():
+    assert get_url_path("https://annofab.com/api/v1/foo?x=1#y") == "/api/v1/foo"
+    assert get_url_path("https://annofab.com") == ""
+
+
+@pytest.mark.parametrize(
+    ("expressions", "presets", "expected_indices"),
+    [
+        (["host=annofab.com"], [], [1, 2]),
+        (["path^=/api/"], [], [1]),
+        (["mime^=image/"], [], [0, 2]),
+        (["status=200..299"], [], [0, 2]),
+        (["status!=404", "time>=1000"], [], [2]),
+        (["url!~amazonaws"], [], [1, 2]),
+        ([], ["s3"], [0]),
+    ],
+)
+def test__EntryFilter(expressions: list[str], presets: list[str], expected_indices: list[int]):
+    entry_filter = compile_entry_filter(expressions, presets=presets)
+    expected_urls = [ENTRIES[i]["request"]["url"] for i in expected_indices]
+
+    # entryごとに判定した結果と、抽出済みの列に対してまとめて判定した結果が一致すること
+    assert [i for i, entry in enumerate(ENTRIES) if entry_filter.match_entry(entry)] == expected_indices
+    assert extract_timing_columns(ENTRIES, entry_filter=entry_filter)["request.url"] == expected_urls
+    assert entry_filter.filter_columns(extract_timing_columns(ENTRIES))["request.url"] == expected_urls
+
+
+@pytest.mark.parametrize("expression", ["host", "foo=bar", "status^=2", "time>=abc", "url~("])
+def test__parse_filter_expression__不正なフィルタ式(expression: str):
+    with pytest.raises(ValueError):
+        parse_filter_expression(expression)
@@ -0,0 +1,25 @@
+from pathlib import Path
+
+import pytest
+
+from ahs.har_files import collect_har_files
+
+
+def test__collect_har_files(tmp_path: Path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.har").write_text("{}")
+    (tmp_path / "sub/b.har").write_text("{}")
+    (tmp_path / "sub/c.txt").write_text("")
+
+    actual = collect_har_files([tmp_path, tmp_path / "a.har", tmp_path / "sub/*.har"])
+    assert [(e.path, e.relative_path) for e in actual] == [
+        (tmp_path / "a.har", Path("a.har")),
+        (tmp_path / "sub/b.har", Path("sub/b.har")),
+    ]
+
+
+def test__collect_har_files__存在しないファイル(tmp_path: Path):
+    with pytest.raises(FileNotFoundError):
+        collect_har_files([tmp_path / "not_exists.har"])
+    with pytest.raises(FileNotFoundError):
+        collect_har_files([tmp_path / "*.har"])
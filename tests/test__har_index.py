@@ -0,0 +1,93 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from ahs.har_index import (
+    HarIndex,
+    get_fallback_index_file,
+    get_index_file,
+    iter_entry_spans,
+    iter_indexed_entries,
+    load_or_build_index,
+    select_records,
+)
+from ahs.utils import parse_iso_datetime
+from tests.test__timing_columns import create_entry
+
+
+def create_har_file(tmp_path: Path) -> Path:
+    entries = []
+    for index in range(3):
+        entry = create_entry(f'https://host{index}.example.com/"{{[日本語\\]}}', str(index))
+        entry["startedDateTime"] = f"2025-01-01T00:00:0{index}.000Z"
+        entries.append(entry)
+    har_file = tmp_path / "input.har"
+    # キーの順番が`entries`より前に、構造を表す記号を含む値を配置する
+    har_file.write_text(json.dumps({"log": {"pages": [{"title": "{["}], "entries": entries}, "x": [{}]}, ensure_ascii=False, indent=1))
+    return har_file
+
+
+def test__iter_entry_spans(tmp_path: Path):
+    har_file = create_har_file(tmp_path)
+    content = har_file.read_bytes()
+    expected = json.loads(content)["log"]["entries"]
+    assert [json.loads(content[start:end]) for start, end in iter_entry_spans(content)] == expected
+
+
+def test__load_or_build_index(tmp_path: Path):
+    har_file = create_har_file(tmp_path)
+    index = load_or_build_index(har_file)
+    assert get_index_file(har_file).exists()
+    assert [e.host for e in index.records] == ["host0.example.com", "host1.example.com", "host2.example.com"]
+
+    loaded_index = HarIndex.load(get_index_file(har_file))
+    assert loaded_index.records == index.records
+    assert loaded_index.is_up_to_date(har_file)
+
+    since = parse_iso_datetime("2025-01-01T00:00:01Z").timestamp()
+    records = select_records(loaded_index.records, since=since)
+    actual = list(iter_indexed_entries(har_file, records))
+    assert [e["request"]["url"] for e in actual] == ['https://host1.example.com/"{[日本語\\]}', 'https://host2.example.com/"{[日本語\\]}']
+
+
+def test__load_or_build_index__索引ファイルが壊れている(tmp_path: Path):
+    har_file = create_har_file(tmp_path)
+    index = load_or_build_index(har_file)
+    index_file = get_index_file(har_file)
+    # 文字列のIDが範囲外になるように、ホストの一覧を空にする
+    magic, header, packed_records = index_file.read_bytes().split(b"\n", 2)
+    index_file.write_bytes(magic + b"\n" + json.dumps({**json.loads(header), "hosts": []}).encode("utf-8") + b"\n" + packed_records)
+    with pytest.raises(ValueError, match="文字列のID"):
+        HarIndex.load(index_file)
+
+    assert load_or_build_index(har_file).records == index.records
+    assert HarIndex.load(index_file).records == index.records
+
+
+def test__load_or_build_index__HARファイルと同じディレクトリに書き込めない(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    har_file = create_har_file(tmp_path)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    save = HarIndex.save
+
+    def save_except_sidecar(self: HarIndex, index_file: Path) -> None:
+        if index_file == get_index_file(har_file):
+            raise PermissionError("read-only")
+        save(self, index_file)
+
+    monkeypatch.setattr(HarIndex, "save", save_except_sidecar)
+    index = load_or_build_index(har_file)
+    assert not get_index_file(har_file).exists()
+    fallback_index_file = get_fallback_index_file(har_file)
+    assert fallback_index_file.is_relative_to(tmp_path / "cache")
+    assert HarIndex.load(fallback_index_file).records == index.records
+    # 2回目以降は、キャッシュディレクトリの索引ファイルを利用する
+    assert load_or_build_index(har_file).records == index.records
+
+    # どちらにも書き込めない場合は、保存せずに索引を返す
+    def save_nowhere(self: HarIndex, index_file: Path) -> None:  # noqa: ARG001
+        raise PermissionError("read-only")
+
+    monkeypatch.setattr(HarIndex, "save", save_nowhere)
+    fallback_index_file.unlink()
+    assert load_or_build_index(har_file).records == index.records
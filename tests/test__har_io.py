@@ -0,0 +1,20 @@
+import pytest
+
+from ahs.har_io import JSON_BACKEND_NAMES, create_json_backend
+
+DATA = {"log": {"entries": [{"url": "https://example.com/日本語", "time": 1.5, "size": -1, "text": None, "ok": True}]}}
+
+
+@pytest.mark.parametrize("backend_name", JSON_BACKEND_NAMES)
+def test__JsonBackend(backend_name: str):
+    try:
+        backend = create_json_backend(backend_name)
+    except ImportError:
+        pytest.skip(f"{backend_name}がインストールされていません。")
+
+    serialized = backend.dumps(DATA)
+    assert isinstance(serialized, bytes)
+    assert "日本語".encode() in serialized
+    assert backend.loads(serialized) == DATA
+    # どのライブラリでも、標準ライブラリでシリアライズした結果と同じ内容として読み込める
+    assert backend.loads(create_json_backend("stdlib").dumps(DATA)) == DATA
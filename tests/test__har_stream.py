@@ -0,0 +1,83 @@
+import io
+import json
+from pathlib import Path
+from typing import Any
+
+from ahs.har_files import collect_har_files
+from ahs.har_io import dumps_json
+from ahs.har_stream import HarStreamWriter, iter_har_entries, iter_har_events
+from ahs.sanitize_har import sanitize_har_files, sanitize_har_object, sanitize_har_stream
+
+HAR_DATA: dict[str, Any] = {
+    "log": {
+        "version": "1.2",
+        "creator": {"name": "WebInspector", "version": "537.36"},
+        "pages": [],
+        "entries": [
+            {
+                "startedDateTime": "2025-01-01T00:00:00.000Z",
+                "time": 12.5,
+                "request": {
+                    "method": "GET",
+                    "url": "https://example.com/foo?X-Amz-Signature=123&a=日本語",
+                    "headers": [{"name": "Authorization", "value": "Bearer xxx"}],
+                    "queryString": [{"name": "X-Amz-Signature", "value": "123"}],
+                    "cookies": [{"name": "a", "value": "b"}],
+                },
+                "response": {
+                    "status": 200,
+                    "headers": [{"name": "set-cookie", "value": "a=b"}],
+                    "cookies": [{"name": "a", "value": "b"}],
+                    "content": {"size": 3, "mimeType": "text/plain", "text": "abc"},
+                },
+                "_initiator": {"type": "parser", "url": "https://example.com/foo?X-Amz-Credential=123", "lineNumber": 6},
+            },
+            {
+                "startedDateTime": "2025-01-01T00:00:01.000Z",
+                "time": 100,
+                "request": {"method": "POST", "url": "https://example.com/bar", "headers": [], "queryString": [], "cookies": []},
+                "response": {"status": 204, "headers": [], "cookies": [], "content": {"size": 0, "mimeType": "x-unknown"}},
+            },
+        ],
+    },
+    "extra": 1.25e-3,
+}
+
+
+def test__iter_har_entries():
+    fp = io.StringIO(json.dumps(HAR_DATA, indent=2))
+    actual = list(iter_har_entries(fp, chunk_size=7))
+    assert actual == HAR_DATA["log"]["entries"]
+
+
+def test__HarStreamWriter__dumps_jsonと同じ内容を出力する():
+    fp = io.StringIO(json.dumps(HAR_DATA, indent=2, ensure_ascii=False))
+    output_fp = io.BytesIO()
+    HarStreamWriter(output_fp).write_all(iter_har_events(fp, chunk_size=5))
+    assert output_fp.getvalue() == dumps_json(HAR_DATA)
+
+
+def test__HarStreamWriter__entriesが空():
+    data: dict[str, Any] = {"log": {"entries": []}}
+    output_fp = io.BytesIO()
+    HarStreamWriter(output_fp).write_all(iter_har_events(io.StringIO(json.dumps(data))))
+    assert output_fp.getvalue() == dumps_json(data)
+
+
+def test__sanitize_har_stream():
+    input_string = json.dumps(HAR_DATA, ensure_ascii=False)
+    output_fp = io.BytesIO()
+    sanitize_har_stream(io.StringIO(input_string), output_fp)
+    assert output_fp.getvalue() == dumps_json(sanitize_har_object(json.loads(input_string)))
+
+
+def test__sanitize_har_files(tmp_path: Path):
+    input_dir = tmp_path / "input"
+    (input_dir / "sub").mkdir(parents=True)
+    (input_dir / "a.har").write_text(json.dumps(HAR_DATA))
+    (input_dir / "sub/b.har").write_text("invalid json")
+
+    results = sanitize_har_files(collect_har_files([input_dir]), tmp_path / "output", jobs=2)
+    assert [e.error is None for e in results] == [True, False]
+    actual = json.loads((tmp_path / "output/a.har").read_text())
+    assert actual["log"]["entries"][0]["response"]["content"]["text"] == "REDACTED"
@@ -0,0 +1,86 @@
+import json
+from pathlib import Path
+
+import numpy
+import pandas
+import pytest
+
+from ahs.__main__ import main
+from ahs.latency_sketch import DDSketch, LatencySketches
+from ahs.timing_columns import extract_timing_columns
+from tests.test__timing_columns import ENTRIES
+
+
+def test__ddsketch__quantile():
+    rng = numpy.random.default_rng(0)
+    values = rng.lognormal(mean=5, sigma=1, size=10000)
+    sketch = DDSketch(relative_accuracy=0.01)
+    sketch.add_array(values)
+    for q in [0.01, 0.5, 0.95, 0.99]:
+        expected = numpy.quantile(values, q, method="lower")
+        assert sketch.quantile(q) == pytest.approx(expected, rel=0.01)
+    assert sketch.count == len(values)
+    assert sketch.mean() == pytest.approx(values.mean())
+    assert sketch.std() == pytest.approx(values.std())
+    assert sketch.quantile(0) == values.min()
+    assert sketch.quantile(1) == values.max()
+
+
+def test__ddsketch__merge():
+    values = numpy.array([0, 1, 2, 3, 10, 100, 1000, numpy.nan])
+    expected = DDSketch()
+    expected.add_array(values)
+
+    actual = DDSketch()
+    for chunk in numpy.split(values, 4):
+        sketch = DDSketch()
+        sketch.add_array(chunk)
+        # ファイルに保存して読み込んだスケッチもマージできる
+        actual.merge(DDSketch.from_dict(json.loads(json.dumps(sketch.to_dict()))))
+    assert actual.to_dict() == expected.to_dict()
+    assert actual.count == 7
+    assert actual.quantile(0) == 0
+
+    with pytest.raises(ValueError, match="relative_accuracy"):
+        actual.merge(DDSketch(relative_accuracy=0.02))
+
+
+def test__ddsketch__max_bin_count():
+    sketch = DDSketch(max_bin_count=10)
+    sketch.add_array(numpy.geomspace(1, 1e6, 100))
+    assert len(sketch.bins) == 10
+    assert sketch.count == 100
+    assert sketch.quantile(1) == pytest.approx(1e6)
+
+
+def test__latency_sketches__add_columns():
+    sketches = LatencySketches()
+    sketches.add_columns(extract_timing_columns(ENTRIES * 2))
+    assert sorted(sketches.sketches) == [("annofab.com", "image/png"), ("bucket.s3.ap-northeast-1.amazonaws.com", "image/png")]
+    group = sketches.sketches[("annofab.com", "image/png")]
+    assert group["time"].count == 2
+    # Content-Lengthが存在しないentryは数えない
+    assert group["response.headers.contentLength"].count == 0
+
+
+def test__sketch__merge_sketch(tmp_path: Path):
+    input_dir = tmp_path / "input"
+    (input_dir / "day1").mkdir(parents=True)
+    (input_dir / "day1" / "a.har").write_text(json.dumps({"log": {"entries": ENTRIES}}))
+    (input_dir / "b.har").write_text(json.dumps({"log": {"entries": ENTRIES * 2}}))
+    sketch_dir = tmp_path / "sketch"
+
+    main(["sketch", str(input_dir), "--output_dir", str(sketch_dir), "--jobs", "2"])
+    assert sorted(str(e.relative_to(sketch_dir)) for e in sketch_dir.rglob("*.sketch.json")) == ["b.sketch.json", "day1/a.sketch.json"]
+
+    output_file = tmp_path / "statistics.csv"
+    merged_sketch_file = tmp_path / "merged.sketch.json"
+    main(["merge_sketch", str(sketch_dir), "--output", str(output_file), "--output_sketch", str(merged_sketch_file), "--group_by", "mimeType"])
+    df_actual = pandas.read_csv(output_file, keep_default_na=False)
+    row = df_actual[df_actual["metric"] == "time"].iloc[0]
+    assert row["host"] == ""
+    assert row["mimeType"] == "image/png"
+    assert row["count"] == len(ENTRIES) * 3
+    assert row["p50"] == pytest.approx(10, rel=0.01)
+    assert list(df_actual.columns)[-3:] == ["p50", "p95", "p99"]
+    assert LatencySketches.load(merged_sketch_file).har_file_count == 2
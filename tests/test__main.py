@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+
+def get_imported_modules(arguments: list[str]) -> set[str]:
+    """
+    `python -X importtime -m ahs`を実行して、importされたモジュールの名前を返します。
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-m", "ahs", *arguments], capture_output=True, text=True, check=True)
+    return {line.split("|")[-1].strip() for line in proc.stderr.splitlines() if line.startswith("import time:")}
+
+
+def test__version_はpandasをimportしない():
+    modules = get_imported_modules(["--version"])
+    assert "pandas" not in modules
+    assert "numpy" not in modules
+
+
+def test__sanitize_はpandasをimportしない(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": []}}))
+    modules = get_imported_modules(["sanitize", str(har_file), "--output", str(tmp_path / "output.har")])
+    assert "ahs.sanitize_har" in modules
+    assert "pandas" not in modules
+    assert "numpy" not in modules
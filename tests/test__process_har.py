@@ -0,0 +1,99 @@
+import json
+from pathlib import Path
+from typing import Any
+
+import pandas
+import pytest
+
+from ahs.__main__ import main
+from ahs.har_files import HarFileInput
+from ahs.process_har import HarStage, SanitizeStage, process_har_file
+from tests.test__timing_columns import create_entry
+
+
+def create_full_entry(url: str) -> dict[str, Any]:
+    entry = create_entry(url, "3")
+    entry["request"].update({"headers": [{"name": "Authorization", "value": "Bearer xxx"}], "queryString": [], "cookies": []})
+    entry["response"].update({"cookies": []})
+    entry["response"]["content"]["text"] = "abc"
+    return entry
+
+
+ENTRIES = [
+    create_full_entry("https://d2rljy8mjgrfyd.cloudfront.net/3d-editor-latest/index.html"),
+    create_full_entry("https://bucket.s3.ap-northeast-1.amazonaws.com/a.png?X-Amz-Signature=abc"),
+]
+
+
+class CountStage(HarStage):
+    """
+    テスト用の独自ステージ。entryの件数を数えます。
+    """
+
+    def process_entry(self, entry: dict[str, Any]) -> None:  # noqa: ARG002
+        (self.output_dir / "count.txt").write_text(str(int(self.read_count()) + 1))
+
+    def read_count(self) -> str:
+        count_file = self.output_dir / "count.txt"
+        return count_file.read_text() if count_file.exists() else "0"
+
+
+class FailingStage(HarStage):
+    """
+    テスト用の独自ステージ。2件目のentryで例外を発生させます。
+    """
+
+    def __init__(self, *, output_dir: Path) -> None:
+        super().__init__(output_dir=output_dir)
+        self.entry_count = 0
+
+    def process_entry(self, entry: dict[str, Any]) -> None:  # noqa: ARG002
+        self.entry_count += 1
+        if self.entry_count == 2:
+            raise RuntimeError("failed")
+
+
+def test__process_har_file__途中で失敗したら出力ファイルを削除する(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"version": "1.2", "entries": ENTRIES}}))
+    output_dir = tmp_path / "output"
+    sanitize_stage = SanitizeStage(output_dir=output_dir)
+
+    with pytest.raises(RuntimeError):
+        process_har_file(HarFileInput(har_file, Path("input.har.gz")), [FailingStage(output_dir=output_dir), sanitize_stage])
+
+    assert not (output_dir / "sanitize/input.har.gz").exists()
+    assert sanitize_stage._output_fp is None
+
+
+def test__process(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"version": "1.2", "entries": ENTRIES}}))
+    output_dir = tmp_path / "output"
+    output_dir.mkdir()
+
+    main(["process", str(har_file), "--output_dir", str(output_dir), "--plugin", "tests.test__process_har:CountStage"])
+
+    sanitized = json.loads((output_dir / "sanitize/input.har").read_text())
+    assert sanitized["log"]["version"] == "1.2"
+    assert sanitized["log"]["entries"][1]["request"]["url"] == "https://bucket.s3.ap-northeast-1.amazonaws.com/a.png?X-Amz-Signature=REDACTED"
+    # `timing`ステージには、マスクする前のentryが渡される
+    df_timing = pandas.read_csv(output_dir / "timing/input.csv")
+    assert df_timing["request.url"][1] == "https://bucket.s3.ap-northeast-1.amazonaws.com/a.png?X-Amz-Signature=abc"
+    loadtime = json.loads((output_dir / "editor_loadtime.json").read_text())
+    assert loadtime[0]["start_request.startedDateTime"] == "2025-01-01T00:00:00.000Z"
+    assert (output_dir / "count.txt").read_text() == "2"
+
+
+def test__process__editor_type(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    entries = [create_full_entry("https://annofab.com/index.html"), *ENTRIES[1:]]
+    har_file.write_text(json.dumps({"log": {"version": "1.2", "entries": entries}}))
+    output_dir = tmp_path / "output"
+
+    main(["process", str(har_file), "--output_dir", str(output_dir), "--stage", "editor_loadtime", "--editor_type", "image", "--nth_frame", "1"])
+
+    loadtime = json.loads((output_dir / "editor_loadtime.json").read_text())
+    assert loadtime[0]["frame_count"] == 1
+    assert loadtime[0]["1_frame_seconds"] == 0.01
+    assert loadtime[0]["har_file"] == str(har_file)
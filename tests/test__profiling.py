@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from ahs.__main__ import main
+from ahs.profiling import Profiler
+from tests.test__process_har import ENTRIES
+
+
+@pytest.fixture(autouse=True)
+def reset_profiler(monkeypatch: pytest.MonkeyPatch):
+    # `--profile`で有効にしたプロファイラが、他のテストに影響しないようにする
+    monkeypatch.setattr("ahs.profiling._profiler", Profiler())
+
+
+def test__profiler__disabled():
+    profiler = Profiler()
+    with profiler.file("a.har", file_size=10), profiler.stage("parse"):
+        profiler.add_entries(3)
+    assert profiler.files == []
+    assert profiler.get_all_profiles() == []
+
+
+@pytest.mark.parametrize("mode", ["stream", "memory"])
+def test__sanitize(tmp_path: Path, mode: str):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+    profile_file = tmp_path / "profile.json"
+
+    main(["--profile_output", str(profile_file), "sanitize", str(har_file), "--output", str(tmp_path / "output.har"), "--mode", mode])
+    actual = json.loads(profile_file.read_text())
+    assert actual["command"] == "sanitize"
+    assert len(actual["files"]) == 1
+    file_profile = actual["files"][0]
+    assert file_profile["name"] == str(har_file)
+    assert file_profile["entry_count"] == len(ENTRIES)
+    assert file_profile["file_size"] == har_file.stat().st_size
+    stage_names = [e["name"] for e in file_profile["stages"]]
+    assert {"parse", "sanitize_initiator", "sanitize_request", "sanitize_response", "write"} <= set(stage_names)
+
+
+def test__sanitize__jobs(tmp_path: Path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    for name in ["a.har", "b.har"]:
+        (input_dir / name).write_text(json.dumps({"log": {"entries": ENTRIES}}))
+    profile_file = tmp_path / "profile.json"
+
+    main(["--profile_output", str(profile_file), "sanitize", str(input_dir), "--output_dir", str(tmp_path / "output"), "--jobs", "2"])
+    actual = json.loads(profile_file.read_text())
+    # プロセスプールのワーカーで計測した結果も含まれる
+    assert sorted(e["name"] for e in actual["files"]) == [str(input_dir / "a.har"), str(input_dir / "b.har")]
+
+
+def test__to_timing_csv__cprofile(tmp_path: Path, capsys: pytest.CaptureFixture):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+    cprofile_file = tmp_path / "cprofile.pstats"
+
+    main(["--profile", "--cprofile_output", str(cprofile_file), "to_timing_csv", str(har_file), "--output", str(tmp_path / "output.csv")])
+    assert cprofile_file.stat().st_size > 0
+    report = capsys.readouterr().err
+    assert "[profile] command=to_timing_csv" in report
+    assert "extract" in report
+    assert "write" in report
@@ -0,0 +1,110 @@
+import copy
+import gzip
+import io
+import json
+from pathlib import Path
+
+import pytest
+
+from ahs.__main__ import main
+from ahs.sanitize_har import sanitize_har_object
+from ahs.sanitize_inplace import sanitize_har_buffer
+from tests.test__process_har import ENTRIES
+
+
+def sanitize_inplace(data: bytes) -> bytes:
+    output = io.BytesIO()
+    sanitize_har_buffer(data, output)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test__sanitize_har_buffer__streamモードと同じ内容になる(indent: int | None):
+    entries = copy.deepcopy(ENTRIES)
+    entries[0]["request"].update(
+        {
+            "url": "https://example.com/a?X-Amz-Credential=1&b=%E3%81%82",
+            "headers": [{"value": "a=b", "name": "Cookie"}, {"name": "accept", "value": "*/*"}],
+            "queryString": [{"name": "X-Amz-Credential", "value": "1"}, {"name": "b", "value": "あ"}],
+            "postData": {"mimeType": "application/json", "text": '{"password": "\\"x\\""}'},
+            "cookies": [{"name": "session", "value": "abc"}],
+        }
+    )
+    entries[0]["response"]["headers"] = [{"name": "Set-Cookie", "value": "session=abc"}]
+    entries[0]["_initiator"] = {
+        "type": "script",
+        "stack": {
+            "callFrames": [{"url": "https://example.com/a.js?X-Amz-Signature=1"}],
+            "parent": {"callFrames": [{"url": "https://example.com/b.js"}]},
+        },
+    }
+    data = {"log": {"version": "1.2", "pages": [{"title": "}]"}], "entries": entries}}
+    input_bytes = json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+
+    actual = json.loads(sanitize_inplace(input_bytes))
+    assert actual == sanitize_har_object(data)
+
+
+def test__sanitize_har_buffer__マスク対象以外のバイト列はそのまま残す():
+    input_bytes = (
+        b'{"log": {"entries": [\n'
+        b'  {"request": {"url": "https://example.com/?X-Amz-Signature=abc",  "headers": [], "queryString": [], "cookies": [1]},\n'
+        b'   "response": {"headers": [], "cookies": [], "content": {"size": 3, "text": "abc"}}, "time":  1.50}\n'
+        b"]}}\n"
+    )
+    assert sanitize_inplace(input_bytes) == (
+        b'{"log": {"entries": [\n'
+        b'  {"request": {"url": "https://example.com/?X-Amz-Signature=REDACTED",  "headers": [], "queryString": [], "cookies": []},\n'
+        b'   "response": {"headers": [], "cookies": [], "content": {"size": 3, "text": "REDACTED"}}, "time":  1.50}\n'
+        b"]}}\n"
+    )
+
+
+def test__sanitize_har_buffer__キーが存在しなければ追加する():
+    input_bytes = b'{"log": {"entries": [{"request": {"headers": [], "queryString": [], "url": "a", "postData": {}}, "response": {"content": {"size": 0}, "headers": []}}]}}'
+    actual = json.loads(sanitize_inplace(input_bytes))
+    assert actual["log"]["entries"][0] == {
+        "request": {"headers": [], "queryString": [], "url": "a", "postData": {"text": "REDACTED"}, "cookies": []},
+        "response": {"content": {"size": 0, "text": "REDACTED"}, "headers": [], "cookies": []},
+    }
+
+
+def test__sanitize_har_buffer__エスケープされたヘッダ名():
+    input_bytes = b'{"log": {"entries": [{"request": {"headers": [{"name": "Cook\\u0069e", "value": "a"}], "queryString": [], "url": "a"}, "response": {"content": {}, "headers": []}}]}}'
+    actual = json.loads(sanitize_inplace(input_bytes))
+    assert actual["log"]["entries"][0]["request"]["headers"] == [{"name": "Cookie", "value": "REDACTED"}]
+
+
+def test__sanitize_har_buffer__エスケープされたキー():
+    input_bytes = (
+        b'{"log": {"entries": [{"request": {"\\u0075rl": "https://example.com/?X-Amz-Signature=abc&X%2DAmz-Credential=def",'
+        b' "h\\u0065aders": [{"n\\u0061me": "\\u0041uthorization", "value": "a"}], "queryString": [], "c\\u006fokies": [1]},'
+        b' "response": {"content": {"\\u0074ext": "abc"}, "headers": []}}]}}'
+    )
+    actual = json.loads(sanitize_inplace(input_bytes))
+    assert actual == sanitize_har_object(json.loads(input_bytes))
+    assert actual["log"]["entries"][0]["request"] == {
+        "url": "https://example.com/?X-Amz-Signature=REDACTED&X%2DAmz-Credential=REDACTED",
+        "headers": [{"name": "Authorization", "value": "REDACTED"}],
+        "queryString": [],
+        "cookies": [],
+    }
+
+
+def test__sanitize_har_buffer__entriesが存在しない():
+    with pytest.raises(ValueError, match="log.entries"):
+        sanitize_inplace(b'{"log": {"version": "1.2"}}')
+
+
+def test__sanitize__inplace(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    data = {"log": {"entries": ENTRIES}}
+    har_file.write_text(json.dumps(data))
+    output_file = tmp_path / "output.har.gz"
+
+    main(["sanitize", str(har_file), "--output", str(output_file), "--mode", "inplace"])
+    assert json.loads(gzip.decompress(output_file.read_bytes())) == sanitize_har_object(data)
+
+    # 圧縮されたHARファイルはmmapできないので、`stream`で処理する
+    main(["sanitize", str(output_file), "--output", str(tmp_path / "output2.har"), "--mode", "inplace"])
+    assert json.loads((tmp_path / "output2.har").read_text()) == sanitize_har_object(data)
@@ -0,0 +1,128 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from ahs.__main__ import main
+from ahs.sanitize_har import HarSanitizer
+from ahs.sanitize_policy import load_sanitize_policy
+
+POLICY = {
+    "rules": [
+        {"name": "annofab_token", "type": "request_header", "pattern": "x-annofab-.*-token"},
+        {"name": "cloudfront", "type": "query", "names": ["Signature", "Key-Pair-Id"]},
+        {"name": "session", "type": "cookie", "names": ["session"]},
+        {"name": "password", "type": "json_path", "path": "request.postData.params", "replacement": []},
+    ]
+}
+
+
+def create_entry() -> dict:
+    url = "https://cdn.example.com/a.png?Expires=1&Signature=abc&Key-Pair-Id=def"
+    return {
+        "_initiator": {"type": "script", "stack": {"callFrames": [{"url": url}, {"url": url}]}},
+        "request": {
+            "url": url,
+            "headers": [
+                {"name": "X-Annofab-Api-Token", "value": "secret"},
+                {"name": "Cookie", "value": "session=abc; theme=dark"},
+                {"name": "Accept", "value": "*/*"},
+            ],
+            "queryString": [{"name": "Expires", "value": "1"}, {"name": "Signature", "value": "abc"}, {"name": "Key-Pair-Id", "value": "def"}],
+            "cookies": [{"name": "session", "value": "abc"}],
+            "postData": {"mimeType": "application/x-www-form-urlencoded", "text": "a=1", "params": [{"name": "password", "value": "x"}]},
+        },
+        "response": {
+            "headers": [{"name": "Set-Cookie", "value": "session=xyz; Path=/\ntheme=light; Path=/"}],
+            "cookies": [],
+            "content": {"size": 3, "text": "abc"},
+        },
+    }
+
+
+@pytest.fixture
+def policy_file(tmp_path: Path) -> Path:
+    result = tmp_path / "policy.json"
+    result.write_text(json.dumps(POLICY))
+    return result
+
+
+def test__HarSanitizer__policy(policy_file: Path):
+    sanitizer = HarSanitizer(load_sanitize_policy(policy_file), count_url_matches=True)
+    entry = sanitizer.sanitize_entry(create_entry())
+
+    request = entry["request"]
+    assert request["url"] == "https://cdn.example.com/a.png?Expires=1&Signature=REDACTED&Key-Pair-Id=REDACTED"
+    assert entry["_initiator"]["stack"]["callFrames"][1]["url"] == request["url"]
+    # `Cookie`ヘッダは、デフォルトのルールで値全体をマスクする
+    assert [e["value"] for e in request["headers"]] == ["REDACTED", "REDACTED", "*/*"]
+    assert [e["value"] for e in request["queryString"]] == ["1", "REDACTED", "REDACTED"]
+    assert request["postData"] == {"mimeType": "application/x-www-form-urlencoded", "text": "REDACTED", "params": []}
+    assert entry["response"]["headers"][0]["value"] == "REDACTED"
+
+    match_counts = sanitizer.match_counts
+    assert match_counts["annofab_token"] == 1
+    # `queryString`で1件、`request.url`と`_initiator`のURLで3件
+    assert match_counts["cloudfront"] == 2 + 2 * 3
+    assert match_counts["session"] == 1
+    assert match_counts["password"] == 1
+    assert match_counts["json_path:response.content.text"] == 1
+
+
+def test__HarSanitizer__cookieのルールだけでヘッダをマスクする(tmp_path: Path):
+    policy_file = tmp_path / "policy.json"
+    policy_file.write_text(json.dumps({"include_default_rules": False, "rules": [{"type": "cookie", "pattern": "sess.*"}]}))
+    sanitizer = HarSanitizer(load_sanitize_policy(policy_file))
+    entry = sanitizer.sanitize_entry(create_entry())
+
+    assert entry["request"]["headers"][1]["value"] == "session=REDACTED; theme=dark"
+    assert entry["response"]["headers"][0]["value"] == "session=REDACTED; Path=/\ntheme=light; Path=/"
+    assert entry["request"]["cookies"] == [{"name": "session", "value": "REDACTED"}]
+    # デフォルトのルールを含めないので、それ以外はマスクしない
+    assert entry["request"]["headers"][0]["value"] == "secret"
+    assert entry["response"]["content"]["text"] == "abc"
+    assert sanitizer.match_counts == {"cookie:sess.*": 3}
+
+
+@pytest.mark.parametrize(
+    ("rule", "message"),
+    [
+        ({"type": "header", "names": ["a"]}, "`type`が不正"),
+        ({"type": "query"}, "`names`または`pattern`"),
+        ({"type": "query", "pattern": "("}, "不正な正規表現"),
+        ({"type": "json_path"}, "`path`"),
+        ({"name": "query:X-Amz-Signature", "type": "query", "names": ["a"]}, "重複"),
+    ],
+)
+def test__load_sanitize_policy__不正なルール(tmp_path: Path, rule: dict, message: str):
+    policy_file = tmp_path / "policy.json"
+    policy_file.write_text(json.dumps({"rules": [rule]}))
+    with pytest.raises(ValueError, match=message):
+        load_sanitize_policy(policy_file)
+
+
+def test__sanitize__report(tmp_path: Path, policy_file: Path):
+    input_dir = tmp_path / "input"
+    input_dir.mkdir()
+    (input_dir / "a.har").write_text(json.dumps({"log": {"entries": [create_entry(), create_entry()]}}))
+    (input_dir / "b.har").write_text(json.dumps({"log": {"entries": [create_entry()]}}))
+    output_file = tmp_path / "report.json"
+
+    main(["sanitize", str(input_dir), "--policy_file", str(policy_file), "--report", "--output", str(output_file), "--jobs", "2"])
+    actual = json.loads(output_file.read_text())
+    assert [e["entry_count"] for e in actual["files"]] == [2, 1]
+    assert actual["total"]["entry_count"] == 3
+    assert actual["total"]["matches"]["annofab_token"] == 3
+    assert actual["total"]["matches"]["query:X-Amz-Signature"] == 0
+    # 入力ファイルは書き換えない
+    assert json.loads((input_dir / "b.har").read_text())["log"]["entries"][0] == create_entry()
+
+
+def test__sanitize__policy_fileを指定するとinplaceモードの代わりにstreamモードで処理する(tmp_path: Path, policy_file: Path):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": [create_entry()]}}))
+    output_file = tmp_path / "output.har"
+
+    main(["sanitize", str(har_file), "--policy_file", str(policy_file), "--mode", "inplace", "--output", str(output_file)])
+    entry = json.loads(output_file.read_text())["log"]["entries"][0]
+    assert entry["request"]["headers"][0]["value"] == "REDACTED"
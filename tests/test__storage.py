@@ -0,0 +1,74 @@
+import gzip
+import json
+from pathlib import Path
+
+import pandas
+import pytest
+
+from ahs.__main__ import main
+from ahs.storage import LocalStorage, StorageLocation, iter_har_objects, list_har_keys
+from tests.test__process_har import ENTRIES
+
+
+def create_input_dir(input_dir: Path) -> None:
+    data = json.dumps({"log": {"entries": ENTRIES}}).encode("utf-8")
+    (input_dir / "sub").mkdir(parents=True)
+    (input_dir / "a.har").write_bytes(data)
+    (input_dir / "sub/b.har.gz").write_bytes(gzip.compress(data))
+    (input_dir / "c.txt").write_text("not har")
+
+
+def test__iter_har_objects(tmp_path: Path):
+    create_input_dir(tmp_path)
+    (tmp_path / "broken.har.gz").write_bytes(b"broken")
+    location = StorageLocation(LocalStorage(tmp_path), "")
+    keys = list_har_keys(location)
+    assert keys == ["a.har", "broken.har.gz", "sub/b.har.gz"]
+
+    actual = list(iter_har_objects(location, keys, max_concurrency=2))
+    assert not isinstance(actual[0], BaseException)
+    assert isinstance(actual[1], BaseException)
+    assert not isinstance(actual[2], BaseException)
+    # 圧縮されたオブジェクトは展開して返す
+    assert actual[2].data == actual[0].data
+
+
+def test__sanitize__input_uri(tmp_path: Path):
+    create_input_dir(tmp_path / "input")
+    output_dir = tmp_path / "output"
+
+    main(["sanitize", "--input_uri", str(tmp_path / "input"), "--output_uri", f"file://{output_dir}", "--max_concurrency", "2"])
+    actual = json.loads(gzip.decompress((output_dir / "sub/b.har.gz").read_bytes()))
+    assert actual["log"]["entries"][0]["response"]["content"]["text"] == "REDACTED"
+    assert (output_dir / "a.har").exists()
+
+
+@pytest.mark.parametrize("mode", ["memory", "inplace"])
+def test__sanitize__input_uri__mode(tmp_path: Path, mode: str):
+    create_input_dir(tmp_path / "input")
+    main(["sanitize", "--input_uri", str(tmp_path / "input"), "--output_uri", str(tmp_path / "output"), "--mode", mode])
+    stream_output_dir = tmp_path / "stream_output"
+    main(["sanitize", "--input_uri", str(tmp_path / "input"), "--output_uri", str(stream_output_dir)])
+    assert json.loads((tmp_path / "output/a.har").read_bytes()) == json.loads((stream_output_dir / "a.har").read_bytes())
+
+
+def test__sanitize__input_uriとjobsは併用できない(tmp_path: Path):
+    create_input_dir(tmp_path / "input")
+    with pytest.raises(SystemExit):
+        main(["sanitize", "--input_uri", str(tmp_path / "input"), "--output_uri", str(tmp_path / "output"), "--jobs", "2"])
+
+
+def test__to_timing_csv__input_uri(tmp_path: Path):
+    create_input_dir(tmp_path / "input")
+    output_file = tmp_path / "output.csv"
+
+    main(["to_timing_csv", "--input_uri", str(tmp_path / "input"), "--output", str(output_file)])
+    df_actual = pandas.read_csv(output_file)
+    assert sorted(set(df_actual["har_file"])) == [str(tmp_path / "input/a.har"), str(tmp_path / "input/sub/b.har.gz")]
+
+
+@pytest.mark.parametrize("option", [["--jobs", "2"], ["--cache"]])
+def test__to_timing_csv__input_uriと併用できないオプション(tmp_path: Path, option: list[str]):
+    create_input_dir(tmp_path / "input")
+    with pytest.raises(SystemExit):
+        main(["to_timing_csv", "--input_uri", str(tmp_path / "input"), "--output", str(tmp_path / "timing.csv"), *option])
@@ -0,0 +1,98 @@
+import io
+import json
+import math
+import os
+from pathlib import Path
+
+import pytest
+
+from ahs import timing_cache
+from ahs.timing_cache import TimingColumnsCache, read_timing_columns, write_timing_columns
+from ahs.timing_columns import extract_timing_columns
+from ahs.to_timing_csv import load_timing_columns
+from tests.test__timing_columns import ENTRIES
+
+
+def test__load_timing_columns__キャッシュを利用する(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+    cache = TimingColumnsCache(tmp_path / "cache")
+
+    first = load_timing_columns(har_file, is_s3_path=False, cache=cache)
+    second = load_timing_columns(har_file, is_s3_path=True, cache=cache)
+    assert (cache.hit_count, cache.miss_count) == (1, 1)
+    assert len(first["request.url"]) == 2
+    assert second["request.url"] == ["https://bucket.s3.ap-northeast-1.amazonaws.com/a.png"]
+
+    # ファイルが変更されたらキャッシュを利用しない
+    har_file.write_text(json.dumps({"log": {"entries": ENTRIES[:1]}}))
+    os.utime(har_file, ns=(0, 0))
+    third = load_timing_columns(har_file, is_s3_path=False, cache=cache)
+    assert (cache.hit_count, cache.miss_count) == (1, 2)
+    assert len(third["request.url"]) == 1
+
+
+def test__TimingColumnsCache__evict(tmp_path: Path):
+    har_files = []
+    for index in range(3):
+        har_file = tmp_path / f"{index}.har"
+        har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+        har_files.append(har_file)
+
+    cache = TimingColumnsCache(tmp_path / "cache")
+    load_timing_columns(har_files[0], is_s3_path=False, cache=cache)
+    cache.max_size = next((tmp_path / "cache").iterdir()).stat().st_size * 2
+    load_timing_columns(har_files[1], is_s3_path=False, cache=cache)
+    # 最後に使われた日時が古いキャッシュから削除されることを確認するため、1番目のキャッシュの更新日時を古くする
+    for index, cache_file in enumerate(sorted((tmp_path / "cache").iterdir(), key=lambda e: e.stat().st_mtime_ns)):
+        os.utime(cache_file, ns=(index, index))
+    load_timing_columns(har_files[2], is_s3_path=False, cache=cache)
+
+    assert len(list((tmp_path / "cache").iterdir())) == 2
+    assert cache.get(har_files[0]) is None
+    assert cache.get(har_files[2]) is not None
+
+
+def test__write_timing_columns():
+    columns = extract_timing_columns(ENTRIES)
+    fp = io.BytesIO()
+    write_timing_columns(columns, fp)
+    fp.seek(0)
+    actual = read_timing_columns(fp)
+    assert list(actual) == list(columns)
+    assert actual["request.url"] == columns["request.url"]
+    assert actual["response.headers.contentLength"] == [3, None]
+    assert actual["response.status"] == columns["response.status"]
+    assert actual["timings.wait"] == columns["timings.wait"]
+    assert all(math.isnan(e) for e in actual["timings.ssl"])
+
+
+@pytest.mark.parametrize("content", [b"", b"\x80\x04garbage", b'{"version": 2, "byteorder": "little", "row_count": 2}\n'])
+def test__TimingColumnsCache__不正なキャッシュファイルは利用しない(tmp_path: Path, content: bytes):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+    cache = TimingColumnsCache(tmp_path / "cache")
+    cache_file = cache.get_cache_file(har_file)
+    cache_file.parent.mkdir()
+    cache_file.write_bytes(content)
+
+    assert cache.get(har_file) is None
+    assert len(load_timing_columns(har_file, cache=cache)["request.url"]) == 2
+    assert cache.get(har_file) is not None
+
+
+def test__load_timing_columns__ファイル内容のハッシュ値は1回だけ算出する(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+    hashed_files = []
+    calculate_file_hash = timing_cache._calculate_file_hash
+
+    def counting_calculate_file_hash(file: Path) -> str:
+        hashed_files.append(file)
+        return calculate_file_hash(file)
+
+    monkeypatch.setattr(timing_cache, "_calculate_file_hash", counting_calculate_file_hash)
+    cache = TimingColumnsCache(tmp_path / "cache", use_content_hash=True)
+    load_timing_columns(har_file, cache=cache)
+    assert hashed_files == [har_file]
+    assert cache.miss_count == 1
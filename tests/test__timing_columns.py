@@ -0,0 +1,47 @@
+import math
+from typing import Any
+
+from ahs.timing_columns import TIMING_COLUMNS, extract_timing_columns
+from ahs.to_timing_csv import create_dataframe_from_timing_columns
+
+
+def create_entry(url: str, content_length: str | None) -> dict[str, Any]:
+    headers = [] if content_length is None else [{"name": "Content-Length", "value": content_length}]
+    return {
+        "startedDateTime": "2025-01-01T00:00:00.000Z",
+        "time": 10,
+        "request": {"method": "GET", "url": url},
+        "response": {"status": 200, "headers": headers, "content": {"size": 3, "mimeType": "image/png"}},
+        "timings": {"blocked": 1.5, "dns": -1, "connect": -1, "send": 0.1, "wait": 5.0, "receive": 2.0},
+    }
+
+
+ENTRIES = [
+    create_entry("https://bucket.s3.ap-northeast-1.amazonaws.com/a.png", "3"),
+    create_entry("https://annofab.com/api/v1/foo", None),
+]
+
+
+def test__extract_timing_columns():
+    actual = extract_timing_columns(ENTRIES)
+    assert list(actual.keys()) == TIMING_COLUMNS
+    assert actual["request.url"] == ["https://bucket.s3.ap-northeast-1.amazonaws.com/a.png", "https://annofab.com/api/v1/foo"]
+    assert list(actual["response.status"]) == [200, 200]
+    assert actual["response.headers.contentLength"] == [3, None]
+    assert list(actual["timings.dns"]) == [-1.0, -1.0]
+    # `timings.ssl`が存在しない場合はNaN
+    assert all(math.isnan(e) for e in actual["timings.ssl"])
+
+
+def test__extract_timing_columns__is_s3_path():
+    actual = extract_timing_columns(ENTRIES, is_s3_path=True)
+    assert actual["request.url"] == ["https://bucket.s3.ap-northeast-1.amazonaws.com/a.png"]
+
+
+def test__create_dataframe_from_timing_columns():
+    df_har = create_dataframe_from_timing_columns(extract_timing_columns(ENTRIES))
+    assert list(df_har.columns) == TIMING_COLUMNS
+    assert df_har["time"].dtype == "float64"
+    assert df_har["response.status"].dtype == "int64"
+    assert df_har["response.headers.contentLength"].dtype == "Int64"
+    assert df_har["response.headers.contentLength"].isna().tolist() == [False, True]
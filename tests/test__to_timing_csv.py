@@ -0,0 +1,85 @@
+import argparse
+import json
+from pathlib import Path
+
+import pandas
+import pytest
+
+from ahs.__main__ import create_parser
+from ahs.to_timing_csv import main
+from tests.test__timing_columns import ENTRIES
+
+
+def create_args(har_files: list[Path], output: Path, *options: str) -> argparse.Namespace:
+    return create_parser().parse_args(["to_timing_csv", *[str(e) for e in har_files], "--output", str(output), *options])
+
+
+def test__main__parquet(tmp_path: Path):
+    pytest.importorskip("pyarrow")
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+
+    main(create_args([har_file], tmp_path / "output.parquet", "--format", "parquet"))
+    df_actual = pandas.read_parquet(tmp_path / "output.parquet")
+    assert str(df_actual["startedDateTime"].dtype).startswith("datetime64")
+    assert df_actual["request.method"].dtype == "category"
+    assert df_actual["response.content.mimeType"].dtype == "category"
+
+
+def test__main__append(tmp_path: Path):
+    har_files = []
+    for name in ["a", "b"]:
+        har_file = tmp_path / f"{name}.har"
+        har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+        har_files.append(har_file)
+
+    dataset_dir = tmp_path / "dataset"
+    main(create_args(har_files[:1], dataset_dir, "--append"))
+    main(create_args(har_files[1:], dataset_dir, "--append"))
+    partition_files = sorted(dataset_dir.iterdir())
+    assert [e.name.split("-")[0] for e in partition_files] == ["a", "b"]
+    assert pandas.read_csv(partition_files[1])["har_file"].tolist() == [str(har_files[1])] * 2
+
+
+def test__main__since_url_regex(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    entries = [{**entry, "startedDateTime": f"2025-01-01T00:00:0{index}.000Z"} for index, entry in enumerate(ENTRIES * 2)]
+    har_file.write_text(json.dumps({"log": {"entries": entries}}))
+
+    main(create_args([har_file], tmp_path / "output.csv", "--since", "2025-01-01T00:00:01Z", "--url_regex", "amazonaws"))
+    df_actual = pandas.read_csv(tmp_path / "output.csv")
+    assert df_actual["startedDateTime"].tolist() == ["2025-01-01T00:00:02.000Z"]
+    assert (tmp_path / "input.har.ahsidx").exists()
+
+
+def test__main__filter(tmp_path: Path):
+    har_file = tmp_path / "input.har"
+    har_file.write_text(json.dumps({"log": {"entries": ENTRIES}}))
+
+    main(create_args([har_file], tmp_path / "output.csv", "--filter", "host$=.amazonaws.com", "status=200..299"))
+    df_actual = pandas.read_csv(tmp_path / "output.csv")
+    assert df_actual["request.url"].tolist() == ["https://bucket.s3.ap-northeast-1.amazonaws.com/a.png"]
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet", "arrow"])
+def test__main__jobs(tmp_path: Path, output_format: str):
+    if output_format != "csv":
+        pytest.importorskip("pyarrow")
+    har_files = []
+    for index in range(5):
+        har_file = tmp_path / f"{index}.har"
+        # entryが0件のHARファイルも含める
+        har_file.write_text(json.dumps({"log": {"entries": ENTRIES * index}}))
+        har_files.append(har_file)
+
+    output_file = tmp_path / f"output.{output_format}.gz" if output_format == "csv" else tmp_path / f"output.{output_format}"
+    main(create_args(har_files, output_file, "--jobs", "2", "--sanitize_url", "--format", output_format))
+    if output_format == "csv":
+        df_actual = pandas.read_csv(output_file)
+    elif output_format == "parquet":
+        df_actual = pandas.read_parquet(output_file)
+    else:
+        df_actual = pandas.read_feather(output_file)
+    # 処理が終わった順ではなく、指定した順番で出力する
+    assert df_actual["har_file"].tolist() == [str(har_file) for har_file in har_files for _ in range(len(ENTRIES) * har_files.index(har_file))]
+    assert len(df_actual) == len(ENTRIES) * 10